@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class UserContextBackend(ModelBackend):
+    """
+    ModelBackend that loads the session user together with the profile,
+    subscription and plan almost every page needs, in one query. See
+    ``accounts.middleware.UserContext`` for reading them.
+    """
+    related = ('userprofile', 'subscription__plan')
+
+    def _users(self):
+        return get_user_model()._default_manager.select_related(*self.related)
+
+    def get_user(self, user_id):
+        user = self._users().filter(pk=user_id).first()
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = await self._users().filter(pk=user_id).afirst()
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,80 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.functional import SimpleLazyObject, cached_property
+
+BACKEND = 'accounts.backends.UserContextBackend'
+LEGACY_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+class UserContext:
+    """
+    The user's profile, subscription and plan. They come from the user's
+    related-object cache, filled by ``UserContextBackend`` for sessions and by
+    ``api.authentication.resolve_api_key`` for API keys, so reading them runs
+    no queries.
+    """
+    def __init__(self, user):
+        self.user = user
+
+    def _related(self, name):
+        if not self.user.is_authenticated:
+            return None
+        try:
+            return getattr(self.user, name)
+        except ObjectDoesNotExist:
+            return None
+
+    @cached_property
+    def profile(self):
+        return self._related('userprofile')
+
+    @cached_property
+    def subscription(self):
+        return self._related('subscription')
+
+    @cached_property
+    def active_subscription(self):
+        """The subscription if it is active and in its current period."""
+        subscription = self.subscription
+        return subscription if subscription is not None and subscription.is_current() else None
+
+    @property
+    def plan(self):
+        subscription = self.active_subscription
+        return subscription.plan if subscription is not None else None
+
+
+class UserContextMiddleware:
+    """
+    Add ``request.user_context``, a lazily built ``UserContext`` for
+    ``request.user``. Must come after AuthenticationMiddleware. Async views
+    should use ``UserContext(await request.auser())`` instead.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        # Sessions logged in before UserContextBackend was configured
+        if request.session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND:
+            request.session[BACKEND_SESSION_KEY] = BACKEND
+        self._add_context(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if await request.session.aget(BACKEND_SESSION_KEY) == LEGACY_BACKEND:
+            await request.session.aset(BACKEND_SESSION_KEY, BACKEND)
+        self._add_context(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def _add_context(request):
+        request.user_context = SimpleLazyObject(lambda: UserContext(request.user))
@@ -1,3 +1,60 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from billing.models import Plan, Subscription
+
+from .backends import UserContextBackend
+from .middleware import BACKEND, LEGACY_BACKEND, UserContext
+
+
+class UserContextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+        cls.plan = Plan.objects.create(name='Pro', slug='pro', price=29, api_calls_limit=1000)
+        now = timezone.now()
+        cls.subscription = Subscription.objects.create(
+            user=cls.user, plan=cls.plan, status='active',
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=29)
+        )
+
+    def test_backend_loads_profile_subscription_and_plan_with_the_user(self):
+        with self.assertNumQueries(1):
+            context = UserContext(UserContextBackend().get_user(self.user.pk))
+            self.assertEqual(context.profile.user_id, self.user.pk)
+            self.assertEqual(context.active_subscription, self.subscription)
+            self.assertEqual(context.plan, self.plan)
+
+    def test_expired_subscription_is_not_active(self):
+        Subscription.objects.filter(pk=self.subscription.pk).update(
+            end_date=timezone.now() - timedelta(days=1)
+        )
+        context = UserContext(UserContextBackend().get_user(self.user.pk))
+        self.assertEqual(context.subscription, self.subscription)
+        self.assertIsNone(context.active_subscription)
+        self.assertIsNone(context.plan)
+
+    def test_profile_page_query_count(self):
+        self.client.force_login(self.user)
+        # session, user with profile/subscription/plan, API keys
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['subscription'], self.subscription)
+        self.assertEqual(response.context['api_calls_limit'], 1000)
+
+    @override_settings(AUTHENTICATION_BACKENDS=[LEGACY_BACKEND])
+    def login_with_legacy_backend(self):
+        self.client.force_login(self.user)
+
+    def test_sessions_from_the_previous_backend_stay_logged_in(self):
+        self.login_with_legacy_backend()
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], LEGACY_BACKEND)
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], BACKEND)
@@ -4,9 +4,7 @@ from django.contrib.auth import login, authenticate
 from django.contrib import messages
 from .forms import SignUpForm, UserProfileForm
 from .models import APIKey
-from dashboard.models import UserActivity 
-from billing.models import Subscription
-from django.utils import timezone
+from dashboard.activity import log_activity
 import uuid
 
 def signup(request):
@@ -46,11 +44,7 @@ def profile(request):
             
             profile.save()
             # Add activity for profile update
-            UserActivity.objects.create(
-                user=request.user,
-                activity_type='profile_update',
-                description='Updated profile information'
-            )
+            log_activity(request.user, 'profile_update', 'Updated profile information')
             messages.success(request, 'Profile updated successfully!')
             return redirect('accounts:profile')
     else:
@@ -67,13 +61,9 @@ def profile(request):
         }
         form = UserProfileForm(instance=request.user.userprofile, initial=initial_data)
 
-    # Get subscription information - UPDATED THIS PART
-    try:
-        subscription = Subscription.objects.get(
-            user=request.user,
-            status='active'
-        )
-    except Subscription.DoesNotExist:
+    # Subscription and profile were loaded with the user
+    subscription = request.user_context.subscription
+    if subscription is not None and subscription.status != 'active':
         subscription = None
 
     # Get active API keys
@@ -81,7 +71,7 @@ def profile(request):
 
     # Calculate API usage percentage
     api_calls_limit = subscription.plan.api_calls_limit if subscription else 100
-    api_calls_used = request.user.userprofile.api_calls_count
+    api_calls_used = request.user_context.profile.api_calls_count
     usage_percentage = min(round((api_calls_used / api_calls_limit) * 100), 100)
 
     context = {
@@ -0,0 +1,199 @@
+"""
+API key authentication.
+
+Clients send ``Authorization: Api-Key <key>``. Keys are resolved through an
+in-process LRU/TTL cache keyed by the key's SHA-256 hash, so repeated
+requests with the same key cost no database lookup. ``last_used`` is kept
+in memory and written back in one batched UPDATE every
+``API_KEY_LAST_USED_FLUSH_INTERVAL`` seconds.
+
+Invalidating a key drops it from this process's cache and leaves a marker
+in the ``API_KEY_CACHE_ALIAS`` cache, checked on every cache hit. Markers
+can also cover all keys of a user (their subscription or profile changed)
+or every key (a plan changed); ``api.signals`` sets them. With a cache
+shared by the workers (Redis, Memcached) a change is seen everywhere at
+once; with a per-process cache the other workers keep using their entry
+until it expires, ``API_KEY_CACHE_TTL`` at most.
+"""
+import atexit
+import copy
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import DatabaseError
+from django.utils import timezone
+from rest_framework import authentication, exceptions
+
+from accounts.models import APIKey
+from core.caching import LRUCache
+from core.db import database_changed, database_name
+
+logger = logging.getLogger(__name__)
+
+KEYWORD = 'Api-Key'
+
+
+@dataclass(frozen=True)
+class APIKeyIdentity:
+    """
+    What a valid key resolves to. The cached instance is shared; callers get
+    their own copy from ``resolve_api_key``.
+    """
+    key_id: int
+    user: User
+    subscription: object  # billing.models.Subscription or None
+
+
+def get_key_from_header(request):
+    """Return the key from an ``Authorization: Api-Key <key>`` header, if any."""
+    parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(parts) == 2 and parts[0].lower() == KEYWORD.lower():
+        return parts[1]
+    return None
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def get_key_cache():
+    return LRUCache(maxsize=settings.API_KEY_CACHE_SIZE, ttl=settings.API_KEY_CACHE_TTL)
+
+
+INVALIDATED_ALL = 'api-key:invalidated:all'
+
+
+def invalidation_key(digest):
+    return f'api-key:invalidated:{digest}'
+
+
+def user_invalidation_key(user_id):
+    return f'api-key:invalidated:user:{user_id}'
+
+
+def mark_invalidated(marker):
+    # Outlives any entry cached before now
+    caches[settings.API_KEY_CACHE_ALIAS].set(marker, time.time(), settings.API_KEY_CACHE_TTL + 1)
+
+
+class LastUsedRecorder:
+    """Coalesces ``APIKey.last_used`` updates into periodic batched writes."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._database = database_name()
+
+    def touch(self, key_id):
+        with self._lock:
+            self._pending[key_id] = timezone.now()
+            due = time.monotonic() - self._last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if pending:
+            APIKey.objects.bulk_update(
+                [APIKey(pk=key_id, last_used=last_used) for key_id, last_used in pending.items()],
+                ['last_used']
+            )
+
+    def close(self):
+        """Final flush at shutdown; failures are logged rather than raised."""
+        if database_changed(self._database):
+            return
+        try:
+            self.flush()
+        except DatabaseError as e:
+            logger.warning("Could not record API key last_used times: %s", e)
+
+
+@lru_cache(maxsize=None)
+def get_last_used_recorder():
+    recorder = LastUsedRecorder(settings.API_KEY_LAST_USED_FLUSH_INTERVAL)
+    atexit.register(recorder.close)
+    return recorder
+
+
+def resolve_api_key(key):
+    """Return an ``APIKeyIdentity`` for an active key, or ``None``."""
+    cache = get_key_cache()
+    digest = hash_key(key)
+    entry = cache.get(digest)
+    if entry is not None:
+        identity, loaded_at = entry
+        markers = caches[settings.API_KEY_CACHE_ALIAS].get_many([
+            invalidation_key(digest), user_invalidation_key(identity.user.pk), INVALIDATED_ALL
+        ])
+        if any(invalidated_at >= loaded_at for invalidated_at in markers.values()):
+            entry = None
+    if entry is None:
+        # Taken before the query, so an invalidation during it still counts
+        loaded_at = time.time()
+        try:
+            api_key = APIKey.objects.select_related(
+                'user', 'user__userprofile', 'user__subscription__plan'
+            ).get(key=key, is_active=True)
+        except APIKey.DoesNotExist:
+            return None
+        try:
+            subscription = api_key.user.subscription
+        except ObjectDoesNotExist:
+            subscription = None
+        identity = APIKeyIdentity(api_key.pk, api_key.user, subscription)
+        cache.set(digest, (identity, loaded_at))
+
+    if not identity.user.is_active:
+        return None
+    get_last_used_recorder().touch(identity.key_id)
+    # Requests may change their user; keep the cached one untouched
+    return copy.deepcopy(identity)
+
+
+def invalidate_api_key(key):
+    """Drop a key from the cache in every worker, e.g. when it is revoked."""
+    digest = hash_key(key)
+    get_key_cache().delete(digest)
+    mark_invalidated(invalidation_key(digest))
+
+
+def invalidate_user_api_keys(user_id):
+    """Reload the keys of a user whose account or subscription changed."""
+    mark_invalidated(user_invalidation_key(user_id))
+
+
+def invalidate_all_api_keys():
+    """Reload every key, e.g. when a plan changed."""
+    get_key_cache().clear()
+    mark_invalidated(INVALIDATED_ALL)
+
+
+class APIKeyAuthentication(authentication.BaseAuthentication):
+    """DRF authentication for ``Authorization: Api-Key <key>``."""
+    keyword = KEYWORD
+
+    def authenticate(self, request):
+        key = get_key_from_header(request)
+        if key is None:
+            return None
+        identity = resolve_api_key(key)
+        if identity is None:
+            raise exceptions.AuthenticationFailed('Invalid or revoked API key.')
+        return identity.user, identity
+
+    def authenticate_header(self, request):
+        return self.keyword
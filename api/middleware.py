@@ -0,0 +1,68 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import JsonResponse
+from django.urls import resolve, Resolver404
+from .authentication import get_key_from_header, resolve_api_key
+
+class APIKeyMiddleware:
+    """
+    Authenticate tool processing requests that carry an
+    ``Authorization: Api-Key <key>`` header instead of a session.
+    Must come after AuthenticationMiddleware.
+
+    Supports both sync and async request handling so that async views
+    are not funnelled through a single sync-middleware thread under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    api_key_views = {'tools:process', 'tools:process_async', 'tools:process_batch'}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key = get_key_from_header(request)
+        if key is not None and self._accepts_api_key(request):
+            identity = resolve_api_key(key)
+            if identity is None:
+                return self._invalid_key_response()
+            self._authenticate(request, identity)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        key = get_key_from_header(request)
+        if key is not None and self._accepts_api_key(request):
+            # Cache hits are cheap, but a miss queries the database
+            identity = await sync_to_async(resolve_api_key)(key)
+            if identity is None:
+                return self._invalid_key_response()
+            self._authenticate(request, identity)
+        return await self.get_response(request)
+
+    def _authenticate(self, request, identity):
+        request.user = identity.user
+        request.auser = self._auser(identity.user)
+        request.api_key = identity
+        # Key-authenticated requests don't come from a browser session
+        request._dont_enforce_csrf_checks = True
+
+    @staticmethod
+    def _auser(user):
+        async def auser():
+            return user
+        return auser
+
+    @staticmethod
+    def _invalid_key_response():
+        return JsonResponse({'success': False, 'error': 'Invalid or revoked API key.'}, status=401)
+
+    def _accepts_api_key(self, request):
+        try:
+            return resolve(request.path_info).view_name in self.api_key_views
+        except Resolver404:
+            return False
@@ -0,0 +1,45 @@
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from core.conditional import collection_state, make_etag
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified for ``list`` and ``retrieve``, computed from the
+    ``conditional_fields`` timestamps of the queryset. Matching conditional
+    requests get a 304 before the serializer runs.
+    """
+    conditional_fields = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(queryset, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        )
+        return self.conditional_response(queryset, super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, queryset, view, request, *args, **kwargs):
+        count, last_modified = collection_state(queryset, *self.conditional_fields)
+        etag = quote_etag(make_etag(
+            count,
+            last_modified.isoformat() if last_modified else '',
+            request.user.pk,
+            # The same data renders differently as JSON and in the browsable API
+            request.accepted_renderer.format,
+            request.query_params.urlencode(),
+        ))
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
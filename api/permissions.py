@@ -5,8 +5,8 @@ class IsOwner(permissions.BasePermission):
     Custom permission to only allow owners of an object to access it.
     """
     def has_object_permission(self, request, view, obj):
-        # Check if the object has a user attribute
-        if hasattr(obj, 'user'):
-            return obj.user == request.user
+        # Compare ids so the owner isn't loaded
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.pk
         # For UserProfile, the user is the object itself
-        return obj == request.user.userprofile
\ No newline at end of file
+        return obj == request.user_context.profile
\ No newline at end of file
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from accounts.models import UserProfile, APIKey
 from billing.models import Plan, Subscription
+from tools.models import ToolUsage
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,4 +35,12 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = ['id', 'plan', 'status', 'start_date', 'end_date', 'cancel_at_period_end']
-        read_only_fields = ['start_date', 'end_date']
\ No newline at end of file
+        read_only_fields = ['start_date', 'end_date']
+
+class ToolUsageSerializer(serializers.ModelSerializer):
+    tool = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+
+    class Meta:
+        model = ToolUsage
+        fields = ['id', 'tool', 'input_data', 'output_data', 'tokens_used', 'cost',
+                  'success', 'error_message', 'cache_hit', 'created_at']
@@ -1,10 +1,32 @@
 import uuid
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from accounts.models import APIKey
+from django.contrib.auth.models import User
+from accounts.models import APIKey, UserProfile
+from billing.models import Plan, Subscription
+from .authentication import invalidate_all_api_keys, invalidate_api_key, invalidate_user_api_keys
 
 @receiver(pre_save, sender=APIKey)
 def generate_api_key(sender, instance, **kwargs):
     """Generate a UUID-based API key if not already set."""
     if not instance.key:
-        instance.key = str(uuid.uuid4())
\ No newline at end of file
+        instance.key = str(uuid.uuid4())
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def invalidate_cached_api_key(sender, instance, **kwargs):
+    """Drop the key from the authentication cache (revoked, renamed or deleted)."""
+    invalidate_api_key(instance.key)
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_cached_user_api_keys(sender, instance, **kwargs):
+    """Cached keys carry the user, profile and subscription; reload them."""
+    invalidate_user_api_keys(instance.pk if sender is User else instance.user_id)
+
+@receiver(post_save, sender=Plan)
+def invalidate_cached_plan_api_keys(sender, instance, **kwargs):
+    """Cached keys carry their subscription's plan; reload them all."""
+    invalidate_all_api_keys()
@@ -1,3 +1,218 @@
-from django.test import TestCase
+import json
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import APIKey
+from tools.models import ToolUsage
+from billing.models import Plan, Subscription
+from tools.tests import create_tool
+from .authentication import (
+    get_key_cache, get_last_used_recorder, hash_key, invalidation_key, resolve_api_key
+)
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class APIKeyAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+        plan = Plan.objects.create(name='Basic', slug='basic', price=0, api_calls_limit=100)
+        now = timezone.now()
+        Subscription.objects.create(
+            user=cls.user, plan=plan, status='active',
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=29)
+        )
+        cls.tool = create_tool()
+        cls.api_key = APIKey.objects.create(user=cls.user, name='CI')
+
+    def setUp(self):
+        get_key_cache().clear()
+        self.auth = {'HTTP_AUTHORIZATION': f'Api-Key {self.api_key.key}'}
+
+    def test_api_accepts_key(self):
+        response = self.client.get('/api/profile/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_with_cached_key_is_a_single_query(self):
+        resolve_api_key(self.api_key.key)
+        # The key's user carries profile and subscription; only the profile list is read
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/profile/', **self.auth)
+        self.assertEqual(response.json()[0]['user']['username'], 'alice')
+
+    def test_api_rejects_unknown_key(self):
+        response = self.client.get('/api/profile/', HTTP_AUTHORIZATION='Api-Key not-a-key')
+        self.assertEqual(response.status_code, 401)
+
+    def test_lookup_is_cached(self):
+        resolve_api_key(self.api_key.key)
+        with self.assertNumQueries(0):
+            identity = resolve_api_key(self.api_key.key)
+        self.assertEqual(identity.user, self.user)
+        self.assertEqual(identity.subscription.plan.slug, 'basic')
+
+    def test_revoked_key_is_rejected(self):
+        self.assertIsNotNone(resolve_api_key(self.api_key.key))
+        self.client.force_login(self.user)
+        self.client.post(reverse('revoke-api-key', args=[self.api_key.pk]))
+        self.client.logout()
+        response = self.client.get('/api/profile/', **self.auth)
+        self.assertEqual(response.status_code, 401)
+
+    def test_revocation_in_another_worker_is_seen(self):
+        resolve_api_key(self.api_key.key)
+        # Another worker revoked the key: only the shared marker is set here
+        APIKey.objects.filter(pk=self.api_key.pk).update(is_active=False)
+        caches['default'].set(invalidation_key(hash_key(self.api_key.key)), time.time())
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolve_api_key(self.api_key.key))
+
+    def test_requests_get_their_own_user(self):
+        first = resolve_api_key(self.api_key.key)
+        first.user.first_name = 'Mallory'
+        second = resolve_api_key(self.api_key.key)
+        self.assertEqual(second.user.first_name, '')
+        self.assertIs(second.user.subscription, second.subscription)
+
+    def test_last_used_is_not_written_to_another_database(self):
+        recorder = get_last_used_recorder()
+        recorder.touch(self.api_key.pk)
+        with mock.patch('core.db.database_name', return_value='other'):
+            with self.assertNumQueries(0), self.assertNoLogs('api.authentication'):
+                recorder.close()
+        recorder.flush()
+
+    def process_with_key(self):
+        return self.client.post(
+            reverse('tools:process', args=[self.tool.slug]),
+            {'genre': 'fantasy', 'theme': 'friendship'},
+            content_type='application/json', **self.auth
+        )
+
+    def test_subscription_changes_reach_cached_keys(self):
+        self.assertEqual(self.process_with_key().status_code, 200)
+        subscription = Subscription.objects.get(user=self.user)
+        subscription.cancel_at_period_end = True
+        subscription.save_changes()
+        self.assertEqual(self.process_with_key().status_code, 403)
+
+    def test_plan_changes_reach_cached_keys(self):
+        resolve_api_key(self.api_key.key)
+        plan = Plan.objects.get(slug='basic')
+        plan.api_calls_limit = 500
+        plan.save()
+        with self.assertNumQueries(1):
+            identity = resolve_api_key(self.api_key.key)
+        self.assertEqual(identity.subscription.plan.api_calls_limit, 500)
+
+    def test_process_tool_with_key_skips_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(
+            reverse('tools:process', args=[self.tool.slug]),
+            json.dumps({'genre': 'fantasy', 'theme': 'friendship'}),
+            content_type='application/json',
+            **self.auth
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bob', password='secret')
+        cls.plan = Plan.objects.create(name='Pro', slug='pro', price=29, api_calls_limit=1000)
+        now = timezone.now()
+        Subscription.objects.create(
+            user=cls.user, plan=cls.plan, status='active',
+            start_date=now - timedelta(days=1), end_date=now + timedelta(days=29)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, url, etag=None):
+        headers = {'Accept': 'application/json'}
+        if etag:
+            headers['If-None-Match'] = etag
+        return self.client.get(url, headers=headers)
+
+    def test_plan_list_not_modified(self):
+        etag = self.get('/api/plans/')['ETag']
+        response = self.get('/api/plans/', etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Plan.objects.create(name='Team', slug='team', price=99, api_calls_limit=10000)
+        self.assertEqual(self.get('/api/plans/', etag).status_code, 200)
+
+    def test_plan_detail_not_modified(self):
+        url = f'/api/plans/{self.plan.pk}/'
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        self.assertEqual(self.get('/api/plans/0/', etag).status_code, 404)
+
+    def test_subscription_changes_with_its_plan(self):
+        etag = self.get('/api/subscription/')['ETag']
+        self.assertEqual(self.get('/api/subscription/', etag).status_code, 304)
+        self.plan.api_calls_limit = 2000
+        self.plan.save()
+        self.assertEqual(self.get('/api/subscription/', etag).status_code, 200)
+
+
+@override_settings(API_PAGE_SIZE=4)
+class UsageListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('carol', password='secret')
+        other = User.objects.create_user('dave', password='secret')
+        tool = create_tool()
+        ToolUsage.objects.bulk_create([
+            ToolUsage(user=user, tool=tool, input_data={'n': n}, output_data={},
+                      tokens_used=n, cost=0)
+            for n in range(10) for user in (cls.user, other)
+        ])
+        # Several rows share a timestamp; the id breaks the tie
+        ToolUsage.objects.filter(user=cls.user, tokens_used__in=[3, 4, 5]).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_walks_every_usage_once_newest_first(self):
+        url, seen = '/api/usage/', []
+        while url:
+            data = self.client.get(url, headers={'Accept': 'application/json'}).json()
+            self.assertLessEqual(len(data['results']), 4)
+            seen.extend(data['results'])
+            url = data['next']
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len({row['id'] for row in seen}), 10)
+        keys = [(row['created_at'], row['id']) for row in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_previous_link_returns_to_earlier_page(self):
+        first = self.client.get('/api/usage/').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_page_cost_does_not_grow_with_depth(self):
+        first = self.client.get('/api/usage/').json()
+        second = self.client.get(first['next']).json()
+        # session, user, page; no COUNT and no OFFSET
+        with self.assertNumQueries(3):
+            self.client.get(second['next'])
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get('/api/usage/', {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 404)
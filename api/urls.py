@@ -7,6 +7,7 @@ router.register(r'profile', views.UserProfileViewSet, basename='profile')
 router.register(r'keys', views.APIKeyViewSet, basename='apikey')
 router.register(r'plans', views.PlanViewSet, basename='plan')
 router.register(r'subscription', views.SubscriptionViewSet, basename='subscription')
+router.register(r'usage', views.ToolUsageViewSet, basename='usage')
 
 urlpatterns = [
     path('', views.APIRootView.as_view(), name='api-root'),
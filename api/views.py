@@ -5,10 +5,13 @@ from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from .serializers import (
     UserProfileSerializer, APIKeySerializer,
-    PlanSerializer, SubscriptionSerializer
+    PlanSerializer, SubscriptionSerializer, ToolUsageSerializer
 )
 from accounts.models import UserProfile, APIKey
 from billing.models import Plan, Subscription
+from tools.models import ToolUsage
+from .mixins import ConditionalGetMixin
+from .pagination import KeysetPagination
 from .permissions import IsOwner
 
 class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
@@ -16,7 +19,7 @@ class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsOwner]
 
     def get_queryset(self):
-        return UserProfile.objects.filter(user=self.request.user)
+        return UserProfile.objects.filter(user=self.request.user).select_related('user')
 
 class APIKeyViewSet(viewsets.ModelViewSet):
     serializer_class = APIKeySerializer
@@ -28,17 +31,27 @@ class APIKeyViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class PlanViewSet(viewsets.ReadOnlyModelViewSet):
+class PlanViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Plan.objects.filter(is_active=True)
     serializer_class = PlanSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
+class SubscriptionViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = SubscriptionSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
+    # The serializer nests the plan
+    conditional_fields = ('updated_at', 'plan__updated_at')
 
     def get_queryset(self):
-        return Subscription.objects.filter(user=self.request.user)
+        return Subscription.objects.filter(user=self.request.user).select_related('plan')
+
+class ToolUsageViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = ToolUsageSerializer
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return ToolUsage.objects.filter(user=self.request.user).select_related('tool', 'payload')
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -71,4 +84,5 @@ class APIRootView(APIView):
             'api_keys': request.build_absolute_uri('/api/keys/'),
             'plans': request.build_absolute_uri('/api/plans/'),
             'subscription': request.build_absolute_uri('/api/subscription/'),
+            'usage': request.build_absolute_uri('/api/usage/'),
         })
@@ -0,0 +1,8 @@
+from django.core.checks import register
+
+from core.storage import private_storage_errors
+
+
+@register()
+def invoice_storage_check(app_configs, **kwargs):
+    return private_storage_errors('INVOICE_PDF_STORAGE', 'billing.E001')
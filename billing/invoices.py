@@ -0,0 +1,140 @@
+"""
+Invoice PDFs.
+
+A PDF is rendered from a plain ``invoice_context()`` dict, so rendering
+needs no database access and can run in worker processes (see the
+``render_invoices`` command). Rendered files are kept in the private
+``INVOICE_PDF_STORAGE`` storage (never under MEDIA_ROOT; the ``invoice_pdf``
+view is the only way to download them) under a content address: invoice id,
+``updated_at`` and a digest of everything printed on the page. A changed
+invoice, customer name or plan therefore gets a new file, and an unchanged
+one is served straight from storage.
+"""
+import hashlib
+import io
+import json
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+
+
+def get_storage():
+    return storages[settings.INVOICE_PDF_STORAGE]
+
+
+def invoice_context(invoice):
+    """
+    Everything printed on the invoice. Load the invoice with
+    ``select_related('user', 'subscription__plan')`` to avoid extra queries.
+    """
+    context = {
+        'number': invoice.id,
+        'date': invoice.created_at.strftime('%B %d, %Y'),
+        'due_date': invoice.due_date.strftime('%B %d, %Y'),
+        'status': invoice.status.title(),
+        'customer': invoice.user.get_full_name() or invoice.user.username,
+        'email': invoice.user.email,
+        'plan': None,
+        'period': None,
+        'amount': str(invoice.amount),
+    }
+    if invoice.subscription:
+        subscription = invoice.subscription
+        context['plan'] = subscription.plan.name
+        context['period'] = (
+            f"{subscription.start_date.strftime('%B %d, %Y')} - "
+            f"{subscription.end_date.strftime('%B %d, %Y')}"
+        )
+    return context
+
+
+def render_pdf(context):
+    """Render an invoice context to PDF bytes."""
+    # reportlab is slow to import; only pay for it when a PDF is rendered
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen import canvas
+
+    # Create a file-like buffer to receive PDF data
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+
+    # Header
+    p.setFont("Helvetica-Bold", 24)
+    p.drawString(1*inch, 10*inch, "Invoice")
+
+    # Invoice details
+    p.setFont("Helvetica", 12)
+    p.drawString(1*inch, 9*inch, f"Invoice Number: {context['number']}")
+    p.drawString(1*inch, 8.5*inch, f"Date: {context['date']}")
+    p.drawString(1*inch, 8*inch, f"Due Date: {context['due_date']}")
+    p.drawString(1*inch, 7.5*inch, f"Status: {context['status']}")
+
+    # Customer details
+    p.drawString(1*inch, 6.5*inch, "Bill To:")
+    p.drawString(1*inch, 6*inch, context['customer'])
+    p.drawString(1*inch, 5.5*inch, f"Email: {context['email']}")
+
+    # Subscription details
+    if context['plan'] is not None:
+        p.drawString(1*inch, 4.5*inch, "Subscription Details:")
+        p.drawString(1*inch, 4*inch, f"Plan: {context['plan']}")
+        p.drawString(1*inch, 3.5*inch, f"Period: {context['period']}")
+
+    # Amount
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(1*inch, 2*inch, f"Total Amount: ${context['amount']}")
+
+    # Close the PDF object cleanly
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def invoice_directory(invoice_id):
+    return f'{settings.INVOICE_PDF_PREFIX}/{invoice_id}'
+
+
+def pdf_name(invoice, context):
+    digest = hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest()[:16]
+    return f'{invoice_directory(invoice.id)}/{invoice.updated_at.strftime("%Y%m%d%H%M%S%f")}-{digest}.pdf'
+
+
+def rendered_at(name):
+    """The fixed-width ``updated_at`` stamp a PDF name starts with."""
+    return name.rsplit('/', 1)[-1].split('-', 1)[0]
+
+
+def store_pdf(invoice_id, name, pdf):
+    """Save a rendered PDF and drop the invoice's older renderings."""
+    storage = get_storage()
+    saved = storage.save(name, ContentFile(pdf))
+    if saved != name:
+        # Someone else rendered it concurrently; keep theirs
+        storage.delete(saved)
+    directory = invoice_directory(invoice_id)
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        path = f'{directory}/{filename}'
+        # Keep anything newer: a request that loaded the invoice later may
+        # have stored it. Same-stamp files differ only in customer or plan
+        # details; get_invoice_pdf re-renders if it loses such a race.
+        if path != name and rendered_at(filename) <= rendered_at(name):
+            storage.delete(path)
+
+
+def get_invoice_pdf(invoice):
+    """Open the stored PDF for ``invoice``, rendering and storing it first if needed."""
+    context = invoice_context(invoice)
+    name = pdf_name(invoice, context)
+    try:
+        return get_storage().open(name, 'rb')
+    except FileNotFoundError:
+        pdf = render_pdf(context)
+    store_pdf(invoice.id, name, pdf)
+    # Not reopened: a newer rendering may replace it at any moment
+    return ContentFile(pdf, name=name)
@@ -0,0 +1,66 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from billing.invoices import get_storage, invoice_context, pdf_name, render_pdf, store_pdf
+from billing.models import Invoice
+
+
+class Command(BaseCommand):
+    help = ('Pre-renders the PDFs of one billing cycle (invoices created in a month) '
+            'in a process pool, so downloads are served from storage')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Billing cycle as YYYY-MM (default: current month)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Rendering processes')
+        parser.add_argument('--force', action='store_true',
+                            help='Render even if a current PDF is already stored')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                first_day = datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--month must be in YYYY-MM format')
+        else:
+            first_day = timezone.localdate().replace(day=1)
+        start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+        end = start + relativedelta(months=1)
+
+        # One query for the whole cycle; workers get plain dicts and never touch the database
+        invoices = Invoice.objects.filter(
+            created_at__gte=start, created_at__lt=end
+        ).select_related('user', 'subscription__plan').order_by('id')
+
+        storage = get_storage()
+        jobs = []
+        total = 0
+        for invoice in invoices.iterator(chunk_size=2000):
+            total += 1
+            context = invoice_context(invoice)
+            name = pdf_name(invoice, context)
+            if options['force'] or not storage.exists(name):
+                jobs.append((invoice.id, name, context))
+
+        started = time.perf_counter()
+        if jobs:
+            workers = max(1, min(options['workers'], len(jobs)))
+            chunksize = max(1, min(100, len(jobs) // (workers * 4)))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pdfs = executor.map(render_pdf, [context for _, _, context in jobs], chunksize=chunksize)
+                for (invoice_id, name, _), pdf in zip(jobs, pdfs):
+                    if options['force']:
+                        storage.delete(name)
+                    store_pdf(invoice_id, name, pdf)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {len(jobs)} invoice PDFs for {first_day:%Y-%m} in {elapsed:.1f}s '
+            f'({total - len(jobs)} already current)'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from billing.resets import BATCH_SIZE, reset_due_subscriptions
+
+
+class Command(BaseCommand):
+    help = ('Reset API calls count for subscriptions in new billing period. '
+            'Safe to re-run: subscriptions already reset for their period are skipped')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Subscriptions reset per UPDATE')
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{stats.subscriptions} reset ({stats.rate:.0f}/s)')
+
+        stats = reset_due_subscriptions(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Reset API calls count for {stats.subscriptions} subscriptions '
+            f'in {stats.batches} batches, {stats.seconds:.2f}s ({stats.rate:.0f}/s)'
+        ))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Continue each month after the highest number already issued."""
+    Invoice = apps.get_model('billing', 'Invoice')
+    InvoiceSequence = apps.get_model('billing', 'InvoiceSequence')
+    db = schema_editor.connection.alias
+    highest = {}
+    for number in Invoice.objects.using(db).values_list('invoice_number', flat=True).iterator():
+        prefix, _, value = number.rpartition('-')
+        if prefix and value.isdigit():
+            highest[prefix] = max(highest.get(prefix, 0), int(value))
+    InvoiceSequence.objects.using(db).bulk_create(
+        InvoiceSequence(prefix=prefix, next_value=value + 1) for prefix, value in highest.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=20, unique=True)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_invoice_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='api_calls_reset_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from accounts.models import UserProfile
+from core.tracking import FieldTrackerMixin
+from tools.quota import get_quota_backend
+from .sequences import invoice_numbers, next_invoice_number
 
 class Plan(models.Model):
     name = models.CharField(max_length=50)
@@ -18,7 +22,7 @@ class Plan(models.Model):
     def __str__(self):
         return self.name
 
-class Subscription(models.Model):
+class Subscription(FieldTrackerMixin, models.Model):
     STATUS_CHOICES = [
         ('active', 'Active'),
         ('cancelled', 'Cancelled'),
@@ -32,26 +36,57 @@ class Subscription(models.Model):
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
     cancel_at_period_end = models.BooleanField(default=False)
+    api_calls_reset_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.plan.name}"
 
+    def is_current(self, now=None):
+        """Active and within its billing period."""
+        now = now or timezone.now()
+        return self.status == 'active' and self.start_date <= now <= self.end_date
+
     def reset_api_calls_count(self):
         """Reset the API calls count at the start of new billing period"""
-        self.user.userprofile.api_calls_count = 0
-        self.user.userprofile.save()
+        UserProfile.objects.filter(user_id=self.user_id).update(api_calls_count=0)
+        get_quota_backend().reset(self.user_id)
+        self.api_calls_reset_at = timezone.now()
 
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
         # If this is a new subscription or the end_date has changed
-        if not self.pk or self._state.adding or (
-            self.pk and self.end_date != Subscription.objects.get(pk=self.pk).end_date
+        if self._state.adding or (
+            self.has_changed('end_date') and (update_fields is None or 'end_date' in update_fields)
         ):
             self.reset_api_calls_count()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'api_calls_reset_at'}
         super().save(*args, **kwargs)
 
-class Invoice(models.Model):
+class InvoiceSequence(models.Model):
+    """Next free invoice number for a prefix (see billing/sequences.py)."""
+    prefix = models.CharField(max_length=20, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.prefix} -> {self.next_value}"
+
+class InvoiceManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Number invoices that have no invoice_number with one counter update."""
+        objs = list(objs)
+        unnumbered = [invoice for invoice in objs if not invoice.invoice_number]
+        if not unnumbered:
+            return super().bulk_create(objs, *args, **kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            numbers = invoice_numbers(len(unnumbered), using=self.db)
+            for invoice, number in zip(unnumbered, numbers):
+                invoice.invoice_number = number
+            return super().bulk_create(objs, *args, **kwargs)
+
+class Invoice(FieldTrackerMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('open', 'Open'),
@@ -70,12 +105,12 @@ class Invoice(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     invoice_number = models.CharField(max_length=50, unique=True)
 
+    objects = InvoiceManager()
+
     def __str__(self):
         return f"Invoice #{self.invoice_number} - {self.user.username}"
 
     def save(self, *args, **kwargs):
         if not self.invoice_number:
-            last_invoice = Invoice.objects.order_by('-id').first()
-            next_number = (last_invoice.id + 1) if last_invoice else 1
-            self.invoice_number = f"INV-{timezone.now().strftime('%Y%m')}-{next_number:04d}"
+            self.invoice_number = next_invoice_number(using=kwargs.get('using'))
         super().save(*args, **kwargs)
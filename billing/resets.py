@@ -0,0 +1,103 @@
+"""
+Set-based reset of API call counters at the start of a billing period.
+
+Billing periods are monthly, starting on the anniversaries of
+``Subscription.start_date``. A subscription is due when its current period
+started after its last reset (``Subscription.api_calls_reset_at``). Current
+subscriptions are walked in primary-key batches; the due ones of each batch
+get ``UserProfile.api_calls_count`` zeroed with one
+``UPDATE ... WHERE user_id IN (...)`` and the reset recorded in the same
+transaction, so an interrupted run simply continues where it stopped and a
+repeated run does nothing.
+"""
+import time
+from dataclasses import dataclass
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from tools.quota import get_quota_backend
+
+from .models import Subscription
+
+BATCH_SIZE = 5000
+
+
+@dataclass
+class ResetStats:
+    subscriptions: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self):
+        return self.subscriptions / self.seconds if self.seconds else 0.0
+
+
+def period_start(start_date, now):
+    """Start of the monthly billing period containing ``now``."""
+    months = (now.year - start_date.year) * 12 + now.month - start_date.month
+    # Counted from start_date each time, so a period started on the 31st
+    # begins on the last day of shorter months and the 31st again after
+    start = start_date + relativedelta(months=months)
+    if start > now:
+        start = start_date + relativedelta(months=months - 1)
+    return max(start, start_date)
+
+
+def is_due(start_date, reset_at, now):
+    return reset_at is None or reset_at < period_start(start_date, now)
+
+
+def due_batches(now, batch_size=BATCH_SIZE):
+    """
+    Yield lists of ``(pk, user_id)`` of due subscriptions, from
+    ``batch_size`` current subscriptions at a time.
+    """
+    current = Subscription.objects.filter(
+        status='active', start_date__lte=now, end_date__gte=now
+    ).order_by('pk').values_list('pk', 'user_id', 'start_date', 'api_calls_reset_at')
+    last_pk = 0
+    while True:
+        rows = list(current.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        due = [
+            (pk, user_id) for pk, user_id, start_date, reset_at in rows
+            if is_due(start_date, reset_at, now)
+        ]
+        if due:
+            yield due
+
+
+def due_subscriptions(now=None):
+    """Primary keys of the subscriptions due for a reset."""
+    now = now or timezone.now()
+    return [pk for batch in due_batches(now) for pk, _ in batch]
+
+
+def reset_due_subscriptions(now=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Reset every due subscription and return ``ResetStats``. ``progress`` is
+    called with the running stats after each batch.
+    """
+    now = now or timezone.now()
+    stats = ResetStats()
+    started = time.perf_counter()
+    for batch in due_batches(now, batch_size):
+        pks, user_ids = zip(*batch)
+        with transaction.atomic(savepoint=False):
+            UserProfile.objects.filter(user_id__in=user_ids).update(api_calls_count=0)
+            Subscription.objects.filter(pk__in=pks).update(api_calls_reset_at=now)
+        get_quota_backend().reset_many(user_ids)
+
+        stats.subscriptions += len(pks)
+        stats.batches += 1
+        stats.seconds = time.perf_counter() - started
+        if progress is not None:
+            progress(stats)
+    stats.seconds = time.perf_counter() - started
+    return stats
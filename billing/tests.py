@@ -1,3 +1,340 @@
-from django.test import TestCase
+import io
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import UserProfile
+
+from . import checks, invoices, resets, sequences
+from .models import Invoice, InvoiceSequence, Plan, Subscription
+
+
+class PricingConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = Plan.objects.create(name='Basic', slug='basic', price=9, api_calls_limit=100)
+
+    def test_unchanged_plans_are_not_modified(self):
+        url = reverse('billing:pricing')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.plan.price = 19
+        self.plan.save()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_pending_messages_are_shown(self):
+        user = User.objects.create_user('bob', password='secret')
+        self.client.force_login(user)
+        url = reverse('billing:pricing')
+        etag = self.client.get(url)['ETag']
+        # Flows like a cancelled payment redirect here with a flash message
+        response = self.client.get(reverse('payments:cancel'), headers={'If-None-Match': etag}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Payment was cancelled.')
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'private': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+})
+class InvoicePdfTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', email='alice@example.com', password='secret')
+        plan = Plan.objects.create(name='Pro', slug='pro', price=29, api_calls_limit=1000)
+        now = timezone.now()
+        subscription = Subscription.objects.create(
+            user=cls.user, plan=plan, status='active',
+            start_date=now, end_date=now + timedelta(days=30)
+        )
+        cls.invoice = Invoice.objects.create(
+            user=cls.user, subscription=subscription, amount=29, due_date=date.today()
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('billing:invoice_pdf', args=[self.invoice.id])
+        # The in-memory storage outlives a single test
+        for name in self.stored_files():
+            invoices.get_storage().delete(f'{invoices.invoice_directory(self.invoice.id)}/{name}')
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        return b''.join(response.streaming_content)
+
+    def stored_files(self):
+        try:
+            _, files = invoices.get_storage().listdir(invoices.invoice_directory(self.invoice.id))
+        except FileNotFoundError:
+            return []
+        return files
+
+    def test_pdf_is_rendered_once_and_served_from_storage(self):
+        pdf = self.download()
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        with mock.patch.object(invoices, 'render_pdf') as render_pdf:
+            # session, user, invoice with user and plan
+            with self.assertNumQueries(3):
+                self.assertEqual(self.download(), pdf)
+        render_pdf.assert_not_called()
+
+    def test_changed_invoice_gets_a_new_pdf(self):
+        self.download()
+        [old] = self.stored_files()
+        self.user.first_name = 'Alice'
+        self.user.last_name = 'Smith'
+        self.user.save()
+        self.download()
+        [new] = self.stored_files()
+        self.assertNotEqual(old, new)
+
+    def test_older_rendering_keeps_newer_files(self):
+        self.download()
+        [current] = self.stored_files()
+        directory = invoices.invoice_directory(self.invoice.id)
+        # A request that loaded the invoice before its last update
+        invoices.store_pdf(self.invoice.id, f'{directory}/20000101000000000000-stale.pdf', b'%PDF-old')
+        self.assertIn(current, self.stored_files())
+        self.assertTrue(self.download().startswith(b'%PDF-1'))
+
+    def test_pdf_deleted_before_it_is_opened_is_rendered_again(self):
+        self.download()
+        storage = invoices.get_storage()
+        open_stored = storage.open
+
+        def open_after_concurrent_delete(name, mode='rb'):
+            storage.delete(name)
+            return open_stored(name, mode)
+
+        with mock.patch.object(storage, 'open', open_after_concurrent_delete):
+            self.assertTrue(self.download().startswith(b'%PDF'))
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_public_storage_is_refused(self):
+        self.assertEqual(checks.invoice_storage_check(None), [])
+        public = {'BACKEND': 'django.core.files.storage.FileSystemStorage'}
+        with override_settings(STORAGES={'default': public}, INVOICE_PDF_STORAGE='default'):
+            [error] = checks.invoice_storage_check(None)
+        self.assertEqual(error.id, 'billing.E001')
+
+    def test_render_invoices_command(self):
+        out = io.StringIO()
+        call_command('render_invoices', '--workers', '1', stdout=out)
+        self.assertIn('Rendered 1 invoice PDFs', out.getvalue())
+        self.assertEqual(len(self.stored_files()), 1)
+        call_command('render_invoices', stdout=out)
+        self.assertIn('Rendered 0 invoice PDFs', out.getvalue())
+
+
+class InvoiceNumberTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+        cls.prefix = sequences.invoice_prefix()
+
+    def new_invoice(self, **kwargs):
+        return Invoice(user=self.user, amount=10, due_date=date.today(), **kwargs)
+
+    def test_numbers_are_consecutive_per_month(self):
+        first = Invoice.objects.create(user=self.user, amount=10, due_date=date.today())
+        second = Invoice.objects.create(user=self.user, amount=10, due_date=date.today())
+        self.assertEqual(first.invoice_number, f'{self.prefix}-0001')
+        self.assertEqual(second.invoice_number, f'{self.prefix}-0002')
+
+    def test_bulk_create_numbers_a_batch_with_one_counter_update(self):
+        Invoice.objects.create(user=self.user, amount=10, due_date=date.today())
+        batch = [self.new_invoice() for _ in range(50)]
+        batch.append(self.new_invoice(invoice_number='MANUAL-1'))
+        # select counter, update counter, insert
+        with self.assertNumQueries(3):
+            Invoice.objects.bulk_create(batch)
+        self.assertEqual(
+            [invoice.invoice_number for invoice in batch[:50]],
+            [f'{self.prefix}-{n:04d}' for n in range(2, 52)],
+        )
+        self.assertEqual(batch[-1].invoice_number, 'MANUAL-1')
+
+    def test_rolled_back_numbers_are_reused(self):
+        try:
+            with transaction.atomic():
+                Invoice.objects.bulk_create([self.new_invoice() for _ in range(3)])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        invoice = Invoice.objects.create(user=self.user, amount=10, due_date=date.today())
+        self.assertEqual(invoice.invoice_number, f'{self.prefix}-0001')
+
+
+class InvoiceNumberBlockTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret')
+        self.prefix = sequences.invoice_prefix()
+        sequences.get_allocator().clear()
+        self.addCleanup(sequences.get_allocator().clear)
+
+    @override_settings(INVOICE_NUMBER_BLOCK_SIZE=5)
+    def test_numbers_come_from_a_reserved_block(self):
+        allocator = sequences.BlockAllocator()
+        self.assertEqual(allocator.allocate(self.prefix), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual([allocator.allocate(self.prefix) for _ in range(4)], [2, 3, 4, 5])
+        # Another process' block starts after ours
+        self.assertEqual(sequences.BlockAllocator().allocate(self.prefix), 6)
+        self.assertEqual(allocator.allocate(self.prefix), 11)
+        self.assertEqual(InvoiceSequence.objects.get(prefix=self.prefix).next_value, 16)
+
+    def test_saving_an_invoice_outside_a_transaction_is_a_single_insert(self):
+        Invoice.objects.create(user=self.user, amount=10, due_date=date.today())
+        with self.assertNumQueries(1):
+            invoice = Invoice.objects.create(user=self.user, amount=10, due_date=date.today())
+        self.assertEqual(invoice.invoice_number, f'{self.prefix}-0002')
+
+
+class ApiCallsResetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = Plan.objects.create(name='Pro', slug='pro', price=29, api_calls_limit=1000)
+        cls.now = timezone.now()
+        cls.subscriptions = []
+        for i in range(5):
+            user = User.objects.create_user(f'user{i}', password='secret')
+            cls.subscriptions.append(Subscription.objects.create(
+                user=user, plan=cls.plan, status='active',
+                start_date=cls.now - timedelta(days=1), end_date=cls.now + timedelta(days=29)
+            ))
+        cancelled = User.objects.create_user('cancelled', password='secret')
+        Subscription.objects.create(
+            user=cancelled, plan=cls.plan, status='cancelled',
+            start_date=cls.now - timedelta(days=1), end_date=cls.now + timedelta(days=29)
+        )
+
+    def setUp(self):
+        # Every subscription has used calls in a period that has since rolled over
+        Subscription.objects.update(api_calls_reset_at=self.now - timedelta(days=31))
+        UserProfile.objects.update(api_calls_count=7)
+
+    def test_due_subscriptions_are_reset_in_batches(self):
+        # per batch: select, update profiles, update subscriptions; plus the final empty select
+        with self.assertNumQueries(3 * 3 + 1):
+            stats = resets.reset_due_subscriptions(batch_size=2)
+        self.assertEqual((stats.subscriptions, stats.batches), (5, 3))
+        counts = dict(UserProfile.objects.values_list('user__username', 'api_calls_count'))
+        self.assertEqual(counts.pop('cancelled'), 7)
+        self.assertEqual(set(counts.values()), {0})
+
+    def test_reset_is_idempotent(self):
+        resets.reset_due_subscriptions()
+        UserProfile.objects.update(api_calls_count=3)
+        stats = resets.reset_due_subscriptions()
+        self.assertEqual(stats.subscriptions, 0)
+        self.assertEqual(set(UserProfile.objects.values_list('api_calls_count', flat=True)), {3})
+
+    def test_interrupted_run_resumes(self):
+        # Only the first two were reset before the run stopped
+        first_two = [subscription.pk for subscription in self.subscriptions[:2]]
+        Subscription.objects.filter(pk__in=first_two).update(api_calls_reset_at=self.now)
+        self.assertEqual(resets.reset_due_subscriptions().subscriptions, 3)
+        self.assertEqual(resets.due_subscriptions(), [])
+
+    def test_counts_reset_on_each_monthly_anniversary(self):
+        user = User.objects.create_user('eve', password='secret')
+        subscription = Subscription.objects.create(
+            user=user, plan=self.plan, status='active',
+            start_date=self.now, end_date=self.now + timedelta(days=365)
+        )
+        UserProfile.objects.filter(user=user).update(api_calls_count=99)
+
+        def api_calls_count():
+            return UserProfile.objects.get(user=user).api_calls_count
+
+        # Still in the first period: created (and reset) within it
+        resets.reset_due_subscriptions(now=self.now + timedelta(days=20))
+        self.assertEqual(api_calls_count(), 99)
+        # 40 days in, the second period started 10 days ago
+        resets.reset_due_subscriptions(now=self.now + timedelta(days=40))
+        self.assertEqual(api_calls_count(), 0)
+        UserProfile.objects.filter(user=user).update(api_calls_count=5)
+        self.assertNotIn(subscription.pk, resets.due_subscriptions(now=self.now + timedelta(days=45)))
+        self.assertIn(subscription.pk, resets.due_subscriptions(now=self.now + timedelta(days=70)))
+
+    def test_period_starts_on_monthly_anniversaries(self):
+        start = datetime(2026, 1, 31, 9, tzinfo=dt_timezone.utc)
+        self.assertEqual(resets.period_start(start, start), start)
+        self.assertEqual(
+            resets.period_start(start, datetime(2026, 3, 1, tzinfo=dt_timezone.utc)),
+            datetime(2026, 2, 28, 9, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(
+            resets.period_start(start, datetime(2026, 3, 31, 8, tzinfo=dt_timezone.utc)),
+            datetime(2026, 2, 28, 9, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(
+            resets.period_start(start, datetime(2026, 3, 31, 10, tzinfo=dt_timezone.utc)),
+            datetime(2026, 3, 31, 9, tzinfo=dt_timezone.utc)
+        )
+
+    def test_reset_api_calls_command(self):
+        out = io.StringIO()
+        call_command('reset_api_calls', '--batch-size', '2', stdout=out)
+        self.assertIn('Reset API calls count for 5 subscriptions in 3 batches', out.getvalue())
+
+
+class SubscriptionChangeTrackingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+        cls.plan = Plan.objects.create(name='Pro', slug='pro', price=29, api_calls_limit=1000)
+        now = timezone.now()
+        cls.subscription = Subscription.objects.create(
+            user=cls.user, plan=cls.plan, status='active',
+            start_date=now, end_date=now + timedelta(days=30)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        UserProfile.objects.filter(user=self.user).update(api_calls_count=7)
+
+    def api_calls_count(self):
+        return UserProfile.objects.get(user=self.user).api_calls_count
+
+    def test_cancel_is_a_single_update(self):
+        subscription = Subscription.objects.get(pk=self.subscription.pk)
+        subscription.cancel_at_period_end = True
+        self.assertEqual(subscription.changed_fields(), ['cancel_at_period_end'])
+        with self.assertNumQueries(1):
+            self.assertTrue(subscription.save_changes())
+        self.assertFalse(subscription.has_changed('cancel_at_period_end'))
+        with self.assertNumQueries(0):
+            self.assertFalse(subscription.save_changes())
+        self.assertEqual(self.api_calls_count(), 7)
+
+    def test_new_end_date_resets_api_calls(self):
+        subscription = Subscription.objects.get(pk=self.subscription.pk)
+        subscription.end_date += timedelta(days=30)
+        subscription.save_changes()
+        self.assertEqual(self.api_calls_count(), 0)
+        subscription.refresh_from_db()
+        self.assertIsNotNone(subscription.api_calls_reset_at)
+
+    def test_cancel_view(self):
+        with self.assertNumQueries(4):  # session, user, subscription, update
+            self.client.post(reverse('billing:cancel_subscription'))
+        self.subscription.refresh_from_db()
+        self.assertTrue(self.subscription.cancel_at_period_end)
@@ -1,15 +1,39 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import FileResponse
 from django.utils import timezone
-from dateutil.relativedelta import relativedelta
 from .models import Plan, Subscription, Invoice
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
+from .invoices import get_invoice_pdf
+from core.conditional import (
+    collection_state, latest, make_etag, page_condition, request_memo, viewer_state
+)
 
+def pricing_state(request):
+    """State of the active plans and the viewer's current subscription."""
+    def compute():
+        plans = collection_state(Plan.objects.filter(is_active=True), 'updated_at')
+        subscription = None
+        if request.user.is_authenticated:
+            subscription = Subscription.objects.filter(
+                user=request.user,
+                status='active'
+            ).values('pk', 'updated_at').first()
+        return plans, subscription or {}
+    return request_memo(request, 'pricing', compute)
+
+def pricing_etag(request):
+    (count, plans_modified), subscription = pricing_state(request)
+    return make_etag(
+        count, plans_modified.isoformat() if plans_modified else '',
+        subscription.get('pk'), subscription.get('updated_at'), *viewer_state(request)
+    )
+
+def pricing_last_modified(request):
+    (count, plans_modified), subscription = pricing_state(request)
+    return latest(plans_modified, subscription.get('updated_at'))
+
+@page_condition(etag_func=pricing_etag, last_modified_func=pricing_last_modified)
 def pricing(request):
     """Display available pricing plans"""
     plans = Plan.objects.filter(is_active=True).order_by('price')
@@ -70,9 +94,10 @@ def change_plan(request, plan_slug):
             if current_subscription:
                 current_subscription.plan = plan
                 current_subscription.cancel_at_period_end = False
-                current_subscription.save()
+                current_subscription.save_changes()
             else:
                 # Create new subscription for free plan
+                from dateutil.relativedelta import relativedelta
                 start_date = timezone.now()
                 end_date = start_date + relativedelta(months=1)
                 
@@ -101,7 +126,7 @@ def cancel_subscription(request):
         )
         
         subscription.cancel_at_period_end = True
-        subscription.save()
+        subscription.save_changes()
         
         messages.success(request, "Your subscription has been scheduled for cancellation at the end of the billing period.")
     
@@ -118,7 +143,7 @@ def reactivate_subscription(request):
         )
         
         subscription.cancel_at_period_end = False
-        subscription.save()
+        subscription.save_changes()
         
         messages.success(request, "Your subscription has been reactivated.")
     
@@ -126,50 +151,16 @@ def reactivate_subscription(request):
 
 @login_required
 def invoice_pdf(request, invoice_id):
-    """Generate PDF invoice"""
-    invoice = get_object_or_404(Invoice, id=invoice_id, user=request.user)
-    
-    # Create a file-like buffer to receive PDF data
-    buffer = io.BytesIO()
-    
-    # Create the PDF object, using the buffer as its "file."
-    p = canvas.Canvas(buffer, pagesize=letter)
-    
-    # Draw things on the PDF
-    # Header
-    p.setFont("Helvetica-Bold", 24)
-    p.drawString(1*inch, 10*inch, "Invoice")
-    
-    # Invoice details
-    p.setFont("Helvetica", 12)
-    p.drawString(1*inch, 9*inch, f"Invoice Number: {invoice.id}")
-    p.drawString(1*inch, 8.5*inch, f"Date: {invoice.created_at.strftime('%B %d, %Y')}")
-    p.drawString(1*inch, 8*inch, f"Due Date: {invoice.due_date.strftime('%B %d, %Y')}")
-    p.drawString(1*inch, 7.5*inch, f"Status: {invoice.status.title()}")
-    
-    # Customer details
-    p.drawString(1*inch, 6.5*inch, "Bill To:")
-    p.drawString(1*inch, 6*inch, f"{invoice.user.get_full_name() or invoice.user.username}")
-    p.drawString(1*inch, 5.5*inch, f"Email: {invoice.user.email}")
-    
-    # Subscription details
-    if invoice.subscription:
-        p.drawString(1*inch, 4.5*inch, "Subscription Details:")
-        p.drawString(1*inch, 4*inch, f"Plan: {invoice.subscription.plan.name}")
-        p.drawString(1*inch, 3.5*inch, f"Period: {invoice.subscription.start_date.strftime('%B %d, %Y')} - {invoice.subscription.end_date.strftime('%B %d, %Y')}")
-    
-    # Amount
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(1*inch, 2*inch, f"Total Amount: ${invoice.amount}")
-    
-    # Close the PDF object cleanly
-    p.showPage()
-    p.save()
-    
-    # Get the value of the BytesIO buffer and write it to the response
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.id}.pdf"'
-    
-    return response
+    """Serve the invoice PDF, rendering it only when it isn't stored yet"""
+    invoice = get_object_or_404(
+        Invoice.objects.select_related('user', 'subscription__plan'),
+        id=invoice_id,
+        user=request.user
+    )
+    return FileResponse(
+        get_invoice_pdf(invoice),
+        as_attachment=True,
+        filename=f'invoice_{invoice.id}.pdf',
+        content_type='application/pdf'
+    )
 
@@ -0,0 +1,81 @@
+"""
+Helpers for conditional GET (ETag / Last-Modified) on read-mostly views.
+
+The state of a page is computed with one cheap aggregate query so that a
+matching ``If-None-Match``/``If-Modified-Since`` can be answered with a 304
+before any template is rendered or serializer run.
+
+HTML pages use ``page_condition``, which skips all of this while flash
+messages are waiting to be shown: a 304 would keep the cached page and
+drop them.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+
+def make_etag(*parts):
+    """Unquoted ETag from the parts that determine a response."""
+    return hashlib.md5(':'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+
+
+def collection_state(queryset, *fields):
+    """
+    Return ``(count, last_modified)`` for ``queryset`` in one query, where
+    ``last_modified`` is the latest value of any of ``fields`` (or None).
+    The count catches deletions, which leave no newer timestamp behind.
+    """
+    aggregates = {f'latest_{index}': Max(field) for index, field in enumerate(fields)}
+    row = queryset.order_by().aggregate(count=Count('pk'), **aggregates)
+    count = row.pop('count')
+    return count, latest(*row.values())
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def viewer_state(request):
+    """
+    What makes an HTML page differ between visitors: the user and the CSRF
+    token embedded in forms. Include it in the ETag of rendered pages.
+    """
+    # get_token() creates the CSRF secret now rather than during rendering,
+    # so the first response already carries the ETag later requests will send
+    get_token(request)
+    return request.user.pk, request.META['CSRF_COOKIE']
+
+
+def has_pending_messages(request):
+    """Whether django.contrib.messages has messages for this request to show."""
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+def page_condition(etag_func=None, last_modified_func=None):
+    """``condition()`` for rendered pages; pages with pending messages are always rendered."""
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if has_pending_messages(request):
+                return view(request, *args, **kwargs)
+            return conditional_view(request, *args, **kwargs)
+        return inner
+    return decorator
+
+
+def request_memo(request, name, compute):
+    """
+    Compute ``name`` once per request; ``condition()`` calls its ETag and
+    Last-Modified functions separately.
+    """
+    memo = request.__dict__.setdefault('_conditional_memo', {})
+    if name not in memo:
+        memo[name] = compute()
+    return memo[name]
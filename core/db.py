@@ -0,0 +1,18 @@
+"""
+Database helpers shared by the apps.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def database_name(using=DEFAULT_DB_ALIAS):
+    """The name of the database ``using`` currently points at."""
+    return connections[using].settings_dict['NAME']
+
+
+def database_changed(name, using=DEFAULT_DB_ALIAS):
+    """
+    Whether ``using`` no longer points at database ``name``. Write-behind
+    buffers check this before their final flush at exit: after a test run
+    the test database is gone and the alias points back at the real one.
+    """
+    return database_name(using) != name
@@ -0,0 +1,49 @@
+"""
+Model fields shared by the apps.
+"""
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class CompressedJSONField(models.BinaryField):
+    """
+    JSON stored as a zlib-compressed blob. Values can't be queried on, only
+    loaded; use it for large documents that are read one row at a time.
+    """
+    description = 'JSON (zlib-compressed)'
+
+    def __init__(self, *args, level=6, **kwargs):
+        self.level = level
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.level != 6:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def compress(self, value):
+        data = json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':'), ensure_ascii=False)
+        return zlib.compress(data.encode(), self.level)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        return self.compress(value)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return json.loads(zlib.decompress(value))
+
+    def to_python(self, value):
+        # Fixtures store the JSON text (see value_to_string)
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj), cls=DjangoJSONEncoder)
@@ -0,0 +1,105 @@
+"""
+Keyset (cursor) pagination on ``(created_at, id)``.
+
+Instead of ``OFFSET`` and ``COUNT(*)``, each page continues from the last
+row of the previous one with ``WHERE (created_at, id) < (x, y)``. With an
+index that ends in ``created_at`` every page costs the same as the first,
+however far the client scrolls. Cursors are signed, so clients can only
+send back positions that were handed out.
+"""
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``(field, id)``, newest first unless
+    ``descending`` is False. ``field`` must be a non-null datetime.
+    """
+    def __init__(self, queryset, per_page, field='created_at', descending=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.descending = descending
+
+    def get_page(self, cursor=None):
+        """Return the page at ``cursor`` (the first page for None); raises InvalidCursor."""
+        if not cursor:
+            return self._page(self.queryset, forward=True, has_before=False)
+
+        backwards, value, pk = self.decode_cursor(cursor)
+        # Rows after (value, pk) in the direction we are reading
+        after = backwards == self.descending
+        lookup = 'gt' if after else 'lt'
+        queryset = self.queryset.filter(
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+        return self._page(queryset, forward=not backwards, has_before=True)
+
+    def _page(self, queryset, forward, has_before):
+        descending = self.descending if forward else not self.descending
+        prefix = '-' if descending else ''
+        rows = list(queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows)
+
+        if forward:
+            has_next, has_previous = has_more, has_before
+        else:
+            has_next, has_previous = has_before, has_more
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], backwards=False) if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], backwards=True) if has_previous else None,
+        )
+
+    def encode_cursor(self, obj, backwards):
+        value = getattr(obj, self.field)
+        return signing.dumps([int(backwards), value.isoformat(), obj.pk], salt=CURSOR_SALT, compress=True)
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            backwards, value, pk = signing.loads(cursor, salt=CURSOR_SALT)
+            value = parse_datetime(value)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        if value is None:
+            raise InvalidCursor('Invalid cursor')
+        return bool(backwards), value, pk
@@ -50,10 +50,15 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.APIKeyMiddleware',
+    'accounts.middleware.UserContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Loads the user's profile, subscription and plan with the user (see accounts/middleware.py)
+AUTHENTICATION_BACKENDS = ['accounts.backends.UserContextBackend']
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -75,6 +80,17 @@ TEMPLATES = [
 WSGI_APPLICATION = 'core.wsgi.application'
 
 
+# Django REST framework
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.APIKeyAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 50))  # keyset-paginated list endpoints
+
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -127,6 +143,19 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Files only the app may hand out (invoice PDFs, archives), kept outside MEDIA_ROOT
+# so the web server never serves them
+PRIVATE_ROOT = os.getenv('PRIVATE_ROOT') or os.path.join(BASE_DIR, 'private')
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'private': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': PRIVATE_ROOT},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -147,13 +176,95 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
-# Razorpay Settings
+# Razorpay Settings (credentials are validated by a system check, see payments/checks.py)
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
 
-# Validate Razorpay settings
-if not all([RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET]):
-    raise ValueError("Razorpay API credentials are not configured properly")
-
 RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
 
+# Razorpay client (see payments/services.py)
+RAZORPAY_API_URL = os.getenv('RAZORPAY_API_URL', 'https://api.razorpay.com')
+RAZORPAY_CONNECT_TIMEOUT = float(os.getenv('RAZORPAY_CONNECT_TIMEOUT', 3))  # seconds
+RAZORPAY_READ_TIMEOUT = float(os.getenv('RAZORPAY_READ_TIMEOUT', 10))  # seconds
+RAZORPAY_MAX_CONNECTIONS = int(os.getenv('RAZORPAY_MAX_CONNECTIONS', 10))  # keep-alive pool per process
+RAZORPAY_MAX_RETRIES = int(os.getenv('RAZORPAY_MAX_RETRIES', 2))  # for create_order
+RAZORPAY_RETRY_DELAY = float(os.getenv('RAZORPAY_RETRY_DELAY', 0.5))  # seconds, doubled per retry
+RAZORPAY_BREAKER_THRESHOLD = int(os.getenv('RAZORPAY_BREAKER_THRESHOLD', 5))  # consecutive failures
+RAZORPAY_BREAKER_RESET_TIMEOUT = float(os.getenv('RAZORPAY_BREAKER_RESET_TIMEOUT', 30))  # seconds
+
+# Quota engine (API call limits)
+QUOTA_BACKEND = os.getenv('QUOTA_BACKEND', 'tools.quota.DatabaseQuotaBackend')
+QUOTA_CACHE_ALIAS = os.getenv('QUOTA_CACHE_ALIAS', 'default')
+QUOTA_FLUSH_INTERVAL = float(os.getenv('QUOTA_FLUSH_INTERVAL', 5))  # seconds
+QUOTA_FLUSH_THRESHOLD = int(os.getenv('QUOTA_FLUSH_THRESHOLD', 100))  # calls
+QUOTA_SYNC_INTERVAL = float(os.getenv('QUOTA_SYNC_INTERVAL', 60))  # seconds
+QUOTA_NEAR_LIMIT = int(os.getenv('QUOTA_NEAR_LIMIT', 10))  # calls left before LocalMemoryQuotaBackend checks the database
+
+# Batch tool processing
+TOOLS_BATCH_MAX_SIZE = int(os.getenv('TOOLS_BATCH_MAX_SIZE', 100))
+TOOLS_BATCH_MAX_WORKERS = int(os.getenv('TOOLS_BATCH_MAX_WORKERS', 8))
+
+# Activity logging (buffered, written from a background thread)
+ACTIVITY_LOG_ASYNC = os.getenv('ACTIVITY_LOG_ASYNC', 'True').lower() == 'true'
+ACTIVITY_LOG_QUEUE_SIZE = int(os.getenv('ACTIVITY_LOG_QUEUE_SIZE', 10000))
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 100))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', 2))  # seconds
+
+# API key authentication
+API_KEY_CACHE_SIZE = int(os.getenv('API_KEY_CACHE_SIZE', 10000))
+API_KEY_CACHE_TTL = int(os.getenv('API_KEY_CACHE_TTL', 60))  # seconds
+API_KEY_CACHE_ALIAS = os.getenv('API_KEY_CACHE_ALIAS', 'default')  # revocation markers; share it between workers
+API_KEY_LAST_USED_FLUSH_INTERVAL = int(os.getenv('API_KEY_LAST_USED_FLUSH_INTERVAL', 60))  # seconds
+
+# Model backends (see tools/backends.py)
+TOOLS_MODEL_CONCURRENCY = int(os.getenv('TOOLS_MODEL_CONCURRENCY', 16))  # calls in flight per backend
+TOOLS_MODEL_QUEUE_TIMEOUT = float(os.getenv('TOOLS_MODEL_QUEUE_TIMEOUT', 10))  # seconds to wait for a slot
+TOOLS_MODEL_CONNECT_TIMEOUT = float(os.getenv('TOOLS_MODEL_CONNECT_TIMEOUT', 5))
+TOOLS_MODEL_READ_TIMEOUT = float(os.getenv('TOOLS_MODEL_READ_TIMEOUT', 60))
+TOOLS_STUB_LATENCY = float(os.getenv('TOOLS_STUB_LATENCY', 0))  # seconds
+TOOLS_MODEL_API_URL = os.getenv('TOOLS_MODEL_API_URL')
+
+TOOLS_MODEL_BACKENDS = {
+    'default': {
+        'BACKEND': 'tools.backends.StubBackend',
+    },
+}
+if TOOLS_MODEL_API_URL:
+    TOOLS_MODEL_BACKENDS['default'] = {
+        'BACKEND': 'tools.backends.HTTPBackend',
+        'OPTIONS': {
+            'url': TOOLS_MODEL_API_URL,
+            'api_key': os.getenv('TOOLS_MODEL_API_KEY'),
+        },
+    }
+
+# Result cache for tools with cache_enabled (see tools/result_cache.py)
+TOOLS_RESULT_CACHE_SIZE = int(os.getenv('TOOLS_RESULT_CACHE_SIZE', 1000))  # entries per process
+TOOLS_RESULT_CACHE_ALIAS = os.getenv('TOOLS_RESULT_CACHE_ALIAS') or None  # optional shared tier
+TOOLS_CACHE_STATS_DAYS = int(os.getenv('TOOLS_CACHE_STATS_DAYS', 30))  # window of the admin cache stats
+
+# Tool catalog cache (see tools/catalog.py); entries are retired by version bumps
+TOOLS_CATALOG_CACHE_ALIAS = os.getenv('TOOLS_CATALOG_CACHE_ALIAS', 'default')
+TOOLS_CATALOG_CACHE_TIMEOUT = int(os.getenv('TOOLS_CATALOG_CACHE_TIMEOUT', 3600))
+
+# History exports (see dashboard/exports.py)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))  # rows fetched per round trip
+
+# Rendered invoice PDFs (see billing/invoices.py)
+INVOICE_PDF_STORAGE = os.getenv('INVOICE_PDF_STORAGE', 'private')  # alias in STORAGES; must not be public
+INVOICE_PDF_PREFIX = os.getenv('INVOICE_PDF_PREFIX', 'invoices')
+
+# Invoice numbers (see billing/sequences.py)
+INVOICE_NUMBER_BLOCK_SIZE = int(os.getenv('INVOICE_NUMBER_BLOCK_SIZE', 20))  # numbers reserved per process at a time
+
+# Worker start-up (see tools/management/commands/startup_profile.py)
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv('STARTUP_IMPORT_BUDGET_MS', 400))  # import time before the first request
+
+# Retention of usage and activity rows (see dashboard/archive.py)
+ARCHIVE_RETENTION_DAYS = {
+    'usage': int(os.getenv('USAGE_RETENTION_DAYS', 365)),
+    'activity': int(os.getenv('ACTIVITY_RETENTION_DAYS', 90)),
+}
+ARCHIVE_STORAGE = os.getenv('ARCHIVE_STORAGE', 'private')  # alias in STORAGES; must not be public
+ARCHIVE_PREFIX = os.getenv('ARCHIVE_PREFIX', 'archive')
+ARCHIVE_DELETE_BATCH_SIZE = int(os.getenv('ARCHIVE_DELETE_BATCH_SIZE', 1000))  # rows per DELETE
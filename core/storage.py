@@ -0,0 +1,31 @@
+"""
+Storage helpers shared by the apps.
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.core.checks import Error
+from django.core.files.storage import FileSystemStorage, InvalidStorageError, storages
+
+
+def is_public(storage):
+    """Whether files saved in ``storage`` land under MEDIA_ROOT, which is served at MEDIA_URL."""
+    if not isinstance(storage, FileSystemStorage):
+        return False
+    return Path(storage.location).resolve().is_relative_to(Path(settings.MEDIA_ROOT).resolve())
+
+
+def private_storage_errors(setting, check_id):
+    """System check errors unless the ``STORAGES`` alias named by ``setting`` is private."""
+    alias = getattr(settings, setting)
+    hint = f"Point {setting} at a storage outside MEDIA_ROOT, such as 'private'."
+    try:
+        storage = storages[alias]
+    except InvalidStorageError:
+        return [Error(f"{setting} names an unknown storage '{alias}'", hint=hint, id=check_id)]
+    if is_public(storage):
+        return [Error(
+            f"{setting} ('{alias}') saves files under MEDIA_ROOT, where they are served to anyone",
+            hint=hint, id=check_id,
+        )]
+    return []
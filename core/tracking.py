@@ -0,0 +1,93 @@
+"""
+Field-change tracking for models.
+
+``FieldTrackerMixin`` snapshots the concrete field values an instance was
+loaded with (``from_db``) and refreshes the snapshot after every save, so
+"did X change?" is answered in memory instead of with a ``SELECT`` of the
+old row. Values are compared with ``!=``; in-place changes to mutable
+values (e.g. a JSON dict) are not seen.
+
+Mix it in before ``models.Model``::
+
+    class Subscription(FieldTrackerMixin, models.Model):
+        ...
+"""
+
+
+class FieldTrackerMixin:
+    _loaded_values = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._current_values()
+        return instance
+
+    def _attnames(self, fields=None):
+        if fields is None:
+            return [field.attname for field in self._meta.concrete_fields if not field.primary_key]
+        return [self._meta.get_field(name).attname for name in fields]
+
+    def _current_values(self, fields=None):
+        # Deferred fields that were never loaded are left out
+        return {
+            attname: self.__dict__[attname]
+            for attname in self._attnames(fields) if attname in self.__dict__
+        }
+
+    def _remember(self, fields=None):
+        values = self._current_values(fields)
+        if fields is not None and self._loaded_values is not None:
+            values = {**self._loaded_values, **values}
+        self._loaded_values = values
+
+    def has_changed(self, field):
+        """
+        Whether ``field`` differs from the value loaded or last saved. Always
+        True for instances that were not loaded from the database.
+        """
+        if self._loaded_values is None:
+            return True
+        attname = self._meta.get_field(field).attname
+        if attname not in self._loaded_values:
+            # Deferred: changed only if it has been assigned since
+            return attname in self.__dict__
+        return self.__dict__.get(attname) != self._loaded_values[attname]
+
+    def initial_value(self, field):
+        """The value ``field`` was loaded or last saved with (None if unknown)."""
+        return (self._loaded_values or {}).get(self._meta.get_field(field).attname)
+
+    def changed_fields(self):
+        """Names of the concrete fields that have changed."""
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and self.has_changed(field.name)
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember(kwargs.get('update_fields'))
+
+    def save_changes(self, **kwargs):
+        """
+        Save only the changed fields (and ``auto_now`` ones) with a single
+        UPDATE. Does nothing, not even touch ``updated_at``, when nothing
+        changed. Returns whether a query was made.
+        """
+        if self._state.adding or self._loaded_values is None:
+            self.save(**kwargs)
+            return True
+        changed = self.changed_fields()
+        if not changed:
+            return False
+        changed += [
+            field.name for field in self._meta.concrete_fields
+            if getattr(field, 'auto_now', False) and field.name not in changed
+        ]
+        self.save(update_fields=changed, **kwargs)
+        return True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember(fields)
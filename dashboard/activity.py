@@ -0,0 +1,191 @@
+"""
+Buffered UserActivity logging.
+
+``log_activity`` puts an event on a bounded in-process queue and returns
+immediately. A background thread writes queued events with ``bulk_create``
+once ``ACTIVITY_LOG_BATCH_SIZE`` events are waiting or
+``ACTIVITY_LOG_FLUSH_INTERVAL`` seconds have passed since the first one.
+When the queue is full, events are dropped and counted rather than slowing
+the request down. With ``ACTIVITY_LOG_ASYNC = False`` events are written
+synchronously instead.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from core.db import database_changed, database_name
+from .models import UserActivity
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ActivityLogger:
+    def __init__(self, max_queue_size=None, batch_size=None, flush_interval=None, background=True):
+        self.max_queue_size = max_queue_size or settings.ACTIVITY_LOG_QUEUE_SIZE
+        self.batch_size = batch_size or settings.ACTIVITY_LOG_BATCH_SIZE
+        self.flush_interval = (
+            settings.ACTIVITY_LOG_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+        self.background = background
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._database = database_name()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._counters = {'enqueued': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+        self._counters_lock = threading.Lock()
+
+    def log(self, user_id, activity_type, description):
+        """Queue an activity event; never blocks the caller."""
+        event = UserActivity(
+            user_id=user_id,
+            activity_type=activity_type,
+            description=description,
+            created_at=timezone.now()
+        )
+        if self.background:
+            self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+
+        if not self.background and self._queue.qsize() >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write every queued event now, in the calling thread."""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout=5):
+        """
+        Stop the background thread after it writes its batch, then flush the
+        rest. Events of a database the connection no longer points at are
+        dropped instead.
+        """
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                thread.join(timeout)
+            except queue.Full:
+                pass
+        self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if event is not _STOP:
+                batch.append(event)
+        return batch
+
+    def _write(self, batch):
+        if database_changed(self._database):
+            # e.g. at exit after a test run: the events belong to a database that is gone
+            self._count('dropped', len(batch))
+            return
+        with self._write_lock:
+            try:
+                UserActivity.objects.bulk_create(batch)
+                self._count('written', len(batch))
+            except DatabaseError:
+                self._count('failed', len(batch))
+                logger.exception("Failed to write %d activity events", len(batch))
+
+    def _write_in_background(self, batch):
+        try:
+            self._write(batch)
+        finally:
+            # The thread's own connection; flush() runs on the caller's, which may be mid-request
+            close_old_connections()
+
+    def _ensure_started(self):
+        # A forked worker inherits the queue but not the thread
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None:
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='activity-logger', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(deadline - time.monotonic(), 0)
+            try:
+                event = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                event = None
+
+            if event is _STOP:
+                if batch:
+                    self._write_in_background(batch)
+                return
+            if event is not None:
+                batch.append(event)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write_in_background(batch)
+                batch = []
+
+
+@lru_cache(maxsize=None)
+def get_activity_logger():
+    """Return the process-wide activity logger."""
+    activity_logger = ActivityLogger()
+    atexit.register(activity_logger.close)
+    return activity_logger
+
+
+def log_activity(user, activity_type, description):
+    """Record a UserActivity for ``user`` without adding an INSERT to the request."""
+    if not settings.ACTIVITY_LOG_ASYNC:
+        UserActivity.objects.create(
+            user=user,
+            activity_type=activity_type,
+            description=description
+        )
+        return
+    get_activity_logger().log(user.pk, activity_type, description)
@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import UserActivity
+from .models import UserActivity, UsageDailyRollup
 
 # Register your models here.
 admin.site.register(UserActivity)
+
+@admin.register(UsageDailyRollup)
+class UsageDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'tool', 'day', 'calls', 'tokens', 'cost')
+    list_filter = ('tool', 'day')
+    search_fields = ('user__username', 'tool__name')
+    date_hierarchy = 'day'
@@ -0,0 +1,328 @@
+"""
+Retention and archival of ``ToolUsage`` and ``UserActivity``.
+
+Rows older than their kind's retention period (``ARCHIVE_RETENTION_DAYS``)
+are streamed in primary-key order into gzip-compressed NDJSON files, one per
+calendar month and run, in the ``ARCHIVE_STORAGE`` storage, and listed in the
+kind's ``manifest.json``. Archives hold prompts and outputs, so the storage
+must be private (outside MEDIA_ROOT; see the ``dashboard.E001`` check). Only then are they deleted, in primary-key batches
+of ``ARCHIVE_DELETE_BATCH_SIZE`` rows, each in its own short transaction.
+A run is recorded in the manifest before its rows are deleted and marked
+done after, so a run that stops half-way has its deletes finished by the
+next one instead of its rows archived twice. Runs of a kind hold its
+``run.lock`` file, so two never overlap, and the manifest is written to a
+temporary name and swapped in, so it is never missing or half-written.
+
+``ArchiveReader`` reads archived rows back without touching the database.
+"""
+import gzip
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tools.models import ToolUsage
+from .exports import column_rows
+from .models import UserActivity
+
+
+@dataclass(frozen=True)
+class ArchiveSpec:
+    model: type
+    columns: tuple  # (key, lookup) pairs, as in exports.ExportSpec
+
+
+ARCHIVES = {
+    'usage': ArchiveSpec(
+        ToolUsage,
+        columns=(
+            ('id', 'id'),
+            ('created_at', 'created_at'),
+            ('user_id', 'user_id'),
+            ('tool_id', 'tool_id'),
+            ('tokens_used', 'tokens_used'),
+            ('cost', 'cost'),
+            ('success', 'success'),
+            ('cache_hit', 'cache_hit'),
+            ('error_message', 'error_message'),
+            ('input_data', ('payload__input_data', 'legacy_input_data')),
+            ('output_data', ('payload__output_data', 'legacy_output_data')),
+        ),
+    ),
+    'activity': ArchiveSpec(
+        UserActivity,
+        columns=(
+            ('id', 'id'),
+            ('created_at', 'created_at'),
+            ('user_id', 'user_id'),
+            ('activity_type', 'activity_type'),
+            ('description', 'description'),
+        ),
+    ),
+}
+
+
+class ArchiveLocked(Exception):
+    """Another run of the same kind holds the lock."""
+
+
+@dataclass
+class ArchiveStats:
+    kind: str
+    rows: int = 0
+    files: int = 0
+    deleted: int = 0
+    seconds: float = 0.0
+
+
+def get_storage():
+    return storages[settings.ARCHIVE_STORAGE]
+
+
+def month_of(when):
+    return timezone.localtime(when).strftime('%Y-%m')
+
+
+def manifest_name(kind):
+    return f'{settings.ARCHIVE_PREFIX}/{kind}/manifest.json'
+
+
+def read_manifest(storage, kind):
+    name = manifest_name(kind)
+    if not storage.exists(name):
+        return {'kind': kind, 'files': [], 'runs': []}
+    with storage.open(name, 'rb') as f:
+        return json.load(f)
+
+
+def write_manifest(storage, kind, manifest):
+    """Swap the new manifest in, so it is never missing or half-written."""
+    name = manifest_name(kind)
+    content = ContentFile(json.dumps(manifest, indent=2).encode())
+    try:
+        storage.path(name)
+    except NotImplementedError:
+        # Object stores have no rename; overwriting a key is atomic there
+        if storage.exists(name) and storage.get_available_name(name) != name:
+            storage.delete(name)
+        storage.save(name, content)
+        return
+    temporary = storage.save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+    os.replace(storage.path(temporary), storage.path(name))
+
+
+def lock_name(kind):
+    return f'{settings.ARCHIVE_PREFIX}/{kind}/run.lock'
+
+
+@contextmanager
+def run_lock(storage, kind):
+    """
+    Hold ``kind``'s lock file for the duration of a run. A file storage
+    never replaces an existing file on save, so when two runs start at
+    once, the second gets another name back and gives up.
+    """
+    name = lock_name(kind)
+    locked = ArchiveLocked(
+        f"Another {kind} archive run is in progress; if it died, delete {name} from ARCHIVE_STORAGE"
+    )
+    if storage.exists(name):
+        raise locked
+    owner = {'host': socket.gethostname(), 'pid': os.getpid(), 'started_at': timezone.now().isoformat()}
+    saved = storage.save(name, ContentFile(json.dumps(owner).encode()))
+    if saved != name:
+        storage.delete(saved)
+        raise locked
+    try:
+        yield
+    finally:
+        storage.delete(name)
+
+
+def archived_until(kind):
+    """Cutoff of the latest archive run: rows created before it may be gone."""
+    runs = read_manifest(get_storage(), kind)['runs']
+    return max((datetime.fromisoformat(run['cutoff']) for run in runs), default=None)
+
+
+class MonthFile:
+    """One month's rows of a run, gzip-compressed into a temporary file."""
+    def __init__(self, month):
+        self.month = month
+        self.file = tempfile.TemporaryFile()
+        self.compressor = zlib.compressobj(wbits=31)  # gzip container
+        self.digest = hashlib.sha256()
+        self.rows = 0
+        self.first_id = self.last_id = None
+
+    def _write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+
+    def write(self, row_id, line):
+        self._write(self.compressor.compress(line))
+        self.rows += 1
+        self.first_id = row_id if self.first_id is None else self.first_id
+        self.last_id = row_id
+
+    def save(self, storage, name):
+        """Store the file and return its manifest entry."""
+        self._write(self.compressor.flush())
+        size = self.file.tell()
+        self.file.seek(0)
+        try:
+            name = storage.save(name, File(self.file))
+        finally:
+            self.file.close()
+        return {
+            'name': name,
+            'month': self.month,
+            'rows': self.rows,
+            'first_id': self.first_id,
+            'last_id': self.last_id,
+            'bytes': size,
+            'sha256': self.digest.hexdigest(),
+        }
+
+
+def delete_archived(model, run, batch_size, pause=0):
+    """Delete the rows ``run`` archived, ``batch_size`` at a time; returns how many."""
+    archived = model.objects.filter(
+        pk__lte=run['last_id'], created_at__lt=datetime.fromisoformat(run['cutoff'])
+    ).order_by('pk')
+    deleted, last_pk = 0, 0
+    while True:
+        pks = list(archived.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            _, per_model = model.objects.filter(pk__in=pks).only('pk').delete()
+        deleted += per_model.get(model._meta.label, 0)
+        last_pk = pks[-1]
+        if pause:
+            # Let replicas and other writers catch up
+            time.sleep(pause)
+
+
+def archive(kind, days=None, now=None, batch_size=None, pause=0, dry_run=False):
+    """
+    Archive and delete the ``kind`` rows older than ``days`` (by default its
+    retention period) and return ``ArchiveStats``. With ``dry_run`` the rows
+    are only counted.
+    """
+    spec = ARCHIVES[kind]
+    days = settings.ARCHIVE_RETENTION_DAYS[kind] if days is None else days
+    batch_size = batch_size or settings.ARCHIVE_DELETE_BATCH_SIZE
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=days)
+    expired = spec.model.objects.filter(created_at__lt=cutoff).order_by('pk')
+    stats = ArchiveStats(kind)
+    if dry_run:
+        stats.rows = expired.count()
+        return stats
+
+    started = time.perf_counter()
+    storage = get_storage()
+    with run_lock(storage, kind):
+        manifest = read_manifest(storage, kind)
+
+        # A run that stopped after archiving but before deleting everything
+        for run in manifest['runs']:
+            if not run['deleted']:
+                stats.deleted += delete_archived(spec.model, run, batch_size, pause)
+                run['deleted'] = True
+                write_manifest(storage, kind, manifest)
+
+        keys = [key for key, _ in spec.columns]
+        months = {}
+        for values in column_rows(expired, spec.columns):
+            row = dict(zip(keys, values))
+            month = month_of(row['created_at'])
+            if month not in months:
+                months[month] = MonthFile(month)
+            months[month].write(row['id'], (json.dumps(row, cls=DjangoJSONEncoder) + '\n').encode())
+
+        if months:
+            run = {
+                'cutoff': cutoff.isoformat(),
+                'archived_at': now.isoformat(),
+                'last_id': max(month.last_id for month in months.values()),
+                'rows': sum(month.rows for month in months.values()),
+                'deleted': False,
+            }
+            for month in sorted(months):
+                file = months[month]
+                name = (f'{settings.ARCHIVE_PREFIX}/{kind}/{month}/'
+                        f'{kind}-{month}-{file.first_id}-{file.last_id}.ndjson.gz')
+                manifest['files'].append(file.save(storage, name))
+            manifest['runs'].append(run)
+            write_manifest(storage, kind, manifest)
+
+            stats.rows, stats.files = run['rows'], len(months)
+            stats.deleted += delete_archived(spec.model, run, batch_size, pause)
+            run['deleted'] = True
+            write_manifest(storage, kind, manifest)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+class ArchiveReader:
+    """
+    Read-only access to the archived rows of one kind. Rows are dicts as
+    written (decimals as strings), with ``created_at`` parsed back into a
+    datetime.
+    """
+    def __init__(self, kind, storage=None):
+        if kind not in ARCHIVES:
+            raise ValueError(f"Unknown archive kind: {kind}")
+        self.kind = kind
+        self.storage = storage or get_storage()
+        self.manifest = read_manifest(self.storage, kind)
+
+    def months(self):
+        return sorted({entry['month'] for entry in self.manifest['files']})
+
+    def files(self, month=None):
+        return sorted(
+            (entry for entry in self.manifest['files'] if month is None or entry['month'] == month),
+            key=lambda entry: (entry['month'], entry['first_id'])
+        )
+
+    def rows(self, since=None, until=None, **filters):
+        """
+        Yield the archived rows created in ``[since, until)``, oldest month
+        first, that equal ``filters`` (e.g. ``user_id=3``). Only the months in
+        range are read.
+        """
+        first = month_of(since) if since is not None else None
+        last = month_of(until) if until is not None else None
+        for entry in self.files():
+            if (first and entry['month'] < first) or (last and entry['month'] > last):
+                continue
+            with self.storage.open(entry['name'], 'rb') as f, gzip.open(f, 'rt') as lines:
+                for line in lines:
+                    row = json.loads(line)
+                    row['created_at'] = parse_datetime(row['created_at'])
+                    if since is not None and row['created_at'] < since:
+                        continue
+                    if until is not None and row['created_at'] >= until:
+                        continue
+                    if all(row.get(key) == value for key, value in filters.items()):
+                        yield row
@@ -0,0 +1,8 @@
+from django.core.checks import register
+
+from core.storage import private_storage_errors
+
+
+@register()
+def archive_storage_check(app_configs, **kwargs):
+    return private_storage_errors('ARCHIVE_STORAGE', 'dashboard.E001')
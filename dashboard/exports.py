@@ -0,0 +1,165 @@
+"""
+Streaming exports of ToolUsage and Payment history.
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` (a
+server-side cursor on PostgreSQL) and encoded one at a time as CSV or
+NDJSON, optionally gzip-compressed on the fly, so memory use stays constant
+however many rows are exported. Usage ``input_data``/``output_data`` live
+in ``ToolUsagePayload`` and are only joined in when asked for.
+"""
+import csv
+import json
+import zlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from payments.models import Payment
+from tools.models import ToolUsage
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    model: type
+    columns: tuple  # (header, lookup) pairs
+    payload_columns: tuple = ()  # lookup may be a tuple: the first non-null value is used
+
+
+EXPORTS = {
+    'usage': ExportSpec(
+        ToolUsage,
+        columns=(
+            ('id', 'id'),
+            ('created_at', 'created_at'),
+            ('user', 'user__username'),
+            ('tool', 'tool__slug'),
+            ('tokens_used', 'tokens_used'),
+            ('cost', 'cost'),
+            ('success', 'success'),
+            ('cache_hit', 'cache_hit'),
+            ('error_message', 'error_message'),
+        ),
+        payload_columns=(
+            # Rows not yet moved by backfill_usage_payloads keep them inline
+            ('input_data', ('payload__input_data', 'legacy_input_data')),
+            ('output_data', ('payload__output_data', 'legacy_output_data')),
+        ),
+    ),
+    'payments': ExportSpec(
+        Payment,
+        columns=(
+            ('id', 'id'),
+            ('created_at', 'created_at'),
+            ('user', 'user__username'),
+            ('razorpay_order_id', 'razorpay_order_id'),
+            ('razorpay_payment_id', 'razorpay_payment_id'),
+            ('amount', 'amount'),
+            ('currency', 'currency'),
+            ('status', 'status'),
+            ('invoice_id', 'invoice_id'),
+        ),
+    ),
+}
+
+
+def export_rows(kind, user=None, since=None, until=None, include_payload=False, chunk_size=None):
+    """Return ``(header, rows)`` where ``rows`` lazily yields one tuple per record."""
+    spec = EXPORTS[kind]
+    columns = spec.columns + (spec.payload_columns if include_payload else ())
+    queryset = spec.model.objects.all()
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    # Oldest first, matching the (user, created_at) indexes
+    rows = column_rows(queryset.order_by('created_at', 'id'), columns, chunk_size)
+    return [header for header, _ in columns], rows
+
+
+def column_rows(queryset, columns, chunk_size=None):
+    """Lazily yield one tuple of ``columns`` values per row of ``queryset``."""
+    lookups = [lookup if isinstance(lookup, tuple) else (lookup,) for _, lookup in columns]
+    rows = queryset.values_list(
+        *(name for names in lookups for name in names)
+    ).iterator(chunk_size=chunk_size or settings.EXPORT_CHUNK_SIZE)
+    if any(len(names) > 1 for names in lookups):
+        rows = coalesce_rows(rows, [len(names) for names in lookups])
+    return rows
+
+
+def coalesce_rows(rows, widths):
+    """Collapse each run of ``widths[i]`` values into its first non-null one."""
+    for row in rows:
+        values, start = [], 0
+        for width in widths:
+            values.append(next((value for value in row[start:start + width] if value is not None), None))
+            start += width
+        yield tuple(values)
+
+
+class _Line:
+    """File-like object whose write() returns the written line, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def encode_csv(header, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([
+            json.dumps(value, cls=DjangoJSONEncoder) if isinstance(value, (dict, list)) else value
+            for value in row
+        ])
+
+
+def encode_ndjson(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+}
+
+
+def stream_export(kind, fmt='csv', compress=False, **filters):
+    """Yield the encoded export as bytes."""
+    header, rows = export_rows(kind, **filters)
+    chunks = (line.encode() for line in ENCODERS[fmt](header, rows))
+    return gzip_chunks(chunks) if compress else buffered(chunks)
+
+
+def buffered(chunks, size=64 * 1024):
+    """Join small chunks so each write or network send carries ~``size`` bytes."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in buffered(chunks):
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_filename(kind, fmt, compress=False):
+    return f'{kind}.{fmt}' + ('.gz' if compress else '')
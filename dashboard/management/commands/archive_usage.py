@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.archive import ARCHIVES, ArchiveLocked, archive
+
+
+class Command(BaseCommand):
+    help = ('Archives ToolUsage and UserActivity rows older than their retention period '
+            'to monthly gzip NDJSON files, then deletes them in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*',
+                            help=f"What to archive: {', '.join(sorted(ARCHIVES))} (default: everything)")
+        parser.add_argument('--days', type=int,
+                            help='Archive rows older than this many days instead of ARCHIVE_RETENTION_DAYS')
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to wait between delete batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows to archive')
+
+    def handle(self, *args, **options):
+        unknown = set(options['kinds']) - set(ARCHIVES)
+        if unknown:
+            raise CommandError(f"Unknown kind: {', '.join(sorted(unknown))}")
+        for kind in options['kinds'] or sorted(ARCHIVES):
+            try:
+                stats = archive(
+                    kind, days=options['days'], batch_size=options['batch_size'],
+                    pause=options['pause'], dry_run=options['dry_run']
+                )
+            except ArchiveLocked as e:
+                raise CommandError(str(e))
+            if options['dry_run']:
+                self.stdout.write(f'{kind}: {stats.rows} rows to archive')
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'{kind}: archived {stats.rows} rows to {stats.files} files, '
+                f'deleted {stats.deleted}, {stats.seconds:.2f}s'
+            ))
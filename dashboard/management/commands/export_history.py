@@ -0,0 +1,56 @@
+import sys
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.exports import ENCODERS, EXPORTS, stream_export
+from dashboard.views import parse_day
+
+class Command(BaseCommand):
+    help = 'Streams ToolUsage or Payment history to a CSV/NDJSON file (gzip for *.gz) in constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(ENCODERS), default='csv')
+        parser.add_argument('--output', default='-', help='File to write, "-" for stdout')
+        parser.add_argument('--gzip', action='store_true', help='Compress (implied by a .gz output)')
+        parser.add_argument('--user', help='Only this username')
+        parser.add_argument('--since', help='First day to export (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Day to stop before (YYYY-MM-DD)')
+        parser.add_argument('--include-payload', action='store_true',
+                            help='Include input_data/output_data (usage only)')
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_day(options['since'])
+            until = parse_day(options['until'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']}")
+
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        chunks = stream_export(
+            options['kind'], options['format'], compress,
+            user=user, since=since, until=until,
+            include_payload=options['include_payload'],
+            chunk_size=options['chunk_size']
+        )
+
+        written = 0
+        stream = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+        finally:
+            if output != '-':
+                stream.close()
+            else:
+                stream.flush()
+        if output != '-':
+            self.stderr.write(self.style.SUCCESS(f'Wrote {written:,} bytes to {output}'))
@@ -0,0 +1,27 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from dashboard.rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuilds daily usage rollups from ToolUsage (all history, or recent days only)'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--since', help='First day to rebuild (YYYY-MM-DD)')
+        group.add_argument('--days', type=int, help='Rebuild the last N days')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+        elif options['days']:
+            since = timezone.localdate() - timedelta(days=options['days'] - 1)
+
+        written = rebuild_rollups(since=since, batch_size=options['batch_size'])
+        scope = f'since {since}' if since else 'for all history'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rollup rows {scope}'))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_useractivity_created_at_default'),
+        ('tools', '0005_tool_cache_ttl_min'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usagedailyrollup',
+            name='cache_hits',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='usagedailyrollup',
+            name='tokens_saved',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='usagedailyrollup',
+            index=models.Index(fields=['tool', 'day'], name='rollup_tool_day_idx'),
+        ),
+    ]
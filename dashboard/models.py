@@ -1,17 +1,47 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class UserActivity(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     activity_type = models.CharField(max_length=50)
     description = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the buffered logger writes it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'User Activities'
+        indexes = [
+            # Recent-activity feed on the dashboard
+            models.Index(fields=['user', '-created_at'], name='activity_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.activity_type}"
 
+class UsageDailyRollup(models.Model):
+    """Daily ToolUsage totals per user and tool, maintained on every insert."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    tool = models.ForeignKey('tools.Tool', on_delete=models.CASCADE)
+    day = models.DateField()
+    calls = models.PositiveIntegerField(default=0)
+    tokens = models.BigIntegerField(default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=6, default=0)
+    cache_hits = models.PositiveIntegerField(default=0)
+    tokens_saved = models.BigIntegerField(default=0)  # tokens of the calls served from the result cache
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tool', 'day'], name='unique_usage_rollup_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='rollup_user_day_idx'),
+            models.Index(fields=['tool', 'day'], name='rollup_tool_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.tool.name} - {self.day}"
+
 # Remove the Usage model since we're using ToolUsage from tools app
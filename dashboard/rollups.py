@@ -0,0 +1,107 @@
+"""
+Maintenance of ``UsageDailyRollup``, the per-day aggregate the dashboard
+reads instead of scanning ``ToolUsage``.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from tools.models import ToolUsage
+from .archive import archived_until
+from .models import UsageDailyRollup
+
+
+def apply_usages(usages):
+    """Add saved ToolUsage rows to their rollups, one upsert per (user, tool, day)."""
+    totals = defaultdict(lambda: [0, 0, Decimal('0'), 0, 0])
+    for usage in usages:
+        key = (usage.user_id, usage.tool_id, timezone.localdate(usage.created_at))
+        total = totals[key]
+        total[0] += 1
+        total[1] += usage.tokens_used
+        total[2] += Decimal(str(usage.cost))
+        if usage.cache_hit:
+            total[3] += 1
+            total[4] += usage.tokens_used
+
+    for (user_id, tool_id, day), (calls, tokens, cost, cache_hits, tokens_saved) in totals.items():
+        _increment(user_id, tool_id, day, calls, tokens, cost, cache_hits, tokens_saved)
+
+
+def _increment(user_id, tool_id, day, calls, tokens, cost, cache_hits=0, tokens_saved=0):
+    rollups = UsageDailyRollup.objects.filter(user_id=user_id, tool_id=tool_id, day=day)
+    changes = {
+        'calls': F('calls') + calls,
+        'tokens': F('tokens') + tokens,
+        'cost': F('cost') + cost,
+        'cache_hits': F('cache_hits') + cache_hits,
+        'tokens_saved': F('tokens_saved') + tokens_saved,
+    }
+    if rollups.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            UsageDailyRollup.objects.create(
+                user_id=user_id, tool_id=tool_id, day=day,
+                calls=calls, tokens=tokens, cost=cost,
+                cache_hits=cache_hits, tokens_saved=tokens_saved
+            )
+    except IntegrityError:
+        # Another request created the row first
+        rollups.update(**changes)
+
+
+def rebuild_rollups(since=None, batch_size=1000):
+    """
+    Recompute rollups from ToolUsage for every day from ``since`` (a date)
+    onwards, or for all history. Days whose usage has been archived (see
+    ``dashboard.archive``) are kept as they are. Returns the number of rollup
+    rows written.
+    """
+    archived = archived_until('usage')
+    if archived is not None:
+        first_day = timezone.localdate(archived) + timedelta(days=1)
+        since = first_day if since is None else max(since, first_day)
+    usages = ToolUsage.objects.all()
+    rollups = UsageDailyRollup.objects.all()
+    if since is not None:
+        usages = usages.filter(created_at__date__gte=since)
+        rollups = rollups.filter(day__gte=since)
+
+    totals = usages.annotate(
+        day=TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    ).values('user_id', 'tool_id', 'day').annotate(
+        calls=Count('id'),
+        tokens=Sum('tokens_used'),
+        total_cost=Sum('cost'),
+        cache_hits=Count('id', filter=Q(cache_hit=True)),
+        tokens_saved=Sum('tokens_used', filter=Q(cache_hit=True))
+    ).order_by()
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in totals.iterator(chunk_size=batch_size):
+            batch.append(UsageDailyRollup(
+                user_id=row['user_id'],
+                tool_id=row['tool_id'],
+                day=row['day'],
+                calls=row['calls'],
+                tokens=row['tokens'] or 0,
+                cost=row['total_cost'] or 0,
+                cache_hits=row['cache_hits'],
+                tokens_saved=row['tokens_saved'] or 0
+            ))
+            if len(batch) >= batch_size:
+                UsageDailyRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        UsageDailyRollup.objects.bulk_create(batch)
+        written += len(batch)
+    return written
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from tools.models import ToolUsage
+from .rollups import apply_usages
+
+@receiver(post_save, sender=ToolUsage)
+def update_usage_rollup(sender, instance, created, raw=False, **kwargs):
+    """Fold each new ToolUsage into its daily rollup."""
+    if created and not raw:
+        apply_usages([instance])
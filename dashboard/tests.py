@@ -1,3 +1,350 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tools.models import ToolUsage, ToolUsagePayload
+from tools.tests import QueryPlanMixin, create_tool
+from . import checks
+from .activity import ActivityLogger
+from .archive import (
+    ArchiveLocked, ArchiveReader, archive, get_storage, lock_name, manifest_name, read_manifest,
+    run_lock, write_manifest,
+)
+from .models import UserActivity, UsageDailyRollup
+from .rollups import apply_usages, rebuild_rollups
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class DashboardQueryTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+        cls.tool = create_tool()
+        for _ in range(3):
+            ToolUsage.objects.create(
+                user=cls.user, tool=cls.tool, input_data={}, output_data={},
+                tokens_used=100, cost=Decimal('0.0015')
+            )
+        UserActivity.objects.bulk_create([
+            UserActivity(user=cls.user, activity_type='tool_view', description='Viewed tool')
+            for _ in range(20)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_recent_activity_uses_index(self):
+        queryset = UserActivity.objects.filter(user=self.user).order_by('-created_at')[:10]
+        self.assertUsesIndex(queryset, 'activity_user_created_idx')
+
+    def test_rollup_range_uses_index(self):
+        today = timezone.localdate()
+        queryset = UsageDailyRollup.objects.filter(user=self.user, day__range=[today, today])
+        self.assertUsesIndex(queryset, 'rollup_user_day_idx')
+
+    def test_rollup_tracks_usage(self):
+        rollup = UsageDailyRollup.objects.get(user=self.user, tool=self.tool)
+        self.assertEqual(rollup.calls, 3)
+        self.assertEqual(rollup.tokens, 300)
+        self.assertEqual(rollup.cost, Decimal('0.0045'))
+
+    def test_home_query_count(self):
+        # session, user, activity insert, usage totals, top tools, recent activity
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('dashboard:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['most_used_tools'][0]['total_uses'], 3)
+
+    def test_statistics_query_count(self):
+        # session, user, activity insert, monthly totals, per-tool totals
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('dashboard:statistics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['tool_usage'][0]['usage_count'], 3)
+
+    @override_settings(ACTIVITY_LOG_ASYNC=True)
+    def test_home_buffers_activity(self):
+        activity_logger = ActivityLogger(background=False)
+        with mock.patch('dashboard.activity.get_activity_logger', return_value=activity_logger):
+            # No activity INSERT on the request path
+            with self.assertNumQueries(5):
+                self.client.get(reverse('dashboard:home'))
+        activity_logger.flush()
+        self.assertEqual(activity_logger.stats()['written'], 1)
+        self.assertTrue(UserActivity.objects.filter(activity_type='dashboard_visit').exists())
+
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('grace', password='secret')
+        cls.tool = create_tool()
+        cls.today = timezone.localdate()
+
+    def usage(self, day, cache_hit=False):
+        created_at = timezone.make_aware(datetime(day.year, day.month, day.day, 12))
+        return ToolUsage(
+            user=self.user, tool=self.tool, input_data={}, output_data={},
+            tokens_used=10, cost=Decimal('0.0015'), cache_hit=cache_hit, created_at=created_at
+        )
+
+    def rollup(self, day):
+        return UsageDailyRollup.objects.get(user=self.user, tool=self.tool, day=day)
+
+    def test_apply_usages_adds_to_one_row_per_day(self):
+        yesterday = self.today - timedelta(days=1)
+        apply_usages([self.usage(self.today), self.usage(self.today, cache_hit=True), self.usage(yesterday)])
+        apply_usages([self.usage(self.today)])
+        self.assertEqual(UsageDailyRollup.objects.count(), 2)
+        rollup = self.rollup(self.today)
+        self.assertEqual((rollup.calls, rollup.tokens, rollup.cost), (3, 30, Decimal('0.0045')))
+        self.assertEqual((rollup.cache_hits, rollup.tokens_saved), (1, 10))
+        self.assertEqual(self.rollup(yesterday).calls, 1)
+
+    def test_saved_usage_is_rolled_up(self):
+        ToolUsage.objects.create(
+            user=self.user, tool=self.tool, input_data={}, output_data={}, tokens_used=10, cost=Decimal('0.0015')
+        )
+        self.assertEqual(self.rollup(self.today).calls, 1)
+
+    def test_rebuild_recomputes_from_usage(self):
+        ToolUsage.objects.bulk_create([self.usage(self.today), self.usage(self.today, cache_hit=True)])
+        UsageDailyRollup.objects.create(user=self.user, tool=self.tool, day=self.today, calls=99, tokens=0, cost=0)
+        self.assertEqual(rebuild_rollups(), 1)
+        rollup = self.rollup(self.today)
+        self.assertEqual((rollup.calls, rollup.tokens, rollup.cache_hits, rollup.tokens_saved), (2, 20, 1, 10))
+
+    def test_rebuild_since_keeps_earlier_days(self):
+        yesterday = self.today - timedelta(days=1)
+        UsageDailyRollup.objects.create(user=self.user, tool=self.tool, day=yesterday, calls=7, tokens=0, cost=0)
+        self.assertEqual(rebuild_rollups(since=self.today), 0)
+        self.assertEqual(self.rollup(yesterday).calls, 7)
+
+
+class ActivityLoggerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+
+    def test_writes_in_batches(self):
+        activity_logger = ActivityLogger(batch_size=3, background=False)
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                activity_logger.log(self.user.pk, 'tool_view', 'Viewed tool')
+        self.assertEqual(UserActivity.objects.count(), 3)
+
+    def test_drops_events_when_queue_is_full(self):
+        activity_logger = ActivityLogger(max_queue_size=2, batch_size=10, background=False)
+        results = [activity_logger.log(self.user.pk, 'tool_view', 'Viewed tool') for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(activity_logger.stats()['dropped'], 1)
+        activity_logger.flush()
+        self.assertEqual(UserActivity.objects.count(), 2)
+
+
+    def test_close_skips_another_database(self):
+        activity_logger = ActivityLogger(batch_size=10, background=False)
+        activity_logger.log(self.user.pk, 'tool_view', 'Viewed tool')
+        with mock.patch('core.db.database_name', return_value='other'):
+            with self.assertNumQueries(0):
+                activity_logger.close()
+        self.assertEqual(activity_logger.stats()['dropped'], 1)
+        self.assertFalse(UserActivity.objects.exists())
+
+    def test_flush_keeps_the_callers_connection(self):
+        activity_logger = ActivityLogger(batch_size=10, background=False)
+        activity_logger.log(self.user.pk, 'tool_view', 'Viewed tool')
+        with mock.patch('dashboard.activity.close_old_connections') as close_old_connections:
+            activity_logger.flush()
+        close_old_connections.assert_not_called()
+        self.assertEqual(UserActivity.objects.count(), 1)
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False, EXPORT_CHUNK_SIZE=2)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('carol', password='secret')
+        cls.other = User.objects.create_user('dave', password='secret')
+        tool = create_tool()
+        for user in (cls.user, cls.user, cls.user, cls.other):
+            ToolUsage.objects.create(
+                user=user, tool=tool, input_data={'genre': 'mystery'},
+                output_data={'story': 'Once upon a time'},
+                tokens_used=100, cost=Decimal('0.0015')
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('dashboard:export', args=['usage']), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_contains_only_own_rows(self):
+        rows = list(csv.DictReader(io.StringIO(self.export().decode())))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['user'] for row in rows}, {'carol'})
+        self.assertNotIn('input_data', rows[0])
+
+    def test_ndjson_export_with_payload(self):
+        lines = self.export(format='ndjson', payload='1').decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['input_data'], {'genre': 'mystery'})
+
+    def test_payload_export_includes_rows_not_yet_backfilled(self):
+        legacy = ToolUsage.objects.filter(user=self.user).order_by('created_at', 'id').first()
+        ToolUsagePayload.objects.filter(usage=legacy).delete()
+        ToolUsage.objects.filter(pk=legacy.pk).update(
+            legacy_input_data={'genre': 'fantasy'}, legacy_output_data={'story': 'Long ago'}
+        )
+        lines = self.export(format='ndjson', payload='1').decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['input_data'], {'genre': 'fantasy'})
+        self.assertEqual(json.loads(lines[1])['input_data'], {'genre': 'mystery'})
+
+    def test_gzip_export(self):
+        data = gzip.decompress(self.export(gzip='1'))
+        self.assertEqual(len(data.decode().splitlines()), 4)  # header + 3 rows
+
+    def test_all_users_needs_staff(self):
+        self.assertEqual(len(self.export(all='1').decode().splitlines()), 4)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertEqual(len(self.export(all='1').decode().splitlines()), 5)
+
+    def test_export_command_writes_gzip_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'usage.csv.gz')
+            call_command('export_history', 'usage', '--user', 'dave', '--output', path,
+                         stderr=io.StringIO())
+            with gzip.open(path, 'rt') as f:
+                self.assertEqual(len(f.read().splitlines()), 2)  # header + 1 row
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False, ARCHIVE_DELETE_BATCH_SIZE=2,
+                   ARCHIVE_RETENTION_DAYS={'usage': 30, 'activity': 30})
+class ArchiveTests(TestCase):
+    now = datetime(2026, 3, 15, 12, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('erin', password='secret')
+        cls.other = User.objects.create_user('frank', password='secret')
+        tool = create_tool()
+        # Two in January, two in February (archived), one in March (kept)
+        for user, day in [(cls.user, datetime(2026, 1, 10)), (cls.other, datetime(2026, 1, 20)),
+                          (cls.user, datetime(2026, 2, 1)), (cls.user, datetime(2026, 2, 5)),
+                          (cls.user, datetime(2026, 3, 1))]:
+            created_at = day.replace(tzinfo=dt_timezone.utc)
+            usage = ToolUsage.objects.create(
+                user=user, tool=tool, input_data={'day': day.day}, output_data={'story': 'Once'},
+                tokens_used=10, cost=Decimal('0.0015')
+            )
+            ToolUsage.objects.filter(pk=usage.pk).update(created_at=created_at)
+            UserActivity.objects.create(
+                user=user, activity_type='tool_view', description='Viewed', created_at=created_at
+            )
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+            'archive': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': directory},
+            },
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }, ARCHIVE_STORAGE='archive'))
+        # Rollups were made for the day the rows were created, not the backdated one
+        rebuild_rollups()
+
+    def test_public_archive_storage_is_refused(self):
+        self.assertEqual(checks.archive_storage_check(None), [])
+        public = {'BACKEND': 'django.core.files.storage.FileSystemStorage'}
+        with override_settings(STORAGES={'default': public}, ARCHIVE_STORAGE='default'):
+            [error] = checks.archive_storage_check(None)
+        self.assertEqual(error.id, 'dashboard.E001')
+
+    def test_old_rows_are_archived_by_month_and_deleted(self):
+        stats = archive('usage', now=self.now)
+        self.assertEqual((stats.rows, stats.files, stats.deleted), (4, 2, 4))
+        self.assertEqual(ToolUsage.objects.count(), 1)
+        self.assertEqual(ToolUsagePayload.objects.count(), 1)
+        # Rollups of archived days are kept
+        self.assertEqual(UsageDailyRollup.objects.count(), 5)
+
+        reader = ArchiveReader('usage')
+        self.assertEqual(reader.months(), ['2026-01', '2026-02'])
+        rows = list(reader.rows())
+        self.assertEqual([row['input_data'] for row in rows], [{'day': 10}, {'day': 20}, {'day': 1}, {'day': 5}])
+        self.assertEqual(rows[0]['created_at'], datetime(2026, 1, 10, tzinfo=dt_timezone.utc))
+        self.assertEqual(rows[0]['output_data'], {'story': 'Once'})
+
+    def test_reader_filters_rows(self):
+        archive('activity', now=self.now)
+        reader = ArchiveReader('activity')
+        self.assertEqual(len(list(reader.rows(user_id=self.user.pk))), 3)
+        since = datetime(2026, 1, 15, tzinfo=dt_timezone.utc)
+        until = datetime(2026, 2, 3, tzinfo=dt_timezone.utc)
+        self.assertEqual(
+            [row['user_id'] for row in reader.rows(since=since, until=until)],
+            [self.other.pk, self.user.pk]
+        )
+
+    def test_interrupted_run_is_finished_without_archiving_twice(self):
+        with mock.patch('dashboard.archive.delete_archived', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                archive('activity', now=self.now)
+        self.assertEqual(UserActivity.objects.count(), 5)
+
+        stats = archive('activity', now=self.now)
+        self.assertEqual((stats.rows, stats.deleted), (0, 4))
+        self.assertEqual(UserActivity.objects.count(), 1)
+        self.assertEqual(len(list(ArchiveReader('activity').rows())), 4)
+
+    def test_runs_of_a_kind_do_not_overlap(self):
+        storage = get_storage()
+        with run_lock(storage, 'usage'):
+            with self.assertRaises(ArchiveLocked):
+                archive('usage', now=self.now)
+            with self.assertRaises(CommandError):
+                call_command('archive_usage', 'usage', stdout=io.StringIO())
+            # Other kinds have their own lock
+            self.assertEqual(archive('activity', now=self.now).rows, 4)
+        self.assertEqual(ToolUsage.objects.count(), 5)
+        self.assertEqual(archive('usage', now=self.now).rows, 4)
+        self.assertFalse(storage.exists(lock_name('usage')))
+
+    def test_manifest_is_replaced_in_place(self):
+        archive('activity', now=self.now)
+        storage = get_storage()
+        manifest = read_manifest(storage, 'activity')
+        manifest['runs'][0]['note'] = 'replaced'
+        write_manifest(storage, 'activity', manifest)
+        self.assertEqual(read_manifest(storage, 'activity')['runs'][0]['note'], 'replaced')
+        _, names = storage.listdir(os.path.dirname(manifest_name('activity')))
+        self.assertEqual([name for name in names if name.startswith('manifest')], ['manifest.json'])
+
+    def test_rebuild_keeps_archived_days(self):
+        archive('usage', now=self.now)
+        rebuild_rollups()
+        self.assertEqual(UsageDailyRollup.objects.count(), 5)
+
+    def test_command_dry_run(self):
+        output = io.StringIO()
+        call_command('archive_usage', 'activity', '--dry-run', '--days', '0', stdout=output)
+        self.assertIn('activity: 5 rows to archive', output.getvalue())
+        self.assertEqual(UserActivity.objects.count(), 5)
@@ -7,4 +7,5 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('statistics/', views.statistics, name='statistics'),
     path('settings/', views.settings, name='settings'),
+    path('export/<str:kind>/', views.export, name='export'),
 ]
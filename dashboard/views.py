@@ -1,29 +1,29 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count
+from django.db.models import Sum
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
-from .models import UserActivity
-from tools.models import ToolUsage  # Change to use ToolUsage instead of Usage
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
+from .models import UserActivity, UsageDailyRollup
+from .activity import log_activity
+from .exports import EXPORTS, FORMATS, export_filename, stream_export
 
 @login_required
 def home(request):
     # Add activity for dashboard visit
-    UserActivity.objects.create(
-        user=request.user,
-        activity_type='dashboard_visit',
-        description='Viewed dashboard home page'
-    )
-    # Get date range for filtering
+    log_activity(request.user, 'dashboard_visit', 'Viewed dashboard home page')
+    # Get date range for filtering (the last 30 days, today included)
     end_date = timezone.now()
-    start_date = end_date - timedelta(days=30)
-    
-    # Get usage statistics using ToolUsage model
-    usage_stats = ToolUsage.objects.filter(
+    start_date = end_date - timedelta(days=29)
+
+    # Read the pre-aggregated daily rollups instead of raw ToolUsage rows
+    rollups = UsageDailyRollup.objects.filter(
         user=request.user,
-        created_at__range=[start_date, end_date]
-    ).aggregate(
-        total_tokens=Sum('tokens_used'),
+        day__range=[timezone.localdate(start_date), timezone.localdate(end_date)]
+    )
+    usage_stats = rollups.aggregate(
+        total_tokens=Sum('tokens'),
         total_cost=Sum('cost')
     )
 
@@ -39,15 +39,12 @@ def home(request):
         )
     }
 
-    # Get most used tools with percentage calculation using ToolUsage
-    most_used_tools = ToolUsage.objects.filter(
-        user=request.user,
-        created_at__range=[start_date, end_date]
-    ).values(
-        'tool__name'  # Use tool__name instead of tool_name
+    # Get most used tools with percentage calculation
+    most_used_tools = rollups.values(
+        'tool__name'
     ).annotate(
-        total_uses=Count('id'),
-        total_tokens=Sum('tokens_used'),
+        total_uses=Sum('calls'),
+        total_tokens=Sum('tokens'),
         total_cost=Sum('cost')
     ).order_by('-total_uses')[:5]
 
@@ -85,32 +82,42 @@ def home(request):
 @login_required
 def statistics(request):
     # Add activity for statistics view
-    UserActivity.objects.create(
-        user=request.user,
-        activity_type='statistics_view',
-        description='Viewed usage statistics'
-    )
-    # Get monthly usage data
-    monthly_usage = ToolUsage.objects.filter(
-        user=request.user,
-        created_at__gte=timezone.now() - timedelta(days=365)
-    ).values('created_at__month').annotate(
-        total_tokens=Sum('tokens_used'),
+    log_activity(request.user, 'statistics_view', 'Viewed usage statistics')
+    # Get monthly usage data from the daily rollups
+    rollups = UsageDailyRollup.objects.filter(user=request.user)
+    monthly_usage = rollups.filter(
+        day__gte=timezone.localdate() - timedelta(days=365)
+    ).values('day__month').annotate(
+        total_tokens=Sum('tokens'),
         total_cost=Sum('cost')
-    ).order_by('created_at__month')
+    ).order_by('day__month')
 
-    # Get tool-wise usage
-    tool_usage = ToolUsage.objects.filter(
-        user=request.user
-    ).values('tool__name').annotate(
-        total_tokens=Sum('tokens_used'),
+    # Get tool-wise usage (one row per tool and day, not per call)
+    tool_usage = rollups.values('tool__name').annotate(
+        total_tokens=Sum('tokens'),
         total_cost=Sum('cost'),
-        usage_count=Count('id')
+        usage_count=Sum('calls')
     ).order_by('-usage_count')
 
     context = {
-        'monthly_usage': list(monthly_usage),  # Convert to list for JSON serialization
-        'tool_usage': list(tool_usage),
+        # Plain values with the keys the template's charts read
+        'monthly_usage': [
+            {
+                'date__month': row['day__month'],
+                'total_tokens': row['total_tokens'],
+                'total_cost': float(row['total_cost'])
+            }
+            for row in monthly_usage
+        ],
+        'tool_usage': [
+            {
+                'tool_name': row['tool__name'],
+                'usage_count': row['usage_count'],
+                'total_tokens': row['total_tokens'],
+                'total_cost': float(row['total_cost'])
+            }
+            for row in tool_usage
+        ],
     }
     return render(request, 'dashboard/statistics.html', context)
 
@@ -121,13 +128,52 @@ def settings(request):
         # ...
         
         # Record the activity
-        UserActivity.objects.create(
-            user=request.user,
-            activity_type='settings_update',
-            description='Updated account settings'
-        )
+        log_activity(request.user, 'settings_update', 'Updated account settings')
         
     context = {
         'user': request.user,
     }
     return render(request, 'dashboard/settings.html', context)
+
+def parse_day(value):
+    """Start of the given YYYY-MM-DD day in the current time zone, or None."""
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'Invalid date: {value}')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+@login_required
+def export(request, kind):
+    """
+    Stream the user's ToolUsage or Payment history as CSV or NDJSON.
+    Query parameters: format, since/until (YYYY-MM-DD, until exclusive),
+    payload=1 to include input/output data, gzip=1, all=1 (staff only).
+    """
+    if kind not in EXPORTS:
+        raise Http404
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest(f'Unknown format: {fmt}')
+    try:
+        since = parse_day(request.GET.get('since'))
+        until = parse_day(request.GET.get('until'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    compress = request.GET.get('gzip') == '1'
+    everyone = request.GET.get('all') == '1' and request.user.is_staff
+
+    log_activity(request.user, 'export', f'Exported {kind} history')
+    response = StreamingHttpResponse(
+        stream_export(
+            kind, fmt, compress,
+            user=None if everyone else request.user,
+            since=since,
+            until=until,
+            include_payload=request.GET.get('payload') == '1'
+        ),
+        content_type='application/gzip' if compress else FORMATS[fmt]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(kind, fmt, compress)}"'
+    return response
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def razorpay_credentials_check(app_configs, **kwargs):
+    if settings.RAZORPAY_KEY_ID and settings.RAZORPAY_KEY_SECRET:
+        return []
+    return [Error(
+        "Razorpay API credentials are not configured properly",
+        hint="Set RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET in the environment or .env.",
+        id='payments.E001',
+    )]
@@ -0,0 +1,44 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from payments.webhooks import BATCH_SIZE, process_pending
+
+
+class Command(BaseCommand):
+    help = 'Applies recorded Razorpay webhook events to payments in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Events applied per transaction')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Also retry events that failed before')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new events instead of exiting when drained')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            totals = Counter()
+            last_id = 0
+            while True:
+                # Events that fail again are not retried within the same pass
+                events = process_pending(options['batch_size'], options['retry_failed'], after=last_id)
+                if not events:
+                    break
+                totals.update(event.status for event in events)
+                last_id = events[-1].pk
+            elapsed = time.perf_counter() - started
+
+            if totals or not options['loop']:
+                summary = ', '.join(f'{count} {status}' for status, count in sorted(totals.items()))
+                self.stdout.write(self.style.SUCCESS(
+                    f'Applied {totals.total()} webhook events in {elapsed:.2f}s'
+                    + (f' ({summary})' if summary else '')
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
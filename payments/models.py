@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
 from billing.models import Plan, Subscription, Invoice
+from core.tracking import FieldTrackerMixin
 
-class Payment(models.Model):
+class Payment(FieldTrackerMixin, models.Model):
     STATUS_CHOICES = [
         ('created', 'Created'),
         ('authorized', 'Authorized'),
@@ -23,12 +24,30 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Payment history, newest first (keyset pagination)
+            models.Index(fields=['user', '-created_at'], name='payment_user_created_idx'),
+            # Webhook and callback lookups
+            models.Index(fields=['razorpay_order_id'], name='payment_order_id_idx'),
+            models.Index(fields=['razorpay_payment_id'], name='payment_payment_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.amount} {self.currency}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        status_changed = self.has_changed('status') and (
+            update_fields is None or 'status' in update_fields
+        )
+        super().save(*args, **kwargs)
+        if status_changed:
+            self.update_invoice_status()
+
     def update_invoice_status(self):
         """Update associated invoice status based on payment status"""
-        if not self.invoice:
+        if not self.invoice_id:
             return
 
         status_mapping = {
@@ -40,5 +59,33 @@ class Payment(models.Model):
         if self.status in status_mapping:
             self.invoice.status = status_mapping[self.status]
             self.invoice.paid_at = self.updated_at if self.status == 'captured' else None
-            self.invoice.save()
+            self.invoice.save_changes()
 # Create your models here.
+
+
+class WebhookEvent(models.Model):
+    """A verified Razorpay webhook delivery, applied later by ``process_webhooks``."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's queue: oldest pending first
+            models.Index(fields=['status', 'id'], name='webhook_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} ({self.event_id})"
@@ -1,67 +1,174 @@
+"""
+Razorpay API client.
+
+The service is built on first use in each process (``get_razorpay_service``)
+rather than at import, and talks to the gateway through one keep-alive
+``requests.Session`` with connect/read timeouts on every call.
+``create_order`` retries connection failures and gateway errors a bounded
+number of times with jittered exponential backoff, and a circuit breaker
+fails calls fast while the gateway keeps failing, instead of tying up
+workers on timeouts.
+"""
+import atexit
+import logging
+import random
+import threading
+import time
+from decimal import Decimal
+from functools import lru_cache
+
 import razorpay
+import requests
 from django.conf import settings
-from decimal import Decimal
-import logging
-import requests.exceptions
-import socket
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+
+class GatewayUnavailable(Exception):
+    """Razorpay could not be reached (or the circuit breaker is open)."""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures; while open, calls
+    are refused for ``reset_timeout`` seconds, after which one trial call is
+    let through. Its success closes the breaker again.
+    """
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class TimeoutSession(requests.Session):
+    """Session that applies a default timeout to every request."""
+    def __init__(self, timeout, max_connections):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(*args, **kwargs)
+
+
+# Failures worth retrying: the request may not have reached Razorpay, or
+# Razorpay (or a proxy in front of it) failed on its side. An order created
+# by an attempt whose answer was lost is never paid and simply expires.
+RETRYABLE = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.JSONDecodeError,
+    razorpay.errors.ServerError,
+    razorpay.errors.GatewayError,
+)
+
+
 class RazorpayService:
-    def __init__(self):
-        if not settings.RAZORPAY_KEY_ID or not settings.RAZORPAY_KEY_SECRET:
+    def __init__(self, key_id=None, key_secret=None, base_url=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, retry_delay=None,
+                 failure_threshold=None, reset_timeout=None, max_connections=None):
+        key_id = key_id or settings.RAZORPAY_KEY_ID
+        key_secret = key_secret or settings.RAZORPAY_KEY_SECRET
+        if not key_id or not key_secret:
             raise Exception("Razorpay credentials are not properly configured")
-            
-        try:
-            self.client = razorpay.Client(
-                auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-            )
-            
-            # Skip validation in development if network issues
-            if not settings.DEBUG:
-                try:
-                    self.client.order.all()
-                except (requests.exceptions.ConnectionError, 
-                       socket.gaierror, 
-                       requests.exceptions.RequestException) as e:
-                    logger.warning(f"Network error during Razorpay initialization: {str(e)}")
-                    # Continue anyway in development
-                except razorpay.errors.BadRequestError as e:
-                    logger.error(f"Razorpay authentication failed: {str(e)}")
-                    raise Exception("Invalid Razorpay API credentials")
-                    
-        except Exception as e:
-            logger.error(f"Razorpay initialization error: {str(e)}")
-            if settings.DEBUG:
-                logger.warning("Continuing despite Razorpay initialization error (DEBUG mode)")
+
+        self.max_retries = settings.RAZORPAY_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_delay = settings.RAZORPAY_RETRY_DELAY if retry_delay is None else retry_delay
+        self.breaker = CircuitBreaker(
+            settings.RAZORPAY_BREAKER_THRESHOLD if failure_threshold is None else failure_threshold,
+            settings.RAZORPAY_BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout,
+        )
+        self.session = TimeoutSession(
+            timeout=(
+                settings.RAZORPAY_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+                settings.RAZORPAY_READ_TIMEOUT if read_timeout is None else read_timeout,
+            ),
+            max_connections=max_connections or settings.RAZORPAY_MAX_CONNECTIONS,
+        )
+        self.client = razorpay.Client(
+            session=self.session,
+            auth=(key_id, key_secret),
+            base_url=base_url or settings.RAZORPAY_API_URL,
+        )
+
+    def _call(self, func, *args, retries=0, **kwargs):
+        """Call the gateway through the circuit breaker, retrying ``retries`` times."""
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                raise GatewayUnavailable("Network error: Razorpay is temporarily unavailable")
+            try:
+                result = func(*args, **kwargs)
+            except RETRYABLE as e:
+                self.breaker.record_failure()
+                if attempt == retries:
+                    raise GatewayUnavailable(f"Network error: Unable to connect to Razorpay ({e})")
+                # Full jitter keeps retrying workers from hitting the gateway in lockstep
+                time.sleep(random.uniform(0, self.retry_delay * 2 ** attempt))
+            except Exception:
+                # Razorpay answered; it refused the request itself
+                self.breaker.record_success()
+                raise
             else:
-                raise Exception(f"Failed to initialize Razorpay client: {str(e)}")
+                self.breaker.record_success()
+                return result
 
     def create_order(self, amount, currency='INR'):
         """Create Razorpay Order"""
+        # Convert amount to paise
+        amount_in_paise = int(Decimal(str(amount)) * 100)
+
+        data = {
+            'amount': amount_in_paise,
+            'currency': currency,
+            'payment_capture': '1'
+        }
+
         try:
-            # Convert amount to paise
-            amount_in_paise = int(Decimal(str(amount)) * 100)
-            
-            data = {
-                'amount': amount_in_paise,
-                'currency': currency,
-                'payment_capture': '1'
-            }
-            
-            order = self.client.order.create(data=data)
-            logger.info(f"Razorpay order created successfully: {order['id']}")
-            return order
-            
-        except (requests.exceptions.ConnectionError, socket.gaierror) as e:
+            order = self._call(self.client.order.create, data=data, retries=self.max_retries)
+        except GatewayUnavailable as e:
             logger.error(f"Network error during order creation: {str(e)}")
-            raise Exception("Network error: Unable to connect to Razorpay")
+            raise
         except razorpay.errors.BadRequestError as e:
             logger.error(f"Razorpay order creation failed: {str(e)}")
             raise Exception(f"Razorpay Bad Request: {str(e)}")
         except Exception as e:
             logger.error(f"Unexpected error during order creation: {str(e)}")
             raise Exception(f"Order creation failed: {str(e)}")
+        logger.info(f"Razorpay order created successfully: {order['id']}")
+        return order
 
     def verify_payment_signature(self, payment_id, order_id, signature):
         """Verify Razorpay payment signature"""
@@ -75,3 +182,20 @@ class RazorpayService:
         except razorpay.errors.SignatureVerificationError:
             return False
 
+    def close(self):
+        self.session.close()
+
+
+@lru_cache(maxsize=None)
+def get_razorpay_service():
+    """Return this process's RazorpayService, building it on first use."""
+    service = RazorpayService()
+    atexit.register(service.close)
+    return service
+
+
+def reset_razorpay_service():
+    """Drop the process's service so the next call rebuilds it from settings."""
+    if get_razorpay_service.cache_info().currsize:
+        get_razorpay_service().close()
+    get_razorpay_service.cache_clear()
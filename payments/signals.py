@@ -0,0 +1,9 @@
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+@receiver(setting_changed)
+def reset_razorpay_client(sender, setting, **kwargs):
+    """Rebuild the Razorpay client when its configuration changes (e.g. override_settings)."""
+    if setting.startswith('RAZORPAY_'):
+        from .services import reset_razorpay_service
+        reset_razorpay_service()
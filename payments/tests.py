@@ -1,3 +1,244 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from billing.models import Invoice
+
+from .models import Payment, WebhookEvent
+from .services import GatewayUnavailable, RazorpayService
+from .webhooks import process_pending
+from .views import PAYMENTS_PER_PAGE
+
+
+class PaymentHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+        Payment.objects.bulk_create([
+            Payment(user=cls.user, razorpay_order_id=f'order_{n}', amount=n + 1)
+            for n in range(PAYMENTS_PER_PAGE + 5)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_history_is_paginated(self):
+        response = self.client.get(reverse('payments:history'))
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertEqual(len(page), PAYMENTS_PER_PAGE)
+        self.assertFalse(page.has_previous)
+
+        response = self.client.get(reverse('payments:history'), {'cursor': page.next_cursor})
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next)
+        self.assertTrue(page.has_previous)
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.client.get(reverse('payments:history'), {'cursor': 'bogus'})
+        self.assertEqual(len(response.context['page_obj']), PAYMENTS_PER_PAGE)
+
+
+class PaymentStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+
+    def setUp(self):
+        self.invoice = Invoice.objects.create(
+            user=self.user, amount=29, status='open', due_date=date.today()
+        )
+        self.payment = Payment.objects.create(
+            user=self.user, invoice=self.invoice, razorpay_order_id='order_1', amount=29
+        )
+
+    def test_captured_payment_marks_invoice_paid(self):
+        payment = Payment.objects.get(pk=self.payment.pk)
+        payment.status = 'captured'
+        payment.save()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.status, 'paid')
+        self.assertEqual(self.invoice.paid_at, payment.updated_at)
+
+    def test_saving_without_a_status_change_leaves_invoice_alone(self):
+        payment = Payment.objects.get(pk=self.payment.pk)
+        payment.razorpay_payment_id = 'pay_1'
+        with self.assertNumQueries(1):
+            payment.save()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.status, 'open')
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='whsec')
+class WebhookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+
+    def setUp(self):
+        self.invoice = Invoice.objects.create(
+            user=self.user, amount=29, status='open', due_date=date.today()
+        )
+        self.payment = Payment.objects.create(
+            user=self.user, invoice=self.invoice, razorpay_order_id='order_1', amount=29
+        )
+
+    def deliver(self, event, payment_id='pay_1', order_id='order_1', event_id='evt_1', signature=None):
+        body = json.dumps({
+            'event': event,
+            'payload': {'payment': {'entity': {'id': payment_id, 'order_id': order_id}}},
+        })
+        if signature is None:
+            signature = hmac.new(b'whsec', body.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('payments:webhook'), body, content_type='application/json',
+            headers={'X-Razorpay-Signature': signature, 'X-Razorpay-Event-Id': event_id}
+        )
+
+    def test_events_are_recorded_once_and_applied_later(self):
+        with self.assertNumQueries(1):
+            response = self.deliver('payment.captured')
+        self.assertEqual(response.status_code, 200)
+        # Razorpay retries the same event
+        self.deliver('payment.captured')
+        self.assertEqual(WebhookEvent.objects.get().status, 'pending')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'created')
+
+        [event] = process_pending()
+        self.assertEqual(event.status, 'processed')
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.razorpay_payment_id), ('captured', 'pay_1'))
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.status, 'paid')
+        self.assertEqual(process_pending(), [])
+
+    def test_invalid_signature_is_rejected(self):
+        response = self.deliver('payment.captured', signature='forged')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_worker_applies_pending_events(self):
+        for n in range(2, 6):
+            Payment.objects.create(user=self.user, razorpay_order_id=f'order_{n}', amount=29)
+            self.deliver('payment.captured', f'pay_{n}', f'order_{n}', f'evt_{n}')
+        self.deliver('order.paid', event_id='evt_order')
+        self.deliver('payment.captured', 'pay_x', 'order_unknown', 'evt_unknown')
+
+        out = io.StringIO()
+        call_command('process_webhooks', stdout=out)
+        self.assertIn('Applied 6 webhook events', out.getvalue())
+        self.assertIn('1 failed, 1 ignored, 4 processed', out.getvalue())
+        self.assertEqual(Payment.objects.filter(status='captured').count(), 4)
+        failed = WebhookEvent.objects.get(status='failed')
+        self.assertIn('order_unknown', failed.error)
+
+    def test_late_failed_attempt_does_not_undo_capture(self):
+        self.deliver('payment.captured', 'pay_2', event_id='evt_captured')
+        self.deliver('payment.failed', 'pay_1', event_id='evt_failed')
+        process_pending()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.razorpay_payment_id), ('captured', 'pay_2'))
+
+
+class FakeRazorpay(ThreadingHTTPServer):
+    """
+    Local stand-in for the Razorpay API. ``responses`` is a list of
+    ``(status, body)`` answers served in order; ``None`` drops the connection.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRazorpayHandler)
+        self.responses = []
+        self.requests = []
+        self.connections = set()
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeRazorpayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.server.requests.append((self.path, json.loads(self.rfile.read(length) or b'{}')))
+        self.server.connections.add(self.client_address)
+        response = self.server.responses.pop(0) if self.server.responses else (200, {'id': 'order_fake'})
+        if response is None:
+            self.close_connection = True
+            return
+        status, body = response
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class RazorpayServiceTests(TestCase):
+    server_error = (500, {'error': {'code': 'SERVER_ERROR', 'description': 'Down'}})
+
+    def setUp(self):
+        self.server = FakeRazorpay()
+        self.addCleanup(self.server.stop)
+        self.service = RazorpayService(
+            base_url=self.server.url, retry_delay=0, max_retries=2,
+            failure_threshold=3, reset_timeout=60,
+        )
+        self.addCleanup(self.service.close)
+
+    def test_create_order_reuses_one_connection(self):
+        for _ in range(3):
+            self.assertEqual(self.service.create_order(29)['id'], 'order_fake')
+        self.assertEqual(len(self.server.connections), 1)
+        path, data = self.server.requests[0]
+        self.assertEqual(path, '/v1/orders')
+        self.assertEqual(data['amount'], 2900)
+
+    def test_create_order_retries_gateway_failures(self):
+        self.server.responses = [self.server_error, None]
+        self.assertEqual(self.service.create_order(29)['id'], 'order_fake')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_bad_request_is_not_retried(self):
+        self.server.responses = [(400, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Nope'}})]
+        with self.assertRaisesMessage(Exception, 'Razorpay Bad Request: Nope'):
+            self.service.create_order(29)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_breaker_fails_fast_while_gateway_is_down(self):
+        self.server.responses = [self.server_error] * 3
+        with self.assertRaisesMessage(GatewayUnavailable, 'Network error'):
+            self.service.create_order(29)
+        self.assertTrue(self.service.breaker.is_open)
+        with self.assertRaisesMessage(GatewayUnavailable, 'temporarily unavailable'):
+            self.service.create_order(29)
+        self.assertEqual(len(self.server.requests), 3)
+
+        # After the reset timeout one trial call goes through and closes the breaker
+        self.service.breaker.reset_timeout = 0
+        self.assertEqual(self.service.create_order(29)['id'], 'order_fake')
+        self.assertFalse(self.service.breaker.is_open)
@@ -1,4 +1,3 @@
-import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -7,15 +6,20 @@ from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.urls import reverse
-from dateutil.relativedelta import relativedelta
-from .services import RazorpayService
 from billing.models import Plan, Subscription, Invoice
 from .models import Payment
+from .webhooks import get_event_id, record_event
+from core.pagination import InvalidCursor, KeysetPaginator
 import logging
 
 logger = logging.getLogger(__name__)
 
-razorpay_service = RazorpayService()
+PAYMENTS_PER_PAGE = 20
+
+def razorpay_service():
+    # Deferred: razorpay and requests are only imported once a payment view runs
+    from .services import get_razorpay_service
+    return get_razorpay_service()
 
 @login_required
 def initiate_payment(request, plan_slug):
@@ -26,7 +30,7 @@ def initiate_payment(request, plan_slug):
     
     try:
         # Create Razorpay Order - let service handle paise conversion
-        order = razorpay_service.create_order(plan.price)
+        order = razorpay_service().create_order(plan.price)
         
         # Create Payment record (store original amount in rupees)
         payment = Payment.objects.create(
@@ -57,7 +61,10 @@ def initiate_payment(request, plan_slug):
 
 @csrf_exempt
 def razorpay_webhook(request):
-    """Handle Razorpay webhook notifications"""
+    """
+    Handle Razorpay webhook notifications. Events are only recorded here and
+    applied by the process_webhooks command.
+    """
     if request.method == "POST":
         try:
             # Verify webhook signature
@@ -68,22 +75,13 @@ def razorpay_webhook(request):
             webhook_data = request.body.decode('utf-8')
             
             # Verify webhook
-            razorpay_service.client.utility.verify_webhook_signature(
+            razorpay_service().client.utility.verify_webhook_signature(
                 webhook_data,
                 webhook_signature,
                 webhook_secret
             )
             
-            # Process webhook data
-            data = json.loads(webhook_data)
-            event = data.get('event')
-            
-            if event == 'payment.captured':
-                payment_id = data['payload']['payment']['entity']['id']
-                payment = Payment.objects.get(razorpay_payment_id=payment_id)
-                payment.status = 'captured'
-                payment.save()
-                
+            record_event(get_event_id(request, webhook_data), webhook_data)
             return JsonResponse({'status': 'success'})
             
         except Exception as e:
@@ -113,8 +111,13 @@ def payment_cancel(request):
 
 @login_required
 def payment_history(request):
-    payments = Payment.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'payments/history.html', {'payments': payments})
+    payments = Payment.objects.filter(user=request.user)
+    paginator = KeysetPaginator(payments, PAYMENTS_PER_PAGE)
+    try:
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    except InvalidCursor:
+        page_obj = paginator.get_page()
+    return render(request, 'payments/history.html', {'page_obj': page_obj})
 
 @login_required
 def cancel_subscription(request, subscription_id):
@@ -135,7 +138,7 @@ def payment_callback(request):
             signature = request.POST.get('razorpay_signature')
             
             # Verify signature
-            razorpay_service.client.utility.verify_payment_signature({
+            razorpay_service().client.utility.verify_payment_signature({
                 'razorpay_payment_id': payment_id,
                 'razorpay_order_id': order_id,
                 'razorpay_signature': signature
@@ -144,7 +147,7 @@ def payment_callback(request):
             # Update payment record
             payment = Payment.objects.get(razorpay_order_id=order_id)
             payment.razorpay_payment_id = payment_id
-            payment.status = 'completed'
+            payment.status = 'captured'
             payment.save()
             
             messages.success(request, 'Payment successful! Your subscription is now active.')
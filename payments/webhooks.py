@@ -0,0 +1,116 @@
+"""
+Razorpay webhook ingestion.
+
+The webhook view only verifies the signature and stores the delivery as a
+``WebhookEvent``: one INSERT, after which Razorpay gets its 200. Retries of
+an event carry the same ``X-Razorpay-Event-Id`` and are dropped by the
+unique ``event_id``. The ``process_webhooks`` command applies pending events
+in batches, loading every payment a batch refers to with one query.
+"""
+import hashlib
+import json
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Payment, WebhookEvent
+
+BATCH_SIZE = 500
+
+# Payment status each handled event moves the payment to
+EVENT_STATUSES = {
+    'payment.captured': 'captured',
+    'payment.failed': 'failed',
+}
+
+
+def get_event_id(request, body):
+    """Razorpay's event id, or a digest of the body for deliveries without one."""
+    return request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(body.encode()).hexdigest()
+
+
+def record_event(event_id, body):
+    """Store a verified delivery; a repeated ``event_id`` is ignored."""
+    data = json.loads(body)
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event_id, event=data.get('event', ''), payload=data)],
+        ignore_conflicts=True,
+    )
+
+
+def _payment_entity(event):
+    return event.payload['payload']['payment']['entity']
+
+
+def _load_payments(events):
+    """Payments referred to by ``events``, by order id and by payment id."""
+    order_ids, payment_ids = set(), set()
+    for event in events:
+        try:
+            entity = _payment_entity(event)
+        except (KeyError, TypeError):
+            continue
+        order_ids.add(entity.get('order_id'))
+        payment_ids.add(entity.get('id'))
+    payments = Payment.objects.filter(
+        Q(razorpay_order_id__in=order_ids - {None}) | Q(razorpay_payment_id__in=payment_ids - {None})
+    )
+    by_order, by_id = {}, {}
+    for payment in payments:
+        by_order[payment.razorpay_order_id] = payment
+        if payment.razorpay_payment_id:
+            by_id[payment.razorpay_payment_id] = payment
+    return by_order, by_id
+
+
+def apply_event(event, by_order, by_id):
+    """Apply one event to its payment; returns the event's new status."""
+    status = EVENT_STATUSES.get(event.event)
+    if status is None:
+        return 'ignored'
+    entity = _payment_entity(event)
+    # The order id is known from checkout; the payment id may not be yet
+    payment = by_order.get(entity.get('order_id')) or by_id.get(entity.get('id'))
+    if payment is None:
+        raise LookupError(f"No payment for order {entity.get('order_id')}")
+    if status == 'failed' and payment.status in ('captured', 'refunded'):
+        # An earlier failed attempt on an order that was paid after all
+        return 'processed'
+    payment.status = status
+    payment.razorpay_payment_id = entity['id']
+    # Updates the invoice when the status changes
+    payment.save_changes()
+    return 'processed'
+
+
+def process_pending(batch_size=BATCH_SIZE, retry_failed=False, after=0):
+    """
+    Apply one batch of events with ids above ``after``, oldest first, and
+    return them with their new status (empty when the queue is drained).
+    Several workers can run at once: rows locked by another worker are
+    skipped where the database supports it.
+    """
+    statuses = ['pending', 'failed'] if retry_failed else ['pending']
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status__in=statuses, pk__gt=after).order_by('id')[:batch_size]
+        )
+        if not events:
+            return []
+        by_order, by_id = _load_payments(event for event in events if event.event in EVENT_STATUSES)
+
+        now = timezone.now()
+        for event in events:
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    event.status = apply_event(event, by_order, by_id)
+                event.error = ''
+                event.processed_at = now
+            except Exception as e:
+                event.status = 'failed'
+                event.error = str(e)
+        WebhookEvent.objects.bulk_update(events, ['status', 'attempts', 'error', 'processed_at'])
+    return events
@@ -1,6 +1,24 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib import admin
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.html import format_html
+
+from dashboard.models import UsageDailyRollup
 from .models import Category, Tool, ToolUsage
 
+
+def recent_rollup_total(field, since):
+    """Sum of a ``UsageDailyRollup`` column for the tool since ``since``, as a subquery."""
+    totals = UsageDailyRollup.objects.filter(tool=OuterRef('pk'), day__gte=since).order_by().values(
+        'tool'
+    ).annotate(total=Sum(field)).values('total')
+    return Coalesce(Subquery(totals), 0)
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
@@ -9,15 +27,54 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Tool)
 class ToolAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'status', 'cost_per_token', 'created_at')
-    list_filter = ('category', 'status')
+    list_display = ('name', 'category', 'status', 'cost_per_token', 'cache_enabled',
+                    'cache_hit_rate', 'saved_tokens', 'created_at')
+    list_filter = ('category', 'status', 'cache_enabled')
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name', 'description')
     date_hierarchy = 'created_at'
 
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if match is None or match.url_name != 'tools_tool_changelist':
+            return queryset
+        # Only the list shows cache stats, read from the daily rollups of a
+        # recent window rather than aggregated over ToolUsage
+        since = timezone.localdate() - timedelta(days=settings.TOOLS_CACHE_STATS_DAYS - 1)
+        return queryset.annotate(
+            usage_count=recent_rollup_total('calls', since),
+            cache_hits=recent_rollup_total('cache_hits', since),
+            tokens_saved=recent_rollup_total('tokens_saved', since),
+        )
+
+    @admin.display(description=f'Cache hit rate ({settings.TOOLS_CACHE_STATS_DAYS} days)', ordering='cache_hits')
+    def cache_hit_rate(self, obj):
+        if not obj.usage_count:
+            return '-'
+        return f'{obj.cache_hits / obj.usage_count:.1%}'
+
+    @admin.display(description=f'Tokens saved ({settings.TOOLS_CACHE_STATS_DAYS} days)', ordering='tokens_saved')
+    def saved_tokens(self, obj):
+        return obj.tokens_saved
+
 @admin.register(ToolUsage)
 class ToolUsageAdmin(admin.ModelAdmin):
-    list_display = ('user', 'tool', 'tokens_used', 'cost', 'success', 'created_at')
-    list_filter = ('tool', 'success', 'created_at')
+    list_display = ('user', 'tool', 'tokens_used', 'cost', 'success', 'cache_hit', 'created_at')
+    list_filter = ('tool', 'success', 'cache_hit', 'created_at')
     search_fields = ('user__username', 'tool__name')
     date_hierarchy = 'created_at'
+    list_select_related = ('user', 'tool')
+    readonly_fields = ('input', 'output')
+
+    def get_queryset(self, request):
+        # The payload is loaded only when a single usage is opened
+        return super().get_queryset(request).metadata()
+
+    @admin.display(description='Input data')
+    def input(self, obj):
+        return format_html('<pre>{}</pre>', json.dumps(obj.input_data, indent=2))
+
+    @admin.display(description='Output data')
+    def output(self, obj):
+        return format_html('<pre>{}</pre>', json.dumps(obj.output_data, indent=2))
@@ -0,0 +1,306 @@
+"""
+Model backends that produce tool output.
+
+A backend turns validated input into ``{'output', 'tokens_used', 'cost'}``.
+Backends are configured in ``TOOLS_MODEL_BACKENDS`` and looked up by
+``Tool.model_name``; models without an entry use the ``'default'`` backend.
+Each backend is a process-wide instance that owns its connection pool,
+timeouts and a concurrency limit, so one slow model cannot take the
+worker threads (or event loop slots) of the others.
+
+    TOOLS_MODEL_BACKENDS = {
+        'default': {'BACKEND': 'tools.backends.StubBackend'},
+        'gpt-4': {
+            'BACKEND': 'tools.backends.HTTPBackend',
+            'OPTIONS': {'url': 'https://inference.internal/v1/generate', 'max_concurrency': 32},
+        },
+    }
+"""
+import asyncio
+import json
+import threading
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class BackendUnavailable(Exception):
+    """The backend is saturated or could not be reached."""
+
+
+class BaseModelBackend:
+    """
+    Subclasses implement ``_generate`` (blocking) and may override
+    ``_stream``; callers use ``generate``/``agenerate``/``stream``, which
+    wait for a free slot for at most ``queue_timeout`` seconds.
+
+    ``agenerate`` runs ``generate`` in a worker thread, so sync and async
+    calls share one limit (and the connection pool behind it). Backends
+    with ``native_async`` implement ``_agenerate`` instead; their async
+    calls are limited per event loop.
+    """
+    native_async = False
+
+    def __init__(self, name='default', max_concurrency=None, queue_timeout=None):
+        self.name = name
+        self.max_concurrency = (
+            settings.TOOLS_MODEL_CONCURRENCY if max_concurrency is None else max_concurrency
+        )
+        self.queue_timeout = (
+            settings.TOOLS_MODEL_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        )
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # asyncio semaphores belong to one event loop, so keep one per running loop
+        self._async_slots = weakref.WeakKeyDictionary()
+
+    def generate(self, tool, input_data):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise BackendUnavailable(f"Model backend '{self.name}' is busy, try again later")
+        try:
+            return self._generate(tool, input_data)
+        finally:
+            self._slots.release()
+
+    async def agenerate(self, tool, input_data):
+        if not self.native_async:
+            return await sync_to_async(self.generate, thread_sensitive=False)(tool, input_data)
+        slots = self._get_async_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise BackendUnavailable(f"Model backend '{self.name}' is busy, try again later")
+        try:
+            return await self._agenerate(tool, input_data)
+        finally:
+            slots.release()
+
+    def stream(self, tool, input_data):
+        """
+        Yield ``{'delta': text}`` for each chunk of output as it is produced,
+        then one ``{'result': result}`` with the complete result. The slot is
+        held until the stream is exhausted or closed.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise BackendUnavailable(f"Model backend '{self.name}' is busy, try again later")
+        try:
+            yield from self._stream(tool, input_data)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Release pooled connections."""
+
+    def _generate(self, tool, input_data):
+        raise NotImplementedError
+
+    def _stream(self, tool, input_data):
+        # Backends that can't stream deliver everything at once
+        yield {'result': self._generate(tool, input_data)}
+
+    async def _agenerate(self, tool, input_data):
+        raise NotImplementedError
+
+    def _get_async_slots(self):
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop)
+        if slots is None:
+            slots = self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        return slots
+
+    @staticmethod
+    def build_result(tool, output, tokens_used):
+        return {
+            'output': output,
+            'tokens_used': tokens_used,
+            'cost': float(tool.cost_per_token * tokens_used)
+        }
+
+
+class StubBackend(BaseModelBackend):
+    """
+    Local stand-in for a model server: canned output after ``latency``
+    seconds. Used for development and load tests.
+    """
+    native_async = True
+
+    def __init__(self, latency=None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = settings.TOOLS_STUB_LATENCY if latency is None else latency
+
+    def _generate(self, tool, input_data):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._simulate(tool, input_data)
+
+    async def _agenerate(self, tool, input_data):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._simulate(tool, input_data)
+
+    def _stream(self, tool, input_data):
+        result = self._simulate(tool, input_data)
+        words = ' '.join(str(value) for value in result['output'].values()).split(' ')
+        # Spread the latency over the words, like a model emitting tokens
+        delay = self.latency / len(words)
+        for index, word in enumerate(words):
+            if delay:
+                time.sleep(delay)
+            yield {'delta': word if index == 0 else f' {word}'}
+        yield {'result': result}
+
+    def _simulate(self, tool, input_data):
+        # Simulate AI processing
+        tokens_used = 100
+
+        # Generate output based on the tool type
+        if tool.name == "Story Writer Pro":
+            output = {
+                "title": f"A {input_data.get('genre', 'mysterious')} story",
+                "story": (
+                    f"Once upon a time in a {input_data.get('setting', 'distant land')}, "
+                    f"there was a {input_data.get('character_type', 'brave hero')}. "
+                    f"This is a {input_data.get('length', 'short')} {input_data.get('genre', 'story')} "
+                    f"about {input_data.get('theme', 'adventure')}..."
+                )
+            }
+        else:
+            # Default output for other tools
+            output = {
+                "result": f"Processed {tool.name} with input: {json.dumps(input_data)}"
+            }
+
+        return self.build_result(tool, output, tokens_used)
+
+
+class HTTPBackend(BaseModelBackend):
+    """
+    JSON-over-HTTP inference server. Requests go through one keep-alive
+    ``requests.Session`` whose pool holds up to ``max_connections``
+    connections, so calls reuse TCP/TLS connections instead of paying a
+    handshake each time.
+
+    The server receives ``{"model", "input", "max_tokens"}`` and must answer
+    ``{"output": ..., "tokens_used": int}``. With ``"stream": true`` it must
+    answer newline-delimited JSON: ``{"delta": "..."}`` lines followed by
+    the complete answer. Error statuses and answers that don't fit this
+    raise ``BackendUnavailable``, like connection failures.
+    """
+    def __init__(self, url, api_key=None, connect_timeout=None, read_timeout=None,
+                 max_connections=None, **kwargs):
+        # Deferred so workers that never call an HTTP model don't import requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        super().__init__(**kwargs)
+        self.url = url
+        self.connection_errors = (
+            requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError
+        )
+        self.timeout = (
+            settings.TOOLS_MODEL_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+            settings.TOOLS_MODEL_READ_TIMEOUT if read_timeout is None else read_timeout,
+        )
+        # More connections than concurrent calls would never be used
+        max_connections = max_connections or self.max_concurrency
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def _post(self, payload, **kwargs):
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout, **kwargs)
+        except self.connection_errors as e:
+            raise BackendUnavailable(f"Model backend '{self.name}' is unavailable: {e}")
+        if response.status_code >= 400:
+            response.close()
+            raise BackendUnavailable(
+                f"Model backend '{self.name}' failed with HTTP {response.status_code}"
+            )
+        return response
+
+    def _result(self, tool, data):
+        try:
+            return self.build_result(tool, data['output'], int(data['tokens_used']))
+        except (KeyError, TypeError, ValueError) as e:
+            raise BackendUnavailable(f"Model backend '{self.name}' sent an invalid answer: {e!r}")
+
+    def _generate(self, tool, input_data):
+        response = self._post({
+            'model': tool.model_name,
+            'input': input_data,
+            'max_tokens': tool.max_tokens,
+        })
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise BackendUnavailable(f"Model backend '{self.name}' sent an invalid answer: {e}")
+        except self.connection_errors as e:
+            raise BackendUnavailable(f"Model backend '{self.name}' is unavailable: {e}")
+        return self._result(tool, data)
+
+    def _stream(self, tool, input_data):
+        response = self._post({
+            'model': tool.model_name,
+            'input': input_data,
+            'max_tokens': tool.max_tokens,
+            'stream': True,
+        }, stream=True)
+        # Closing the response returns the connection to the pool
+        with response:
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if 'delta' in data:
+                        yield {'delta': data['delta']}
+                    else:
+                        yield {'result': self._result(tool, data)}
+                        return
+            except (TypeError, ValueError) as e:
+                raise BackendUnavailable(f"Model backend '{self.name}' sent an invalid answer: {e}")
+            except self.connection_errors as e:
+                raise BackendUnavailable(f"Model backend '{self.name}' is unavailable: {e}")
+        raise BackendUnavailable(f"Model backend '{self.name}' ended the stream without a result")
+
+    def close(self):
+        self.session.close()
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(model_name):
+    """Return the process-wide backend serving ``model_name``."""
+    # Models without their own entry share the default backend's pool and limit
+    name = model_name if model_name in settings.TOOLS_MODEL_BACKENDS else 'default'
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                config = settings.TOOLS_MODEL_BACKENDS[name]
+                backend = import_string(config['BACKEND'])(name=name, **config.get('OPTIONS', {}))
+                _backends[name] = backend
+    return backend
+
+
+def reset_backends():
+    """Close and forget all backends, e.g. after the configuration changed."""
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for backend in backends:
+        backend.close()
+
+
+async def agenerate(tool, input_data):
+    """Run ``tool`` on its backend from async code."""
+    return await get_backend(tool.model_name).agenerate(tool, input_data)
@@ -0,0 +1,83 @@
+"""
+Cache for the tool catalog (``tool_list``).
+
+Every key includes a global catalog version that is bumped whenever a Tool
+or Category is saved or deleted (see tools/signals.py), so stale entries are
+never read again and simply expire. The version is also passed to the
+template so rendered fragments are keyed the same way.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.pagination import InvalidCursor, KeysetPaginator
+
+from .models import Category, Tool
+
+TOOLS_PER_PAGE = 12
+VERSION_KEY = 'tools:catalog:version'
+
+
+def get_cache():
+    return caches[settings.TOOLS_CATALOG_CACHE_ALIAS]
+
+
+def get_catalog_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so a lost version key can't resurrect old entries
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _key(version, *parts):
+    return ':'.join(['tools:catalog', str(version), *map(str, parts)])
+
+
+def get_categories(version):
+    key = _key(version, 'categories')
+    categories = get_cache().get(key)
+    if categories is None:
+        categories = list(Category.objects.all())
+        get_cache().set(key, categories, settings.TOOLS_CATALOG_CACHE_TIMEOUT)
+    return categories
+
+
+def get_tool_page(version, category_slug, cursor, categories):
+    """
+    Return a ``CursorPage`` of active tools, optionally in one category.
+    Page slices are cached per cursor, so a warm hit runs no queries.
+    """
+    tools = Tool.objects.filter(status='active').select_related('category')
+    if category_slug:
+        tools = tools.filter(category__slug=category_slug)
+    paginator = KeysetPaginator(tools, TOOLS_PER_PAGE, descending=False)
+
+    if cursor:
+        try:
+            paginator.decode_cursor(cursor)
+        except InvalidCursor:
+            cursor = None
+
+    # Only cache known categories so arbitrary query strings can't fill the
+    # cache; cursors are signed, so only positions we handed out get here
+    if category_slug and category_slug not in {category.slug for category in categories}:
+        return paginator.get_page(cursor)
+
+    key = _key(version, 'page', category_slug or '*', cursor or 'first')
+    page = get_cache().get(key)
+    if page is None:
+        page = paginator.get_page(cursor)
+        get_cache().set(key, page, settings.TOOLS_CATALOG_CACHE_TIMEOUT)
+    return page
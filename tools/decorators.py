@@ -1,49 +1,87 @@
 from functools import wraps
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
-from billing.models import Subscription
-from django.utils import timezone
-from django.db import transaction
+from accounts.middleware import UserContext
+from .quota import get_quota_backend
+
+def _subscription_error(subscription):
+    if subscription is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'No active subscription found. Please subscribe to use this feature.'
+        }, status=403)
+
+    # Check if subscription is cancelled
+    if subscription.cancel_at_period_end:
+        return JsonResponse({
+            'success': False,
+            'error': 'Your subscription is scheduled for cancellation. Please reactivate to continue.'
+        }, status=403)
+    return None
+
+def _quota_result(request, quota, amount):
+    if not quota.allowed:
+        return None, JsonResponse({
+            'success': False,
+            'error': 'You have reached your API calls limit for this billing period.',
+            'limit': quota.limit,
+            'usage': quota.usage,
+            'requested': amount
+        }, status=429)  # 429 Too Many Requests
+
+    request.quota = quota
+    return quota, None
+
+def reserve_api_calls(request, amount=1):
+    """
+    Check the user's subscription and reserve ``amount`` API calls.
+    Returns ``(quota, None)`` on success or ``(None, JsonResponse)`` with the error.
+    """
+    # The active subscription was loaded with the user, or for API keys
+    # comes from their cache, which api.signals invalidates when the
+    # subscription or its plan changes (no row lock: the quota engine does
+    # the atomic check-and-increment)
+    subscription = request.user_context.active_subscription
+    error_response = _subscription_error(subscription)
+    if error_response is not None:
+        return None, error_response
+
+    # Count the API calls BEFORE processing the request
+    quota = get_quota_backend().consume(request.user.pk, subscription.plan.api_calls_limit, amount)
+    return _quota_result(request, quota, amount)
+
+async def areserve_api_calls(request, amount=1):
+    """Async version of reserve_api_calls; the subscription comes with ``request.auser()``."""
+    user = await request.auser()
+    subscription = UserContext(user).active_subscription
+    error_response = _subscription_error(subscription)
+    if error_response is not None:
+        return None, error_response
+
+    # The quota backend may touch the database to seed or flush counters
+    quota = await sync_to_async(get_quota_backend().consume)(
+        user.pk, subscription.plan.api_calls_limit, amount
+    )
+    return _quota_result(request, quota, amount)
 
 def check_subscription_limits(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        with transaction.atomic():  # Add transaction to prevent race conditions
-            # Get user's active subscription with select_for_update to lock the row
-            try:
-                subscription = Subscription.objects.select_for_update().get(
-                    user=request.user,
-                    status='active',
-                    start_date__lte=timezone.now(),
-                    end_date__gte=timezone.now()
-                )
-                
-                # Check if subscription is cancelled
-                if subscription.cancel_at_period_end:
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Your subscription is scheduled for cancellation. Please reactivate to continue.'
-                    }, status=403)
-
-                # Get current usage and check against limit
-                current_usage = request.user.userprofile.api_calls_count
-                if current_usage >= subscription.plan.api_calls_limit:
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'You have reached your API calls limit for this billing period.',
-                        'limit': subscription.plan.api_calls_limit,
-                        'usage': current_usage
-                    }, status=429)  # 429 Too Many Requests
-
-                # Increment the API calls count BEFORE processing the request
-                request.user.userprofile.api_calls_count += 1
-                request.user.userprofile.save()
-
-            except Subscription.DoesNotExist:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'No active subscription found. Please subscribe to use this feature.'
-                }, status=403)
-
-            # Only proceed with the view if all checks pass
-            return view_func(request, *args, **kwargs)
+        quota, error_response = reserve_api_calls(request)
+        if error_response is not None:
+            return error_response
+
+        # Only proceed with the view if all checks pass
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+def acheck_subscription_limits(view_func):
+    """check_subscription_limits for async views."""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        quota, error_response = await areserve_api_calls(request)
+        if error_response is not None:
+            return error_response
+
+        return await view_func(request, *args, **kwargs)
     return wrapper
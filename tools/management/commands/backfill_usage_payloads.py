@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from tools.payloads import BATCH_SIZE, backfill_payloads
+
+
+class Command(BaseCommand):
+    help = ('Move ToolUsage input/output data stored inline into the compressed ToolUsagePayload table. '
+            'Safe to re-run: usages already moved are skipped')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Usages moved per transaction')
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{stats.usages} moved ({stats.rate:.0f}/s)')
+
+        stats = backfill_payloads(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved the payloads of {stats.usages} usages '
+            f'in {stats.batches} batches, {stats.seconds:.2f}s ({stats.rate:.0f}/s)'
+        ))
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import APIKey
+from billing.models import Plan, Subscription
+from tools.models import Category, Tool
+
+BENCH_INPUT = {"genre": "mystery", "theme": "friendship"}
+
+
+class Command(BaseCommand):
+    help = ('Load-tests tool processing: the sync view on a WSGI-style thread pool '
+            'against the async view on a single event loop')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests sent to each view')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Worker threads for the sync view (WSGI workers)')
+        parser.add_argument('--concurrency', type=int, default=64,
+                            help='Requests in flight for the async view')
+        parser.add_argument('--latency', type=float, default=0.5,
+                            help='Simulated model latency in seconds')
+
+    def handle(self, *args, **options):
+        user, plan, tool, api_key = self._create_fixtures()
+        headers = {'Authorization': f'Api-Key {api_key.key}'}
+        body = json.dumps(BENCH_INPUT)
+        total = options['requests']
+        try:
+            with override_settings(TOOLS_STUB_LATENCY=options['latency'],
+                                   TOOLS_MODEL_CONCURRENCY=options['concurrency'],
+                                   ACTIVITY_LOG_ASYNC=False):
+                wsgi = self._run_wsgi(
+                    reverse('tools:process', args=[tool.slug]), body, headers,
+                    total, options['threads']
+                )
+                asgi = asyncio.run(self._run_asgi(
+                    reverse('tools:process_async', args=[tool.slug]), body, headers,
+                    total, options['concurrency']
+                ))
+        finally:
+            user.delete()
+            tool.delete()
+            tool.category.delete()
+            plan.delete()
+
+        self.stdout.write(f"{'mode':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for name, (elapsed, latencies, errors) in (('wsgi', wsgi), ('asgi', asgi)):
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+            self.stdout.write(f"{name:<6} {total / elapsed:>8,.1f} {p50:>8.1f} {p95:>8.1f} {errors:>7}")
+
+    def _create_fixtures(self):
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create(username=f'asgi-bench-{suffix}')
+        plan = Plan.objects.create(
+            name='ASGI benchmark',
+            slug=f'asgi-bench-{suffix}',
+            price=0,
+            api_calls_limit=10 ** 9,
+            is_active=False
+        )
+        now = timezone.now()
+        Subscription.objects.create(
+            user=user,
+            plan=plan,
+            status='active',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=30)
+        )
+        category = Category.objects.create(name='ASGI benchmark', slug=f'asgi-bench-{suffix}')
+        tool = Tool.objects.create(
+            name='ASGI benchmark',
+            slug=f'asgi-bench-{suffix}',
+            description='Temporary tool for benchmark_asgi',
+            category=category,
+            model_name='stub',
+            input_format={
+                "type": "object",
+                "properties": {key: {"type": "string"} for key in BENCH_INPUT}
+            },
+            output_format={"type": "object"},
+            cost_per_token='0.000010'
+        )
+        api_key = APIKey.objects.create(user=user, name='benchmark')
+        return user, plan, tool, api_key
+
+    def _run_wsgi(self, path, body, headers, total, threads):
+        def worker(count):
+            client = Client()
+            latencies, errors = [], 0
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = client.post(path, body, content_type='application/json', headers=headers)
+                    latencies.append(time.perf_counter() - start)
+                    errors += response.status_code != 200
+            finally:
+                connections.close_all()
+            return latencies, errors
+
+        shares = [total // threads + (i < total % threads) for i in range(threads)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(worker, shares))
+        elapsed = time.perf_counter() - start
+        return (elapsed, [l for latencies, _ in results for l in latencies],
+                sum(errors for _, errors in results))
+
+    async def _run_asgi(self, path, body, headers, total, concurrency):
+        client = AsyncClient()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with slots:
+                start = time.perf_counter()
+                response = await client.post(path, body, content_type='application/json', headers=headers)
+                return time.perf_counter() - start, response.status_code != 200
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+        return elapsed, [latency for latency, _ in results], sum(error for _, error in results)
@@ -0,0 +1,105 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction, DatabaseError
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from accounts.models import UserProfile
+from billing.models import Plan, Subscription
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the quota engine against the row-locking subscription check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 128],
+                            help='Numbers of concurrent callers to test')
+        parser.add_argument('--calls', type=int, default=50,
+                            help='Calls made by each caller')
+        parser.add_argument('--backend', default=settings.QUOTA_BACKEND,
+                            help='Dotted path of the quota backend to benchmark')
+
+    def handle(self, *args, **options):
+        user, plan = self._create_fixtures()
+        try:
+            self.stdout.write(f"{'callers':>8} {'legacy calls/s':>15} {'errors':>7} "
+                              f"{'engine calls/s':>15} {'errors':>7} {'speedup':>8}")
+            for callers in options['concurrency']:
+                legacy_rate, legacy_errors = self._run(
+                    callers, options['calls'], lambda: self._legacy_check(user.pk)
+                )
+                backend = import_string(options['backend'])()
+                engine_rate, engine_errors = self._run(
+                    callers, options['calls'],
+                    lambda: backend.consume(user.pk, plan.api_calls_limit)
+                )
+                backend.flush()
+                speedup = engine_rate / legacy_rate if legacy_rate else float('inf')
+                self.stdout.write(f"{callers:>8} {legacy_rate:>15,.0f} {legacy_errors:>7} "
+                                  f"{engine_rate:>15,.0f} {engine_errors:>7} {speedup:>7.1f}x")
+        finally:
+            Subscription.objects.filter(user=user).delete()
+            user.delete()
+            plan.delete()
+
+    def _create_fixtures(self):
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create(username=f'quota-bench-{suffix}')
+        plan = Plan.objects.create(
+            name='Quota benchmark',
+            slug=f'quota-bench-{suffix}',
+            price=0,
+            api_calls_limit=10 ** 9,
+            is_active=False
+        )
+        now = timezone.now()
+        Subscription.objects.create(
+            user=user,
+            plan=plan,
+            status='active',
+            start_date=now - timedelta(days=1),
+            end_date=now + timedelta(days=30)
+        )
+        return user, plan
+
+    def _legacy_check(self, user_id):
+        """The previous check_subscription_limits body: lock, read, save."""
+        now = timezone.now()
+        with transaction.atomic():
+            subscription = Subscription.objects.select_for_update().get(
+                user_id=user_id,
+                status='active',
+                start_date__lte=now,
+                end_date__gte=now
+            )
+            profile = UserProfile.objects.get(user_id=user_id)
+            if profile.api_calls_count >= subscription.plan.api_calls_limit:
+                return False
+            profile.api_calls_count += 1
+            profile.save()
+            return True
+
+    def _run(self, callers, calls, check):
+        def caller():
+            errors = 0
+            try:
+                for _ in range(calls):
+                    try:
+                        check()
+                    except DatabaseError:
+                        errors += 1
+            finally:
+                connections.close_all()
+            return errors
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            errors = sum(executor.map(lambda _: caller(), range(callers)))
+        elapsed = time.perf_counter() - start
+        return (callers * calls - errors) / elapsed, errors
@@ -0,0 +1,97 @@
+import json
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tools.models import Tool
+from tools.validators import compile_schema
+
+SAMPLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "genre": {"type": "string", "enum": ["fantasy", "mystery", "sci-fi"]},
+        "length": {"type": "string"},
+        "theme": {"type": "string"},
+        "temperature": {"type": "number"},
+        "max_words": {"type": "integer"},
+        "include_title": {"type": "boolean"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "setting": {
+            "type": "object",
+            "properties": {
+                "place": {"type": "string"},
+                "era": {"type": "string"}
+            }
+        }
+    }
+}
+
+SAMPLE_INPUT = {
+    "genre": "fantasy",
+    "length": "short",
+    "theme": "friendship",
+    "temperature": 0.7,
+    "max_words": 500,
+    "include_title": True,
+    "tags": ["dragons", "quest"],
+    "setting": {"place": "a floating city", "era": "medieval"}
+}
+
+
+def legacy_validate(schema, input_data):
+    """The per-request loop previously inlined in process_ai_request."""
+    if not isinstance(input_data, dict):
+        raise ValueError("Input must be a JSON object")
+
+    if not schema.get('type') == 'object' or 'properties' not in schema:
+        raise ValueError("Invalid schema format")
+
+    properties = schema['properties']
+
+    for field_name, field_spec in properties.items():
+        if field_name in input_data:
+            if field_spec.get('type') == 'string':
+                if not isinstance(input_data[field_name], str):
+                    raise ValueError(f"Field '{field_name}' must be a string")
+
+    required_fields = schema.get('required', list(properties.keys()))
+    missing_fields = [
+        field for field in required_fields
+        if field not in input_data or not input_data[field]
+    ]
+
+    if missing_fields:
+        raise ValueError(f"Missing or empty required fields: {', '.join(missing_fields)}")
+
+
+class Command(BaseCommand):
+    help = 'Compares compiled schema validators with the legacy per-request validation loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tool', help='Slug of a tool whose schema and sample input to use')
+        parser.add_argument('--input', help='Sample input as JSON (with --tool)')
+        parser.add_argument('--number', type=int, default=100000,
+                            help='Validations per measurement')
+
+    def handle(self, *args, **options):
+        schema, input_data = SAMPLE_SCHEMA, SAMPLE_INPUT
+        if options['tool']:
+            try:
+                schema = Tool.objects.get(slug=options['tool']).input_format
+            except Tool.DoesNotExist:
+                raise CommandError(f"Tool '{options['tool']}' does not exist")
+            if not options['input']:
+                raise CommandError('--input is required with --tool')
+            input_data = json.loads(options['input'])
+
+        number = options['number']
+        validate = compile_schema(schema)
+
+        legacy = min(timeit.repeat(lambda: legacy_validate(schema, input_data), number=number, repeat=5))
+        compiled = min(timeit.repeat(lambda: validate(input_data), number=number, repeat=5))
+        compile_cost = min(timeit.repeat(lambda: compile_schema(schema), number=1000, repeat=5)) / 1000
+
+        self.stdout.write(f"legacy loop:        {legacy / number * 1e6:8.2f} us/validation (string checks only)")
+        self.stdout.write(f"compiled validator: {compiled / number * 1e6:8.2f} us/validation (all types)")
+        self.stdout.write(f"one-off compile:    {compile_cost * 1e6:8.2f} us/schema")
+        self.stdout.write(self.style.SUCCESS(f"speedup: {legacy / compiled:.2f}x"))
@@ -0,0 +1,121 @@
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker does before it can serve its first request: set Django up,
+# build the WSGI handler (which loads the middleware) and load the URLconf
+STARTUP_SCRIPT = (
+    "from django.core.wsgi import get_wsgi_application\n"
+    "get_wsgi_application()\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+)
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+@dataclass
+class ImportNode:
+    name: str
+    self_us: int
+    cumulative_us: int
+    children: list = field(default_factory=list)
+
+    @property
+    def package(self):
+        return self.name.split('.')[0]
+
+
+@dataclass
+class StartupProfile:
+    roots: list
+    modules: dict
+
+    @property
+    def total_ms(self):
+        return sum(node.cumulative_us for node in self.roots) / 1000
+
+    def packages(self):
+        """
+        ``{package: (self_ms, cumulative_ms)}``. A package's cumulative time
+        includes whatever it was first to import, so these overlap.
+        """
+        own, cumulative = defaultdict(int), defaultdict(int)
+        stack = [(node, None) for node in self.roots]
+        while stack:
+            node, parent_package = stack.pop()
+            own[node.package] += node.self_us
+            if node.package != parent_package:
+                cumulative[node.package] += node.cumulative_us
+            stack.extend((child, node.package) for child in node.children)
+        return {package: (own[package] / 1000, cumulative[package] / 1000) for package in own}
+
+
+def parse_importtime(output):
+    """Build the import tree from ``python -X importtime`` output."""
+    # Modules are reported after everything they imported, indented by depth
+    pending = defaultdict(list)
+    modules = {}
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = len(indent) // 2
+        node = ImportNode(name, int(self_us), int(cumulative_us), pending.pop(depth + 1, []))
+        pending[depth].append(node)
+        modules[name] = node
+    return StartupProfile(roots=pending[0], modules=modules)
+
+
+def measure_startup():
+    """Import the project in a fresh interpreter and profile it."""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings')}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise CommandError(f"Project failed to start:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def project_packages():
+    return {
+        app.split('.')[0] for app in settings.INSTALLED_APPS
+        if (Path(settings.BASE_DIR) / app.split('.')[0]).is_dir()
+    } | {settings.ROOT_URLCONF.split('.')[0]}
+
+
+class Command(BaseCommand):
+    help = 'Reports the import cost of starting a worker, per package'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Number of packages to list')
+        parser.add_argument('--budget', type=float, default=settings.STARTUP_IMPORT_BUDGET_MS,
+                            help='Fail if startup imports take longer than this (ms)')
+
+    def handle(self, *args, **options):
+        profile = measure_startup()
+        ours = project_packages()
+        packages = sorted(profile.packages().items(), key=lambda item: item[1][1], reverse=True)
+
+        self.stdout.write(f"{'package':<28} {'self ms':>9} {'cumulative ms':>14}")
+        for package, (own, cumulative) in packages[:options['limit']]:
+            label = f"{package} (project)" if package in ours else package
+            self.stdout.write(f"{label:<28} {own:>9.1f} {cumulative:>14.1f}")
+        self.stdout.write(f"\n{len(profile.modules)} modules imported in {profile.total_ms:.1f} ms "
+                          f"(budget {options['budget']:.0f} ms)")
+
+        if profile.total_ms > options['budget']:
+            raise CommandError(
+                f"Startup imports took {profile.total_ms:.1f} ms, over the {options['budget']:.0f} ms budget"
+            )
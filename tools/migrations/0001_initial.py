@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('icon', models.CharField(help_text='Font Awesome icon class', max_length=50)),
+            ],
+            options={
+                'verbose_name_plural': 'Categories',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('slug', models.SlugField(unique=True)),
+                ('description', models.TextField()),
+                ('icon', models.ImageField(blank=True, upload_to='tool_icons/')),
+                ('model_name', models.CharField(max_length=100)),
+                ('input_format', models.JSONField(help_text='JSON schema for input format')),
+                ('output_format', models.JSONField(help_text='JSON schema for output format')),
+                ('max_tokens', models.IntegerField(default=2048)),
+                ('cost_per_token', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('maintenance', 'Maintenance'), ('deprecated', 'Deprecated')], default='active', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tools', to='tools.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ToolUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('input_data', models.JSONField()),
+                ('output_data', models.JSONField()),
+                ('tokens_used', models.IntegerField()),
+                ('cost', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('success', models.BooleanField(default=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('tool', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tools.tool')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tools', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='toolusage',
+            index=models.Index(fields=['user', '-created_at'], name='usage_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='toolusage',
+            index=models.Index(fields=['user', 'tool', '-created_at'], name='usage_user_tool_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tools', '0002_toolusage_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tool',
+            name='cache_enabled',
+            field=models.BooleanField(default=False, help_text='Reuse results for identical input (only for deterministic tools)'),
+        ),
+        migrations.AddField(
+            model_name='tool',
+            name='cache_ttl',
+            field=models.PositiveIntegerField(default=3600, help_text='Seconds a cached result is reused'),
+        ),
+        migrations.AddField(
+            model_name='toolusage',
+            name='cache_hit',
+            field=models.BooleanField(default=False, help_text='Served from the result cache'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:06
+
+import core.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tools', '0003_tool_result_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ToolUsagePayload',
+            fields=[
+                ('usage', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='payload', serialize=False, to='tools.toolusage')),
+                ('input_data', core.fields.CompressedJSONField()),
+                ('output_data', core.fields.CompressedJSONField()),
+            ],
+        ),
+        # Keep the columns (now nullable) until backfill_usage_payloads has
+        # moved their contents into ToolUsagePayload
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name='toolusage',
+                    name='input_data',
+                    field=models.JSONField(null=True),
+                ),
+                migrations.AlterField(
+                    model_name='toolusage',
+                    name='output_data',
+                    field=models.JSONField(null=True),
+                ),
+            ],
+            state_operations=[
+                migrations.RenameField(
+                    model_name='toolusage',
+                    old_name='input_data',
+                    new_name='legacy_input_data',
+                ),
+                migrations.RenameField(
+                    model_name='toolusage',
+                    old_name='output_data',
+                    new_name='legacy_output_data',
+                ),
+                migrations.AlterField(
+                    model_name='toolusage',
+                    name='legacy_input_data',
+                    field=models.JSONField(db_column='input_data', editable=False, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='toolusage',
+                    name='legacy_output_data',
+                    field=models.JSONField(db_column='output_data', editable=False, null=True),
+                ),
+            ],
+        ),
+    ]
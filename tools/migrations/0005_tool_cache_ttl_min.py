@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:24
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tools', '0004_toolusage_payload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tool',
+            name='cache_ttl',
+            field=models.PositiveIntegerField(default=3600, help_text='Seconds a cached result is reused', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
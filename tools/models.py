@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.validators import MinValueValidator
+
+from core.fields import CompressedJSONField
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -31,25 +35,121 @@ class Tool(models.Model):
     max_tokens = models.IntegerField(default=2048)
     cost_per_token = models.DecimalField(max_digits=10, decimal_places=6)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    cache_enabled = models.BooleanField(
+        default=False,
+        help_text="Reuse results for identical input (only for deterministic tools)"
+    )
+    cache_ttl = models.PositiveIntegerField(
+        default=3600, validators=[MinValueValidator(1)],
+        help_text="Seconds a cached result is reused"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+# ToolUsage columns that hot queries (lists, aggregates, admin) need
+USAGE_METADATA_FIELDS = (
+    'id', 'user', 'tool', 'tokens_used', 'cost', 'created_at', 'success', 'error_message', 'cache_hit',
+)
+
+class ToolUsageQuerySet(models.QuerySet):
+    def metadata(self):
+        """Load only the metadata columns, leaving the legacy inline payload columns unread."""
+        return self.only(*USAGE_METADATA_FIELDS)
+
+class ToolUsageManager(models.Manager.from_queryset(ToolUsageQuerySet)):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Insert the usages, then their payloads with one more INSERT."""
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            payloads = []
+            for usage in objs:
+                if usage._payload_changed:
+                    usage._payload.usage = usage
+                    payloads.append(usage._payload)
+                    usage._payload_changed = False
+            ToolUsagePayload.objects.using(self.db).bulk_create(payloads)
+        return objs
+
+def payload_property(name):
+    """A ToolUsage attribute kept in its ToolUsagePayload, loaded on first access."""
+    def getter(self):
+        payload = self._get_payload()
+        if payload is None:
+            # Not yet moved by backfill_usage_payloads
+            return getattr(self, f'legacy_{name}')
+        return getattr(payload, name)
+
+    def setter(self, value):
+        payload = self._get_payload()
+        if payload is None:
+            payload = self._payload = ToolUsagePayload(
+                input_data=self.legacy_input_data, output_data=self.legacy_output_data
+            )
+        setattr(payload, name, value)
+        self._payload_changed = True
+
+    return property(getter, setter)
+
 class ToolUsage(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     tool = models.ForeignKey(Tool, on_delete=models.CASCADE)
-    input_data = models.JSONField()
-    output_data = models.JSONField()
     tokens_used = models.IntegerField()
     cost = models.DecimalField(max_digits=10, decimal_places=6)
     created_at = models.DateTimeField(auto_now_add=True)
     success = models.BooleanField(default=True)
     error_message = models.TextField(blank=True)
+    cache_hit = models.BooleanField(default=False, help_text="Served from the result cache")
+    # Inline payload of rows created before ToolUsagePayload; emptied by backfill_usage_payloads
+    legacy_input_data = models.JSONField(null=True, editable=False, db_column='input_data')
+    legacy_output_data = models.JSONField(null=True, editable=False, db_column='output_data')
+
+    objects = ToolUsageManager()
+
+    # Stored compressed in ToolUsagePayload
+    input_data = payload_property('input_data')
+    output_data = payload_property('output_data')
+
+    _payload = None
+    _payload_changed = False
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-user history and date-range filters (dashboard, exports)
+            models.Index(fields=['user', '-created_at'], name='usage_user_created_idx'),
+            # Recent usage of one tool by one user (tool_detail)
+            models.Index(fields=['user', 'tool', '-created_at'], name='usage_user_tool_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.tool.name} - {self.created_at}"
+
+    def _get_payload(self):
+        if self._payload is None and self.pk is not None:
+            try:
+                self._payload = self.payload
+            except ObjectDoesNotExist:
+                pass
+        return self._payload
+
+    def save(self, *args, **kwargs):
+        if not self._payload_changed:
+            return super().save(*args, **kwargs)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+            self._payload.usage = self
+            self._payload.save(using=kwargs.get('using'), force_insert=self._payload._state.adding)
+        self._payload_changed = False
+
+class ToolUsagePayload(models.Model):
+    """A usage's input and output, compressed and kept out of the ToolUsage rows."""
+    usage = models.OneToOneField(ToolUsage, on_delete=models.CASCADE, primary_key=True, related_name='payload')
+    input_data = CompressedJSONField()
+    output_data = CompressedJSONField()
+
+    def __str__(self):
+        return f"Payload of usage {self.usage_id}"
@@ -0,0 +1,69 @@
+"""
+Backfill of ``ToolUsagePayload`` for usages recorded while ``input_data``
+and ``output_data`` were stored inline on ``ToolUsage``.
+
+Usages that still have inline data are walked in primary-key batches. Each
+batch inserts the compressed payloads and empties the inline columns in one
+transaction, so an interrupted run continues where it stopped and a repeated
+run does nothing. Payloads already written for a usage are kept.
+"""
+import time
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ToolUsage, ToolUsagePayload
+
+BATCH_SIZE = 1000
+
+
+@dataclass
+class BackfillStats:
+    usages: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self):
+        return self.usages / self.seconds if self.seconds else 0.0
+
+
+def inline_usages():
+    return ToolUsage.objects.filter(
+        Q(legacy_input_data__isnull=False) | Q(legacy_output_data__isnull=False)
+    )
+
+
+def backfill_payloads(batch_size=BATCH_SIZE, progress=None):
+    """
+    Move every inline payload to ``ToolUsagePayload`` and return
+    ``BackfillStats``. ``progress`` is called with the running stats after
+    each batch.
+    """
+    pending = inline_usages().order_by('pk')
+    stats = BackfillStats()
+    started = time.perf_counter()
+    last_pk = 0
+    while True:
+        batch = list(
+            pending.filter(pk__gt=last_pk)
+            .values_list('pk', 'legacy_input_data', 'legacy_output_data')[:batch_size]
+        )
+        if not batch:
+            break
+        pks = [pk for pk, _, _ in batch]
+        with transaction.atomic(savepoint=False):
+            ToolUsagePayload.objects.bulk_create([
+                ToolUsagePayload(usage_id=pk, input_data=input_data, output_data=output_data)
+                for pk, input_data, output_data in batch
+            ], ignore_conflicts=True)
+            ToolUsage.objects.filter(pk__in=pks).update(legacy_input_data=None, legacy_output_data=None)
+        last_pk = pks[-1]
+        stats.usages += len(batch)
+        stats.batches += 1
+        stats.seconds = time.perf_counter() - started
+        if progress is not None:
+            progress(stats)
+    stats.seconds = time.perf_counter() - started
+    return stats
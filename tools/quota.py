@@ -0,0 +1,309 @@
+"""
+Quota engine for per-user API call limits.
+
+A backend performs an atomic check-and-increment of the user's calls
+against the plan limit without holding a row lock. ``DatabaseQuotaBackend``
+(the default) does it with one conditional ``UPDATE`` of
+``UserProfile.api_calls_count`` and is exact across any number of workers.
+The other backends keep counters in memory or in a cache and periodically
+write the consumed calls back to the profile, trading a bounded overshoot
+of the limit for fewer writes.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+
+from accounts.models import UserProfile
+from core.db import database_changed, database_name
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QuotaResult:
+    allowed: bool
+    usage: int
+    limit: int
+
+    @property
+    def remaining(self):
+        return max(self.limit - self.usage, 0)
+
+
+def consume_stored(user_id, limit, amount=1):
+    """Check-and-increment ``UserProfile.api_calls_count`` in a single UPDATE."""
+    profiles = UserProfile.objects.filter(user_id=user_id)
+    allowed = profiles.filter(api_calls_count__lte=limit - amount).update(
+        api_calls_count=F('api_calls_count') + amount
+    )
+    usage = profiles.values_list('api_calls_count', flat=True).first() or 0
+    return QuotaResult(bool(allowed), usage, limit)
+
+
+def release_stored(user_id, amount):
+    """Take ``amount`` calls off ``UserProfile.api_calls_count`` (not below zero)."""
+    UserProfile.objects.filter(user_id=user_id).update(
+        api_calls_count=Greatest(F('api_calls_count') - amount, 0)
+    )
+
+
+class BaseQuotaBackend:
+    """
+    Common write-back logic. Subclasses implement ``_consume``, ``_forget``
+    and keep the counter themselves.
+    """
+    def __init__(self, flush_interval=None, flush_threshold=None):
+        self.flush_interval = (
+            settings.QUOTA_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+        self.flush_threshold = (
+            settings.QUOTA_FLUSH_THRESHOLD if flush_threshold is None else flush_threshold
+        )
+        self._pending = defaultdict(int)
+        self._pending_total = 0
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._database = database_name()
+
+    def consume(self, user_id, limit, amount=1):
+        """Atomically check ``amount`` calls against ``limit`` and count them if allowed."""
+        result = self._consume(user_id, limit, amount)
+        if result.allowed:
+            self._record(user_id, amount)
+        return result
+
+    def release(self, user_id, amount=1):
+        """Give back ``amount`` consumed calls that were not used, e.g. failed batch items."""
+        with self._pending_lock:
+            unflushed = min(self._pending.get(user_id, 0), amount)
+            if unflushed:
+                self._pending[user_id] -= unflushed
+                self._pending_total -= unflushed
+                if not self._pending[user_id]:
+                    del self._pending[user_id]
+        if amount > unflushed:
+            release_stored(user_id, amount - unflushed)
+        self._release(user_id, amount)
+
+    def reset(self, user_id):
+        """Forget the counter and any unflushed calls, e.g. at a new billing period."""
+        self.reset_many([user_id])
+
+    def reset_many(self, user_ids):
+        with self._pending_lock:
+            for user_id in user_ids:
+                self._pending_total -= self._pending.pop(user_id, 0)
+        self._forget(user_ids)
+
+    def flush(self):
+        """Write the calls consumed since the last flush back to the database."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        # Group users by delta so most flushes are a handful of UPDATEs
+        by_amount = defaultdict(list)
+        for user_id, amount in pending.items():
+            by_amount[amount].append(user_id)
+        try:
+            for amount, user_ids in by_amount.items():
+                UserProfile.objects.filter(user_id__in=user_ids).update(
+                    api_calls_count=F('api_calls_count') + amount
+                )
+        except DatabaseError:
+            # Keep the calls so the next flush retries them
+            with self._pending_lock:
+                for user_id, amount in pending.items():
+                    self._pending[user_id] += amount
+                    self._pending_total += amount
+            raise
+
+    def close(self):
+        """Final flush at shutdown; failures are logged rather than raised."""
+        if database_changed(self._database):
+            return
+        try:
+            self.flush()
+        except DatabaseError as e:
+            logger.warning("Could not write back pending API call counts: %s", e)
+
+    def _record(self, user_id, amount):
+        with self._pending_lock:
+            self._pending[user_id] += amount
+            self._pending_total += amount
+            due = (
+                self._pending_total >= self.flush_threshold
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def _load_usage(self, user_id):
+        """Current usage: the stored count plus calls not yet flushed by this process."""
+        stored = UserProfile.objects.filter(user_id=user_id).values_list(
+            'api_calls_count', flat=True
+        ).first() or 0
+        with self._pending_lock:
+            return stored + self._pending.get(user_id, 0)
+
+    def _consume(self, user_id, limit, amount):
+        raise NotImplementedError
+
+    def _release(self, user_id, amount):
+        raise NotImplementedError
+
+    def _forget(self, user_ids):
+        raise NotImplementedError
+
+
+class DatabaseQuotaBackend(BaseQuotaBackend):
+    """
+    Counts every call straight in ``UserProfile.api_calls_count``; the limit
+    is enforced exactly however many workers there are.
+    """
+    def consume(self, user_id, limit, amount=1):
+        return consume_stored(user_id, limit, amount)
+
+    def _release(self, user_id, amount):
+        # The stored count is the only counter
+        pass
+
+    def _forget(self, user_ids):
+        pass
+
+
+class LocalMemoryQuotaBackend(BaseQuotaBackend):
+    """
+    Per-process counters. Counters are re-read from the database every
+    ``sync_interval`` seconds so that several workers (and resets made by
+    other processes) converge on the stored count.
+
+    A worker only sees the stored count plus its own calls, so N workers
+    can together let a user go past the limit. To bound this, a user's
+    counter is re-read after each flush of their calls, and once a user is
+    within ``near_limit`` calls of the limit every call is checked against
+    the stored count instead (``consume_stored``). The overshoot is then
+    limited to the calls other workers made for the user since this
+    worker's last flush, i.e. roughly ``flush_threshold`` calls or
+    ``flush_interval`` seconds of traffic per worker.
+    """
+    def __init__(self, sync_interval=None, near_limit=None, **kwargs):
+        super().__init__(**kwargs)
+        self.sync_interval = (
+            settings.QUOTA_SYNC_INTERVAL if sync_interval is None else sync_interval
+        )
+        self.near_limit = settings.QUOTA_NEAR_LIMIT if near_limit is None else near_limit
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def consume(self, user_id, limit, amount=1):
+        result = self._consume(user_id, limit, amount)
+        if result is not None:
+            if result.allowed:
+                self._record(user_id, amount)
+            return result
+
+        self.flush()
+        result = consume_stored(user_id, limit, amount)
+        with self._lock:
+            self._counters[user_id] = [result.usage, time.monotonic()]
+        return result
+
+    def flush(self):
+        with self._pending_lock:
+            user_ids = list(self._pending)
+        super().flush()
+        # Their stored counts now include the calls other workers have flushed
+        self._forget(user_ids)
+
+    def _consume(self, user_id, limit, amount):
+        """Count the calls in memory, or return None when near the limit."""
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._counters.get(user_id)
+                if entry is not None and now - entry[1] < self.sync_interval:
+                    if entry[0] + amount > limit - self.near_limit:
+                        return None
+                    entry[0] += amount
+                    return QuotaResult(True, entry[0], limit)
+
+            # Load outside the lock so a slow query doesn't block other users
+            usage = self._load_usage(user_id)
+            with self._lock:
+                if self._counters.get(user_id) is entry:
+                    self._counters[user_id] = [usage, now]
+
+    def _release(self, user_id, amount):
+        with self._lock:
+            entry = self._counters.get(user_id)
+            if entry is not None:
+                entry[0] = max(entry[0] - amount, 0)
+
+    def _forget(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._counters.pop(user_id, None)
+
+
+class CacheQuotaBackend(BaseQuotaBackend):
+    """
+    Counters shared through a Django cache. Use an alias backed by Redis or
+    memcached so that ``incr`` is atomic across workers: with a per-process
+    cache such as LocMemCache this behaves like ``LocalMemoryQuotaBackend``
+    without its near-limit check.
+    """
+    def __init__(self, alias=None, key_prefix='quota', timeout=None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = caches[alias or settings.QUOTA_CACHE_ALIAS]
+        self.key_prefix = key_prefix
+        self.timeout = settings.QUOTA_SYNC_INTERVAL if timeout is None else timeout
+
+    def _key(self, user_id):
+        return f'{self.key_prefix}:{user_id}'
+
+    def _consume(self, user_id, limit, amount):
+        key = self._key(user_id)
+        try:
+            usage = self.cache.incr(key, amount)
+        except ValueError:
+            # Not cached yet (or expired): seed from the database
+            self.cache.add(key, self._load_usage(user_id), self.timeout)
+            usage = self.cache.incr(key, amount)
+
+        if usage > limit:
+            self.cache.decr(key, amount)
+            return QuotaResult(False, usage - amount, limit)
+        return QuotaResult(True, usage, limit)
+
+    def _release(self, user_id, amount):
+        try:
+            self.cache.decr(self._key(user_id), amount)
+        except ValueError:
+            # Expired: it is re-seeded from the database
+            pass
+
+    def _forget(self, user_ids):
+        self.cache.delete_many([self._key(user_id) for user_id in user_ids])
+
+
+@lru_cache(maxsize=None)
+def get_quota_backend():
+    """Return the process-wide quota backend configured by ``QUOTA_BACKEND``."""
+    backend = import_string(settings.QUOTA_BACKEND)()
+    atexit.register(backend.close)
+    return backend
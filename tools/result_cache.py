@@ -0,0 +1,72 @@
+"""
+Result cache for tools with ``Tool.cache_enabled``.
+
+Results are keyed by tool id, the tool's ``updated_at`` (so editing a tool
+retires its old entries) and a SHA-256 of the canonical input JSON. Lookups
+hit an in-process LRU first and then, if ``TOOLS_RESULT_CACHE_ALIAS`` names
+a Django cache, that shared tier. Entries live for ``Tool.cache_ttl`` seconds;
+a ``cache_ttl`` of 0 stores nothing.
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.caching import LRUCache
+
+
+def make_key(tool, input_data):
+    canonical = json.dumps(input_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    return f'tool-result:{tool.pk}:{tool.updated_at.timestamp():.6f}:{digest}'
+
+
+class ResultCache:
+    def __init__(self, maxsize=None, alias=None):
+        self.local = LRUCache(maxsize=maxsize or settings.TOOLS_RESULT_CACHE_SIZE)
+        self.shared = caches[alias] if alias else None
+
+    def get(self, tool, input_data):
+        key = make_key(tool, input_data)
+        result = self.local.get(key)
+        if result is None and self.shared is not None:
+            result = self.shared.get(key)
+            if result is not None:
+                self.local.set(key, result, tool.cache_ttl)
+        return result
+
+    def set(self, tool, input_data, result):
+        if not tool.cache_ttl:
+            return
+        key = make_key(tool, input_data)
+        self.local.set(key, result, tool.cache_ttl)
+        if self.shared is not None:
+            self.shared.set(key, result, tool.cache_ttl)
+
+    async def aget(self, tool, input_data):
+        key = make_key(tool, input_data)
+        result = self.local.get(key)
+        if result is None and self.shared is not None:
+            result = await self.shared.aget(key)
+            if result is not None:
+                self.local.set(key, result, tool.cache_ttl)
+        return result
+
+    async def aset(self, tool, input_data, result):
+        if not tool.cache_ttl:
+            return
+        key = make_key(tool, input_data)
+        self.local.set(key, result, tool.cache_ttl)
+        if self.shared is not None:
+            await self.shared.aset(key, result, tool.cache_ttl)
+
+    def clear(self):
+        """Empty the in-process tier (the shared tier expires on its own)."""
+        self.local.clear()
+
+
+@lru_cache(maxsize=None)
+def get_result_cache():
+    return ResultCache(alias=settings.TOOLS_RESULT_CACHE_ALIAS)
@@ -0,0 +1,27 @@
+from django.core.signals import setting_changed
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .backends import reset_backends
+from .catalog import bump_catalog_version
+from .models import Category, Tool
+from .validators import invalidate_validator
+
+@receiver(post_save, sender=Tool)
+@receiver(post_delete, sender=Tool)
+def invalidate_tool_validator(sender, instance, **kwargs):
+    """Recompile the input validator the next time the tool is used."""
+    invalidate_validator(instance.pk)
+
+@receiver(post_save, sender=Tool)
+@receiver(post_delete, sender=Tool)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    """Retire every cached catalog page and fragment."""
+    bump_catalog_version()
+
+@receiver(setting_changed)
+def reset_model_backends(sender, setting, **kwargs):
+    """Rebuild backends when their configuration changes (e.g. override_settings)."""
+    if setting.startswith('TOOLS_MODEL_') or setting == 'TOOLS_STUB_LATENCY':
+        reset_backends()
@@ -0,0 +1,18 @@
+"""
+Server-sent events for streamed tool output.
+"""
+import json
+
+EVENT_STREAM = 'text/event-stream'
+
+
+def wants_event_stream(request):
+    """True for ``Accept: text/event-stream`` or ``?stream=1``."""
+    if request.GET.get('stream') in ('1', 'true'):
+        return True
+    return EVENT_STREAM in request.headers.get('Accept', '')
+
+
+def sse_event(event, data):
+    """Encode one event; ``data`` is sent as JSON on a single line."""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
@@ -1,3 +1,834 @@
-from django.test import TestCase
+import io
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from billing.models import Plan, Subscription
+from dashboard.models import UsageDailyRollup, UserActivity
+from .backends import BackendUnavailable, HTTPBackend, StubBackend, get_backend
+from .management.commands.startup_profile import measure_startup, parse_importtime
+from .models import Category, Tool, ToolUsage, ToolUsagePayload
+from .quota import CacheQuotaBackend, DatabaseQuotaBackend, LocalMemoryQuotaBackend
+from .result_cache import get_result_cache
+from .validators import compile_schema
+
+
+class QueryPlanMixin:
+    """Assertions on the database's query plan for a queryset."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always get a sequential scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        elif connection.vendor != 'sqlite':
+            self.skipTest(f'No query plan assertions for {connection.vendor}')
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f'Expected {index_name} in query plan:\n{plan}')
+
+
+def create_tool(name='Story Writer Pro', **kwargs):
+    category, _ = Category.objects.get_or_create(
+        slug='text-generation',
+        defaults={'name': 'Text Generation', 'icon': 'fa-pen'}
+    )
+    defaults = {
+        'slug': name.lower().replace(' ', '-'),
+        'description': 'Generates stories',
+        'category': category,
+        'model_name': 'gpt-4',
+        'input_format': {
+            'type': 'object',
+            'properties': {'genre': {'type': 'string'}, 'theme': {'type': 'string'}}
+        },
+        'output_format': {'type': 'object', 'properties': {'story': {'type': 'string'}}},
+        'cost_per_token': Decimal('0.000015'),
+    }
+    defaults.update(kwargs)
+    return Tool.objects.create(name=name, **defaults)
+
+
+def subscribe(user, api_calls_limit=10):
+    plan = Plan.objects.create(
+        name='Basic', slug=f'basic-{user.pk}', price=0, api_calls_limit=api_calls_limit
+    )
+    now = timezone.now()
+    return Subscription.objects.create(
+        user=user, plan=plan, status='active',
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=30)
+    )
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class ToolUsageIndexTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='secret')
+        cls.tool = create_tool()
+        ToolUsage.objects.bulk_create([
+            ToolUsage(
+                user=cls.user, tool=cls.tool, input_data={}, output_data={},
+                tokens_used=100, cost=Decimal('0.0015')
+            )
+            for _ in range(20)
+        ])
+
+    def test_recent_usage_for_tool_uses_index(self):
+        queryset = ToolUsage.objects.filter(
+            user=self.user, tool=self.tool
+        ).order_by('-created_at')[:5]
+        self.assertUsesIndex(queryset, 'usage_user_tool_created_idx')
+
+    def test_usage_date_range_uses_index(self):
+        end = timezone.now()
+        queryset = ToolUsage.objects.filter(
+            user=self.user, created_at__range=[end - timedelta(days=30), end]
+        )
+        self.assertUsesIndex(queryset, 'usage_user_created_idx')
+
+    def test_tool_detail_not_modified(self):
+        self.client.force_login(self.user)
+        url = reverse('tools:detail', args=[self.tool.slug])
+        etag = self.client.get(url)['ETag']
+        # session, user, tool, latest usage, activity insert; nothing rendered
+        with self.assertNumQueries(5):
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        # The view is logged even though the page came from the browser's cache
+        self.assertEqual(
+            UserActivity.objects.filter(user=self.user, activity_type='tool_view').count(), 2
+        )
+
+        # New usage is listed on the page, so the ETag changes
+        ToolUsage.objects.create(
+            user=self.user, tool=self.tool, input_data={}, output_data={},
+            tokens_used=100, cost=Decimal('0.0015')
+        )
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_process_tool_query_count(self):
+        subscribe(self.user)
+        self.client.force_login(self.user)
+        url = reverse('tools:process', args=[self.tool.slug])
+        payload = json.dumps({'genre': 'fantasy', 'theme': 'dragons'})
+        # Warm the quota counter
+        self.client.post(url, payload, content_type='application/json')
+        # session, user with profile/subscription/plan, tool, quota update and
+        # read-back, then the usage and payload inserts and rollup update
+        # inside a savepoint
+        with self.assertNumQueries(10):
+            response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_tool_detail_query_count(self):
+        self.client.force_login(self.user)
+        url = reverse('tools:detail', args=[self.tool.slug])
+        # session, user, tool, latest usage (ETag), activity insert, recent usage
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class AsyncProcessToolTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bob', password='secret')
+        cls.tool = create_tool()
+        cls.url = reverse('tools:process_async', args=[cls.tool.slug])
+
+    async def test_process_async_records_usage(self):
+        await self.async_client.aforce_login(self.user)
+        await sync_to_async(subscribe)(self.user)
+        response = await self.async_client.post(
+            self.url, {'genre': 'mystery', 'theme': 'friendship'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['usage']['tokens'], 100)
+        self.assertEqual(await ToolUsage.objects.filter(user=self.user).acount(), 1)
+
+    async def test_process_async_requires_subscription(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            self.url, {'genre': 'mystery', 'theme': 'friendship'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class ModelBackendTests(TestCase):
+    @override_settings(TOOLS_MODEL_BACKENDS={
+        'default': {'BACKEND': 'tools.backends.StubBackend'},
+        'slow-model': {'BACKEND': 'tools.backends.StubBackend', 'OPTIONS': {'max_concurrency': 2}},
+    })
+    def test_backends_are_shared_per_configuration(self):
+        self.assertIs(get_backend('gpt-4'), get_backend('claude'))
+        self.assertIs(get_backend('gpt-4'), get_backend('default'))
+        slow = get_backend('slow-model')
+        self.assertIsNot(slow, get_backend('default'))
+        self.assertEqual(slow.max_concurrency, 2)
+
+    def test_saturated_backend_is_unavailable(self):
+        backend = StubBackend(max_concurrency=1, queue_timeout=0)
+        backend._slots.acquire()
+        with self.assertRaises(BackendUnavailable):
+            backend.generate(create_tool(), {'genre': 'mystery', 'theme': 'friendship'})
+
+
+class FakeModelServer(ThreadingHTTPServer):
+    """
+    Local inference server for ``HTTPBackend``. ``responses`` is a list of
+    ``(status, body)`` answers served in order; a ``bytes`` body is sent as
+    is, anything else as JSON.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeModelHandler)
+        self.responses = []
+        self.requests = []
+        self.connections = set()
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1/generate'
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.server.requests.append(json.loads(self.rfile.read(length)))
+        self.server.connections.add(self.client_address)
+        status, body = (
+            self.server.responses.pop(0) if self.server.responses
+            else (200, {'output': {'result': 'ok'}, 'tokens_used': 7})
+        )
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('heidi', password='secret')
+        subscribe(cls.user)
+        cls.tool = create_tool()
+
+    def setUp(self):
+        self.server = FakeModelServer()
+        self.addCleanup(self.server.stop)
+        self.backend = HTTPBackend(url=self.server.url, max_concurrency=2, queue_timeout=0)
+        self.addCleanup(self.backend.close)
+        self.input = {'genre': 'mystery', 'theme': 'friendship'}
+
+    def test_generate_reuses_one_connection(self):
+        for _ in range(3):
+            result = self.backend.generate(self.tool, self.input)
+        self.assertEqual(result['output'], {'result': 'ok'})
+        self.assertEqual(result['tokens_used'], 7)
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.server.requests[0]['input'], self.input)
+
+    def test_bad_answers_are_unavailable(self):
+        self.server.responses = [
+            (502, {'error': 'upstream'}),
+            (200, b'not json'),
+            (200, {'output': {'result': 'ok'}}),
+        ]
+        for _ in range(3):
+            with self.assertRaises(BackendUnavailable):
+                self.backend.generate(self.tool, self.input)
+
+    def test_stream_yields_deltas_then_result(self):
+        lines = [{'delta': 'Once'}, {'delta': ' upon'}, {'output': {'story': 'Once upon'}, 'tokens_used': 2}]
+        self.server.responses = [(200, b'\n'.join(json.dumps(line).encode() for line in lines))]
+        events = list(self.backend.stream(self.tool, self.input))
+        self.assertEqual([event['delta'] for event in events[:-1]], ['Once', ' upon'])
+        self.assertEqual(events[-1]['result']['tokens_used'], 2)
+        self.assertTrue(self.server.requests[0]['stream'])
+
+    async def test_sync_and_async_calls_share_the_limit(self):
+        self.backend._slots.acquire()
+        self.backend._slots.acquire()
+        with self.assertRaises(BackendUnavailable):
+            await self.backend.agenerate(self.tool, self.input)
+        self.backend._slots.release()
+        result = await self.backend.agenerate(self.tool, self.input)
+        self.assertEqual(result['tokens_used'], 7)
+
+    def test_upstream_error_is_a_503(self):
+        self.server.responses = [(500, {'error': 'down'})]
+        backends = {'default': {'BACKEND': 'tools.backends.HTTPBackend', 'OPTIONS': {'url': self.server.url}}}
+        self.client.force_login(self.user)
+        with override_settings(TOOLS_MODEL_BACKENDS=backends):
+            response = self.client.post(
+                reverse('tools:process', args=[self.tool.slug]), self.input,
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(ToolUsage.objects.filter(user=self.user).exists())
+
+
+class ResultCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('carol', password='secret')
+        subscribe(cls.user)
+        cls.tool = create_tool(cache_enabled=True)
+        cls.url = reverse('tools:process', args=[cls.tool.slug])
+
+    def setUp(self):
+        get_result_cache().clear()
+        self.client.force_login(self.user)
+
+    def process(self, input_data):
+        return self.client.post(self.url, input_data, content_type='application/json').json()
+
+    def test_identical_input_is_served_from_cache(self):
+        first = self.process({'genre': 'mystery', 'theme': 'friendship'})
+        # Key order doesn't matter
+        second = self.process({'theme': 'friendship', 'genre': 'mystery'})
+        self.assertFalse(first['usage']['cached'])
+        self.assertTrue(second['usage']['cached'])
+        self.assertEqual(first['data'], second['data'])
+        self.assertEqual(
+            list(ToolUsage.objects.order_by('created_at', 'pk').values_list('cache_hit', flat=True)),
+            [False, True]
+        )
+
+    def test_editing_the_tool_retires_cached_results(self):
+        self.process({'genre': 'mystery', 'theme': 'friendship'})
+        self.tool.description = 'Writes better stories'
+        self.tool.save()
+        response = self.process({'genre': 'mystery', 'theme': 'friendship'})
+        self.assertFalse(response['usage']['cached'])
+
+    def test_zero_ttl_caches_nothing(self):
+        self.tool.cache_ttl = 0
+        get_result_cache().set(self.tool, {'genre': 'mystery'}, {'output': {}, 'tokens_used': 1, 'cost': 0})
+        self.assertIsNone(get_result_cache().get(self.tool, {'genre': 'mystery'}))
+        with self.assertRaises(ValidationError) as raised:
+            self.tool.full_clean()
+        self.assertIn('cache_ttl', raised.exception.message_dict)
+
+    def test_cache_is_opt_in(self):
+        Tool.objects.filter(pk=self.tool.pk).update(cache_enabled=False)
+        self.process({'genre': 'mystery', 'theme': 'friendship'})
+        response = self.process({'genre': 'mystery', 'theme': 'friendship'})
+        self.assertFalse(response['usage']['cached'])
+
+
+class ToolAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('root', password='secret')
+        cls.tool = create_tool(cache_enabled=True)
+        today = timezone.localdate()
+        UsageDailyRollup.objects.create(
+            user=cls.admin, tool=cls.tool, day=today, calls=4, tokens=40, cost=0, cache_hits=1, tokens_saved=10
+        )
+        # Outside the window
+        UsageDailyRollup.objects.create(
+            user=cls.admin, tool=cls.tool, day=today - timedelta(days=settings.TOOLS_CACHE_STATS_DAYS),
+            calls=6, tokens=60, cost=0, cache_hits=6, tokens_saved=60
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_reads_recent_rollups(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:tools_tool_changelist'))
+        self.assertContains(response, '25.0%')
+        self.assertContains(response, '<td class="field-saved_tokens">10</td>', html=True)
+        self.assertFalse(any('tools_toolusage' in query['sql'] for query in queries.captured_queries))
+
+    def test_change_form_skips_cache_stats(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:tools_tool_change', args=[self.tool.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('dashboard_usagedailyrollup' in query['sql'] for query in queries.captured_queries))
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class StreamingProcessToolTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dave', password='secret')
+        subscribe(cls.user)
+        cls.tool = create_tool()
+        cls.url = reverse('tools:process', args=[cls.tool.slug])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def read_events(self, response):
+        body = b''.join(response.streaming_content).decode()
+        events = []
+        for block in body.strip().split('\n\n'):
+            event, data = block.split('\n')
+            events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return events
+
+    def test_event_stream_sends_chunks_then_usage(self):
+        response = self.client.post(
+            self.url, {'genre': 'mystery', 'theme': 'friendship'},
+            content_type='application/json', headers={'Accept': 'text/event-stream'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = self.read_events(response)
+        chunks = [data['text'] for event, data in events if event == 'chunk']
+        self.assertGreater(len(chunks), 1)
+        self.assertIn('mystery', ''.join(chunks))
+        event, done = events[-1]
+        self.assertEqual(event, 'done')
+        self.assertEqual(done['usage']['tokens'], 100)
+        usage = ToolUsage.objects.get(user=self.user)
+        self.assertEqual(usage.tokens_used, 100)
+        self.assertEqual(usage.output_data, done['data'])
+
+    def test_invalid_input_is_rejected_before_streaming(self):
+        response = self.client.post(
+            self.url + '?stream=1', {'genre': 'mystery'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('erin', password='secret')
+        cls.tool = create_tool()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('tools:list')
+
+    def test_warm_catalog_runs_no_catalog_queries(self):
+        self.client.get(self.url)
+        # session, user
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Story Writer Pro')
+
+    def test_saving_a_tool_refreshes_the_catalog(self):
+        self.client.get(self.url)
+        create_tool(name='Poem Writer')
+        self.assertContains(self.client.get(self.url), 'Poem Writer')
+        Tool.objects.get(name='Poem Writer').delete()
+        self.assertNotContains(self.client.get(self.url), 'Poem Writer')
+
+    def test_catalog_pages_follow_cursor(self):
+        for n in range(12):
+            create_tool(name=f'Tool {n:02d}')
+        first = self.client.get(self.url).context['page_obj']
+        self.assertEqual(len(first), 12)
+        second = self.client.get(self.url, {'cursor': first.next_cursor}).context['page_obj']
+        self.assertEqual([tool.name for tool in second], ['Tool 11'])
+        self.assertFalse(second.has_next)
+
+    def test_category_pages_are_cached_separately(self):
+        other = Category.objects.create(name='Code Assistant', slug='code-assistant', icon='fa-code')
+        create_tool(name='Code Reviewer', category=other)
+        response = self.client.get(self.url, {'category': 'code-assistant'})
+        self.assertContains(response, 'Code Reviewer')
+        self.assertNotContains(response, 'Story Writer Pro')
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {'category': 'code-assistant'})
+
+    def test_unknown_category_is_ignored(self):
+        self.client.get(self.url)
+        # Served from the same cached fragments as the unfiltered catalog
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'category': 'no-such-category'})
+        self.assertIsNone(response.context['selected_category'])
+        self.assertContains(response, 'Story Writer Pro')
+
+
+class ProcessBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('heidi', password='secret')
+        cls.tool = create_tool()
+        subscribe(cls.user, api_calls_limit=5)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('tools:process_batch', args=[self.tool.slug])
+
+    def post(self, inputs):
+        return self.client.post(self.url, {'inputs': inputs}, content_type='application/json')
+
+    def stored(self):
+        return UserProfile.objects.get(user=self.user).api_calls_count
+
+    def test_bad_schema_is_a_json_400(self):
+        Tool.objects.filter(pk=self.tool.pk).update(
+            input_format={'type': 'object', 'properties': {'genre': {'type': 'string', 'enum': 5}}},
+            updated_at=timezone.now()
+        )
+        response = self.post([{'genre': 'fantasy'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(self.stored(), 0)
+
+        with mock.patch('tools.views.get_validator', side_effect=TypeError('bad schema')):
+            response = self.post([{'genre': 'fantasy'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Error processing request: bad schema')
+
+    def test_list_typed_schema(self):
+        Tool.objects.filter(pk=self.tool.pk).update(
+            input_format={'type': 'object', 'properties': {'genre': {'type': ['string', 'null']}}},
+            updated_at=timezone.now()
+        )
+        data = self.post([{'genre': 'fantasy'}, {'genre': None}, {'genre': 3}]).json()
+        self.assertEqual([result['success'] for result in data['results']], [True, False, False])
+
+    def test_failed_items_are_not_charged(self):
+        generate = StubBackend._generate
+
+        def flaky(backend, tool, input_data):
+            if input_data['theme'] == 'storms':
+                raise BackendUnavailable('Model backend is unavailable')
+            return generate(backend, tool, input_data)
+
+        inputs = [{'genre': 'fantasy', 'theme': theme} for theme in ('dragons', 'storms', 'ships')]
+        with mock.patch.object(StubBackend, '_generate', flaky):
+            data = self.post(inputs).json()
+        self.assertEqual([result['success'] for result in data['results']], [True, False, True])
+        self.assertEqual(data['usage']['processed'], 2)
+        self.assertEqual(data['usage']['remaining_calls'], 3)
+        self.assertEqual(ToolUsage.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.stored(), 2)
+
+    def test_invalid_items_are_reported_and_not_charged(self):
+        data = self.post([{'genre': 'fantasy', 'theme': 'dragons'}, {'genre': 1, 'theme': 'x'}]).json()
+        self.assertEqual(data['results'][1], {
+            'index': 1, 'success': False, 'error': "Field 'genre' must be a string"
+        })
+        self.assertEqual(self.stored(), 1)
+
+        response = self.post([{'genre': 'fantasy'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored(), 1)
+
+    def test_batch_over_quota_is_rejected(self):
+        response = self.post([{'genre': 'fantasy', 'theme': 'dragons'}] * 6)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['requested'], 6)
+        self.assertFalse(ToolUsage.objects.exists())
+        self.assertEqual(self.stored(), 0)
+
+
+class ValidatorTests(SimpleTestCase):
+    def assertInvalid(self, validate, data, message):
+        with self.assertRaisesMessage(ValueError, message):
+            validate(data)
+
+    def test_types(self):
+        validate = compile_schema({
+            'type': 'object',
+            'properties': {
+                'name': {'type': 'string'},
+                'temperature': {'type': 'number'},
+                'count': {'type': 'integer'},
+                'draft': {'type': 'boolean'},
+                'tags': {'type': 'array'},
+                'meta': {'type': 'object'},
+            },
+        })
+        valid = {'name': 'x', 'temperature': 0.5, 'count': 0, 'draft': False, 'tags': ['a'], 'meta': {'a': 1}}
+        validate(valid)
+        validate({**valid, 'temperature': 1})
+        self.assertInvalid(validate, {**valid, 'name': 1}, "Field 'name' must be a string")
+        self.assertInvalid(validate, {**valid, 'temperature': '1'}, "Field 'temperature' must be a number")
+        self.assertInvalid(validate, {**valid, 'count': 1.5}, "Field 'count' must be an integer")
+        self.assertInvalid(validate, {**valid, 'count': True}, "Field 'count' must be an integer")
+        self.assertInvalid(validate, {**valid, 'draft': 1}, "Field 'draft' must be a boolean")
+        self.assertInvalid(validate, {**valid, 'tags': {}}, "Field 'tags' must be an array")
+        self.assertInvalid(validate, {**valid, 'meta': []}, "Field 'meta' must be an object")
+        self.assertInvalid(validate, [], "Input must be a JSON object")
+
+    def test_required_fields(self):
+        schema = {'type': 'object', 'properties': {'genre': {'type': 'string'}, 'theme': {'type': 'string'}}}
+        validate = compile_schema(schema)
+        self.assertInvalid(validate, {'genre': 'mystery', 'theme': ''},
+                           "Missing or empty required fields: theme")
+        validate = compile_schema({**schema, 'required': ['genre']})
+        validate({'genre': 'mystery'})
+        self.assertInvalid(validate, {}, "Missing or empty required fields: genre")
+
+    def test_enum(self):
+        validate = compile_schema({
+            'type': 'object',
+            'properties': {'genre': {'type': 'string', 'enum': ['fantasy', 'mystery']}},
+        })
+        validate({'genre': 'fantasy'})
+        self.assertInvalid(validate, {'genre': 'romance'}, "Field 'genre' must be one of: fantasy, mystery")
+
+    def test_array_items(self):
+        validate = compile_schema({
+            'type': 'object',
+            'properties': {'tags': {'type': 'array', 'items': {'type': 'string'}}},
+        })
+        validate({'tags': ['a', 'b']})
+        self.assertInvalid(validate, {'tags': ['a', 2]}, "Field 'tags[1]' must be a string")
+
+    def test_nested_objects(self):
+        schema = {
+            'type': 'object',
+            'properties': {
+                'setting': {
+                    'type': 'object',
+                    'properties': {'place': {'type': 'string'}, 'era': {'type': 'string'}},
+                },
+            },
+        }
+        validate = compile_schema(schema)
+        # Nested properties are optional unless listed in the nested 'required'
+        validate({'setting': {'place': 'a floating city'}})
+        self.assertInvalid(validate, {'setting': {'era': 5}}, "Field 'setting.era' must be a string")
+
+        schema['properties']['setting']['required'] = ['place']
+        validate = compile_schema(schema)
+        self.assertInvalid(validate, {'setting': {'era': 'medieval'}},
+                           "Missing or empty required fields: setting.place")
+
+    def test_list_of_types(self):
+        validate = compile_schema({
+            'type': 'object',
+            'properties': {
+                'name': {'type': ['string', 'null']},
+                'count': {'type': ['integer', 'string']},
+                'flag': {'type': ['integer', 'boolean']},
+                'tags': {'type': ['array', 'null'], 'items': {'type': 'string'}},
+            },
+            'required': [],
+        })
+        validate({'name': 'x', 'count': 3, 'flag': True, 'tags': ['a']})
+        validate({'name': None, 'count': 'three', 'flag': 1, 'tags': None})
+        self.assertInvalid(validate, {'name': 1}, "Field 'name' must be a string or null")
+        self.assertInvalid(validate, {'count': True}, "Field 'count' must be an integer or a string")
+        self.assertInvalid(validate, {'tags': [1]}, "Field 'tags[0]' must be a string")
+
+    def test_unknown_types_are_not_checked(self):
+        validate = compile_schema({
+            'type': 'object',
+            'properties': {'day': {'type': 'date'}, 'note': {'type': ['string', 'text']}},
+        })
+        validate({'day': '2026-01-01', 'note': 5})
+
+    def test_invalid_schema(self):
+        with self.assertRaisesMessage(ValueError, 'Invalid schema format'):
+            compile_schema({'type': 'array'})
+
+
+class QuotaBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('grace', password='secret')
+
+    def stored(self):
+        return UserProfile.objects.get(user=self.user).api_calls_count
+
+    def consume_all(self, backend, limit, calls):
+        return [backend.consume(self.user.pk, limit).allowed for _ in range(calls)]
+
+    def test_database_backend_enforces_limit(self):
+        backend = DatabaseQuotaBackend()
+        self.assertEqual(self.consume_all(backend, 3, 4), [True, True, True, False])
+        self.assertEqual(self.stored(), 3)
+        quota = backend.consume(self.user.pk, 5, amount=3)
+        self.assertEqual((quota.allowed, quota.usage, quota.remaining), (False, 3, 2))
+        self.assertTrue(backend.consume(self.user.pk, 5, amount=2).allowed)
+        self.assertEqual(self.stored(), 5)
+
+    def test_local_backend_counts_in_memory_until_flushed(self):
+        backend = LocalMemoryQuotaBackend(flush_interval=60, flush_threshold=100, near_limit=2)
+        self.assertEqual(self.consume_all(backend, 10, 5), [True] * 5)
+        self.assertEqual(self.stored(), 0)
+        backend.flush()
+        self.assertEqual(self.stored(), 5)
+
+    def test_local_backend_checks_database_near_limit(self):
+        backend = LocalMemoryQuotaBackend(flush_interval=60, flush_threshold=100, near_limit=2)
+        self.assertEqual(self.consume_all(backend, 10, 11), [True] * 10 + [False])
+        self.assertEqual(self.stored(), 10)
+
+    def test_local_backends_overshoot_is_bounded(self):
+        # Two workers: each may hold at most flush_threshold unflushed calls
+        workers = [
+            LocalMemoryQuotaBackend(flush_interval=60, flush_threshold=3, near_limit=2)
+            for _ in range(2)
+        ]
+        allowed = sum(worker.consume(self.user.pk, 20).allowed for _ in range(20) for worker in workers)
+        for worker in workers:
+            worker.flush()
+        self.assertLessEqual(allowed, 20 + 3)
+        self.assertEqual(self.stored(), allowed)
+
+    def test_release_gives_back_unused_calls(self):
+        backend = DatabaseQuotaBackend()
+        self.consume_all(backend, 3, 3)
+        backend.release(self.user.pk, 2)
+        self.assertEqual(self.stored(), 1)
+
+        local = LocalMemoryQuotaBackend(flush_interval=60, flush_threshold=100, near_limit=0)
+        self.consume_all(local, 3, 2)
+        local.release(self.user.pk, 2)
+        local.flush()
+        self.assertEqual(self.stored(), 1)
+        self.assertEqual(self.consume_all(local, 3, 3), [True, True, False])
+
+    def test_local_backend_reset_drops_counter_and_pending_calls(self):
+        backend = LocalMemoryQuotaBackend(flush_interval=60, flush_threshold=100, near_limit=0)
+        self.consume_all(backend, 3, 3)
+        backend.reset(self.user.pk)
+        backend.flush()
+        self.assertEqual(self.stored(), 0)
+        self.assertTrue(backend.consume(self.user.pk, 3).allowed)
+
+    @override_settings(CACHES={'quota': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_backend(self):
+        backend = CacheQuotaBackend(alias='quota', flush_interval=60, flush_threshold=100)
+        self.assertEqual(self.consume_all(backend, 3, 4), [True, True, True, False])
+        backend.flush()
+        self.assertEqual(self.stored(), 3)
+        UserProfile.objects.filter(user=self.user).update(api_calls_count=0)
+        backend.reset(self.user.pk)
+        self.assertTrue(backend.consume(self.user.pk, 3).allowed)
+
+
+class ToolUsagePayloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('erin', password='secret')
+        cls.tool = create_tool()
+
+    def create_usage(self, **kwargs):
+        return ToolUsage.objects.create(
+            user=self.user, tool=self.tool, tokens_used=10, cost=Decimal('0.0001'), **kwargs
+        )
+
+    def test_payload_is_stored_compressed_and_loaded_lazily(self):
+        story = {'story': 'Once upon a time ' * 200}
+        usage = self.create_usage(input_data={'genre': 'fantasy'}, output_data=story)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT output_data FROM tools_toolusagepayload WHERE usage_id = %s', [usage.pk])
+            blob = bytes(cursor.fetchone()[0])
+        self.assertLess(len(blob), len(json.dumps(story)) / 10)
+
+        usage = ToolUsage.objects.metadata().get(pk=usage.pk)
+        self.assertNotIn('input_data', str(ToolUsage.objects.metadata().query))
+        with self.assertNumQueries(1):
+            self.assertEqual(usage.input_data, {'genre': 'fantasy'})
+            self.assertEqual(usage.output_data, story)
+
+    def test_payload_changes_are_saved(self):
+        usage = self.create_usage(input_data={'n': 1}, output_data={})
+        usage = ToolUsage.objects.get(pk=usage.pk)
+        usage.output_data = {'result': 'done'}
+        usage.save()
+        self.assertEqual(ToolUsagePayload.objects.get(pk=usage.pk).output_data, {'result': 'done'})
+
+    def test_bulk_create_inserts_payloads(self):
+        usages = [
+            ToolUsage(user=self.user, tool=self.tool, input_data={'n': n}, output_data={},
+                      tokens_used=10, cost=Decimal('0.0001'))
+            for n in range(3)
+        ]
+        with self.assertNumQueries(2):
+            ToolUsage.objects.bulk_create(usages)
+        self.assertEqual(
+            [payload.input_data for payload in ToolUsagePayload.objects.order_by('pk')],
+            [{'n': 0}, {'n': 1}, {'n': 2}]
+        )
+
+    def test_backfill_moves_inline_payloads(self):
+        moved = self.create_usage(input_data={'n': 1}, output_data={'kept': True})
+        legacy = [self.create_usage(input_data={}, output_data={}) for _ in range(3)]
+        ToolUsagePayload.objects.filter(usage__in=legacy).delete()
+        ToolUsage.objects.filter(pk__in=[usage.pk for usage in legacy]).update(
+            legacy_input_data={'legacy': True}, legacy_output_data={'story': 'old'}
+        )
+        # Readable before the backfill
+        self.assertEqual(ToolUsage.objects.get(pk=legacy[0].pk).input_data, {'legacy': True})
+
+        call_command('backfill_usage_payloads', batch_size=2, stdout=io.StringIO())
+
+        self.assertFalse(ToolUsage.objects.filter(legacy_input_data__isnull=False).exists())
+        for usage in legacy:
+            usage = ToolUsage.objects.get(pk=usage.pk)
+            self.assertEqual(usage.input_data, {'legacy': True})
+            self.assertEqual(usage.output_data, {'story': 'old'})
+        self.assertEqual(ToolUsage.objects.get(pk=moved.pk).output_data, {'kept': True})
+
+        output = io.StringIO()
+        call_command('backfill_usage_payloads', stdout=output)
+        self.assertIn('of 0 usages', output.getvalue())
+
+
+class StartupProfileTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.profile = measure_startup()
+
+    def test_heavy_dependencies_are_deferred(self):
+        for module in ('reportlab', 'razorpay', 'dateutil'):
+            self.assertNotIn(module, self.profile.modules, f'{module} is imported at startup')
+
+    def test_startup_within_budget(self):
+        self.assertLessEqual(self.profile.total_ms, settings.STARTUP_IMPORT_BUDGET_MS)
+
+    def test_packages_include_what_they_imported_first(self):
+        profile = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       100 |        100 |     json.decoder\n"
+            "import time:        50 |        150 |   json\n"
+            "import time:       200 |        200 |   tools.helpers\n"
+            "import time:       300 |        650 | tools\n"
+            "import time:        10 |         10 | os\n"
+        )
+        self.assertEqual(profile.total_ms, 0.66)
+        self.assertEqual(profile.packages(), {
+            'tools': (0.5, 0.65),
+            'json': (0.15, 0.15),
+            'os': (0.01, 0.01),
+        })
@@ -7,4 +7,6 @@ urlpatterns = [
     path('', views.tool_list, name='list'),
     path('<slug:slug>/', views.tool_detail, name='detail'),
     path('<slug:slug>/process/', views.process_tool, name='process'),
+    path('<slug:slug>/process/async/', views.process_tool_async, name='process_async'),
+    path('<slug:slug>/process/batch/', views.process_tool_batch, name='process_batch'),
 ]
@@ -0,0 +1,221 @@
+"""
+Compiled validators for ``Tool.input_format`` schemas.
+
+Each schema is compiled once into a tree of small closures, so validating a
+request is a handful of isinstance checks instead of a walk over the schema.
+Validators are cached per tool and keyed by ``updated_at``; saving a tool
+also drops its entry (see ``tools.signals``).
+"""
+import threading
+
+# type name -> (python types, reject bool, description); bool is an int subclass
+_TYPE_CHECKS = {
+    'string': (str, False, 'a string'),
+    'number': ((int, float), True, 'a number'),
+    'integer': (int, True, 'an integer'),
+    'boolean': (bool, False, 'a boolean'),
+    'array': (list, False, 'an array'),
+    'object': (dict, False, 'an object'),
+    'null': (type(None), False, 'null'),
+}
+
+_MISSING = object()
+
+
+def _is_empty(value):
+    """Missing-value rule used for required fields (0 and False are values)."""
+    return not value and not isinstance(value, (bool, int, float))
+
+
+def _type_names(spec):
+    """The node's type names: ``type`` may be one name or a list of them."""
+    type_name = spec.get('type')
+    if isinstance(type_name, str):
+        return [type_name]
+    if isinstance(type_name, list):
+        return [name for name in type_name if isinstance(name, str)]
+    return []
+
+
+def _type_guard(spec, path):
+    """
+    Return ``(types, reject_bool, error)`` for the node's type, or ``None``
+    if it isn't checked. A value may match any of the listed types; a list
+    with a name we don't know is left unchecked, like a single unknown name.
+    """
+    names = _type_names(spec)
+    if not names or any(name not in _TYPE_CHECKS for name in names):
+        return None
+    types, reject_bool, descriptions = (), False, []
+    for name in names:
+        name_types, name_reject_bool, description = _TYPE_CHECKS[name]
+        types += name_types if isinstance(name_types, tuple) else (name_types,)
+        reject_bool = reject_bool or name_reject_bool
+        descriptions.append(description)
+    # A listed 'boolean' lets booleans through the int check
+    reject_bool = reject_bool and bool not in types
+    return types, reject_bool, f"Field '{path}' must be {' or '.join(descriptions)}"
+
+
+def _compile_node(spec, path, with_type=True):
+    """
+    Compile one schema node into ``check(value)``, or ``None`` if it accepts
+    anything. Field paths are baked in here so the success path never
+    formats strings. Object properties pass ``with_type=False`` because
+    their type guard is inlined in the object loop.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Invalid schema format")
+
+    checks = []
+
+    type_names = _type_names(spec)
+    guard = _type_guard(spec, path)
+    if guard is not None and with_type:
+        types, reject_bool, type_error = guard
+
+        def check_type(value):
+            if not isinstance(value, types) or (reject_bool and value.__class__ is bool):
+                raise ValueError(type_error)
+        checks.append(check_type)
+
+    if 'enum' in spec:
+        allowed = list(spec['enum'])
+        enum_error = f"Field '{path}' must be one of: {', '.join(str(choice) for choice in allowed)}"
+
+        def check_enum(value):
+            if value not in allowed:
+                raise ValueError(enum_error)
+        checks.append(check_enum)
+
+    if 'array' in type_names and 'items' in spec:
+        item_path = f"{path}[*]"
+        check_item = _compile_node(spec['items'], item_path)
+        if check_item is not None:
+            def check_items(value):
+                if not isinstance(value, list):
+                    return
+                for index, item in enumerate(value):
+                    try:
+                        check_item(item)
+                    except ValueError as e:
+                        raise ValueError(str(e).replace(item_path, f"{path}[{index}]", 1))
+            checks.append(check_items)
+
+    if 'object' in type_names and 'properties' in spec:
+        check_properties = _compile_object(spec, f"{path}.")
+
+        def check_object(value):
+            if isinstance(value, dict):
+                check_properties(value)
+        checks.append(check_object)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value):
+        for check in checks:
+            check(value)
+    return check_all
+
+
+def _compile_object(spec, prefix='', all_required=False):
+    """
+    Compile the properties/required part of an object schema. Without a
+    ``required`` list, properties are optional, or all required with
+    ``all_required`` (the top-level rule).
+    """
+    properties = spec['properties']
+    if not isinstance(properties, dict):
+        raise ValueError("Invalid schema format")
+
+    required = spec.get('required', list(properties.keys()) if all_required else [])
+
+    fields = []
+    for field_name, field_spec in properties.items():
+        path = f"{prefix}{field_name}"
+        check = _compile_node(field_spec, path, with_type=False)
+        types, reject_bool, type_error = _type_guard(field_spec, path) or (None, False, None)
+        fields.append((field_name, path, types, reject_bool, type_error, check, field_name in required))
+    fields = tuple(fields)
+    extra_required = tuple(field for field in required if field not in properties)
+
+    def check_properties(data):
+        # Type errors take precedence over missing fields, as before
+        missing_fields = []
+        for field_name, path, types, reject_bool, type_error, check, is_required in fields:
+            value = data.get(field_name, _MISSING)
+            if value is _MISSING:
+                if is_required:
+                    missing_fields.append(path)
+                continue
+            if types is not None and (
+                not isinstance(value, types) or (reject_bool and value.__class__ is bool)
+            ):
+                raise ValueError(type_error)
+            if check is not None:
+                check(value)
+            if is_required and not value and _is_empty(value):
+                missing_fields.append(path)
+
+        for field_name in extra_required:
+            if _is_empty(data.get(field_name)):
+                missing_fields.append(f"{prefix}{field_name}")
+
+        if missing_fields:
+            raise ValueError(f"Missing or empty required fields: {', '.join(missing_fields)}")
+
+    return check_properties
+
+
+def compile_schema(schema):
+    """
+    Compile a tool input schema into ``validate(input_data)``, which raises
+    ``ValueError`` on the first problem it finds.
+    """
+    if not isinstance(schema, dict) or schema.get('type') != 'object' or 'properties' not in schema:
+        raise ValueError("Invalid schema format")
+    # Every top-level property is required unless the schema says otherwise
+    check_properties = _compile_object(schema, all_required=True)
+
+    def validate(input_data):
+        if not isinstance(input_data, dict):
+            raise ValueError("Input must be a JSON object")
+        check_properties(input_data)
+
+    return validate
+
+
+def _invalid_schema(error):
+    def validate(input_data):
+        raise ValueError(str(error))
+    return validate
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_validator(tool):
+    """Return the compiled validator for ``tool``, compiling it on first use."""
+    entry = _registry.get(tool.pk)
+    if entry is not None and entry[0] == tool.updated_at:
+        return entry[1]
+
+    try:
+        validator = compile_schema(tool.input_format)
+    except (TypeError, ValueError) as e:
+        # A malformed schema, e.g. a non-list 'enum'
+        validator = _invalid_schema(e)
+
+    with _registry_lock:
+        _registry[tool.pk] = (tool.updated_at, validator)
+    return validator
+
+
+def invalidate_validator(tool_id):
+    """Drop the cached validator for a tool."""
+    with _registry_lock:
+        _registry.pop(tool_id, None)
@@ -1,46 +1,84 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
-from django.core.paginator import Paginator
-from .models import Tool, Category, ToolUsage, models
-from dashboard.models import UserActivity  # Add this import
-from billing.models import Subscription
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+from .models import Tool, ToolUsage, models
+from dashboard.activity import log_activity
+from dashboard.rollups import apply_usages
 import json
 from django.db import transaction
-from .decorators import check_subscription_limits
+from .decorators import check_subscription_limits, acheck_subscription_limits, reserve_api_calls
+from .catalog import get_catalog_version, get_categories, get_tool_page
+from .backends import BackendUnavailable, get_backend, agenerate
+from .quota import get_quota_backend
+from .result_cache import get_result_cache
+from .streaming import EVENT_STREAM, sse_event, wants_event_stream
+from .validators import get_validator
 from accounts.models import UserProfile
+from core.conditional import latest, make_etag, page_condition, request_memo, viewer_state
 
 @login_required
 def tool_list(request):
-    categories = Category.objects.all()
+    version = get_catalog_version()
+    categories = get_categories(version)
+    # Unknown categories are ignored, so query strings can't add fragment cache keys
     selected_category = request.GET.get('category')
-    
-    tools = Tool.objects.filter(status='active')
-    if selected_category:
-        tools = tools.filter(category__slug=selected_category)
-    
-    paginator = Paginator(tools, 12)  # Show 12 tools per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if selected_category not in {category.slug for category in categories}:
+        selected_category = None
+    page_obj = get_tool_page(version, selected_category, request.GET.get('cursor'), categories)
     
     context = {
         'categories': categories,
         'selected_category': selected_category,
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        # Keys for the rendered fragments in tools/list.html
+        'catalog_version': version,
+        'catalog_cache_timeout': settings.TOOLS_CATALOG_CACHE_TIMEOUT
     }
     return render(request, 'tools/list.html', context)
 
+def tool_detail_state(request, slug):
+    """The tool and the viewer's latest usage of it, loaded once per request."""
+    def compute():
+        tool = Tool.objects.select_related('category').filter(slug=slug, status='active').first()
+        if tool is None:
+            return None
+        usage = ToolUsage.objects.filter(
+            user=request.user, tool=tool
+        ).order_by('-created_at').values('pk', 'created_at').first() or {}
+        return tool, usage
+    return request_memo(request, 'tool_detail', compute)
+
+def tool_detail_etag(request, slug):
+    state = tool_detail_state(request, slug)
+    if state is None:
+        return None
+    tool, usage = state
+    return make_etag(tool.pk, tool.updated_at.isoformat(), usage.get('pk'), *viewer_state(request))
+
+def tool_detail_last_modified(request, slug):
+    state = tool_detail_state(request, slug)
+    if state is None:
+        return None
+    tool, usage = state
+    # Recent usage is shown on the page
+    return latest(tool.updated_at, usage.get('created_at'))
+
 @login_required
 def tool_detail(request, slug):
-    tool = get_object_or_404(Tool, slug=slug, status='active')
-    # Add activity for tool view
-    UserActivity.objects.create(
-        user=request.user,
-        activity_type='tool_view',
-        description=f'Viewed tool: {tool.name}'
-    )
-    recent_usage = ToolUsage.objects.filter(
+    state = tool_detail_state(request, slug)
+    if state is None:
+        raise Http404('No Tool matches the given query.')
+    # Add activity for tool view (before the 304 check, which would skip it)
+    log_activity(request.user, 'tool_view', f'Viewed tool: {state[0].name}')
+    return render_tool_detail(request, slug)
+
+@page_condition(etag_func=tool_detail_etag, last_modified_func=tool_detail_last_modified)
+def render_tool_detail(request, slug):
+    tool = tool_detail_state(request, slug)[0]
+    recent_usage = ToolUsage.objects.metadata().filter(
         user=request.user,
         tool=tool
     ).order_by('-created_at')[:5]
@@ -62,7 +100,8 @@ def tool_detail(request, slug):
 @require_http_methods(["POST"])
 def process_tool(request, slug):
     tool = get_object_or_404(Tool, slug=slug, status='active')
-    subscription = Subscription.objects.get(user=request.user)
+    if wants_event_stream(request):
+        return stream_tool(request, tool)
     
     try:
         with transaction.atomic():
@@ -72,14 +111,7 @@ def process_tool(request, slug):
             result = process_ai_request(tool, input_data)
             
             # Create usage record
-            ToolUsage.objects.create(
-                user=request.user,
-                tool=tool,
-                input_data=input_data,
-                output_data=result['output'],
-                tokens_used=result['tokens_used'],
-                cost=result['cost']
-            )
+            build_tool_usage(request.user, tool, input_data, result).save()
             
             return JsonResponse({
                 'success': True,
@@ -87,79 +119,265 @@ def process_tool(request, slug):
                 'usage': {
                     'tokens': result['tokens_used'],
                     'cost': result['cost'],
-                    'remaining_calls': subscription.plan.api_calls_limit - request.user.userprofile.api_calls_count
+                    'cached': result.get('cache_hit', False),
+                    'remaining_calls': request.quota.remaining
                 }
             })
 
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'Invalid JSON format'}, status=400)
+    except BackendUnavailable as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=503)
     except ValueError as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': 'Internal server error'}, status=500)
 
-def process_ai_request(tool, input_data):
+def stream_tool(request, tool):
     """
-    Process the AI request and validate input against the tool's schema.
+    process_tool in streaming mode: output chunks are sent as server-sent
+    events while the backend produces them, and the usage record is written
+    when the stream ends.
     """
     try:
-        # Validate input data structure
-        if not isinstance(input_data, dict):
-            raise ValueError("Input must be a JSON object")
-
-        # Get schema properties
-        schema = tool.input_format
-        if not schema.get('type') == 'object' or 'properties' not in schema:
-            raise ValueError("Invalid schema format")
-
-        properties = schema['properties']
-
-        # Validate each field against the schema
-        for field_name, field_spec in properties.items():
-            # Check if field exists in input
-            if field_name in input_data:
-                # Validate field type
-                if field_spec.get('type') == 'string':
-                    if not isinstance(input_data[field_name], str):
-                        raise ValueError(f"Field '{field_name}' must be a string")
-                # Add more type validations as needed (number, boolean, etc.)
-
-        # Check for required fields if specified in schema
-        required_fields = schema.get('required', list(properties.keys()))
-        missing_fields = [
-            field for field in required_fields
-            if field not in input_data or not input_data[field]
-        ]
-
-        if missing_fields:
-            raise ValueError(f"Missing or empty required fields: {', '.join(missing_fields)}")
-
-        # Simulate AI processing
-        tokens_used = 100
-        cost = float(tool.cost_per_token * tokens_used)
-
-        # Generate output based on the tool type
-        if tool.name == "Story Writer Pro":
-            output = {
-                "title": f"A {input_data.get('genre', 'mysterious')} story",
-                "story": (
-                    f"Once upon a time in a {input_data.get('setting', 'distant land')}, "
-                    f"there was a {input_data.get('character_type', 'brave hero')}. "
-                    f"This is a {input_data.get('length', 'short')} {input_data.get('genre', 'story')} "
-                    f"about {input_data.get('theme', 'adventure')}..."
-                )
-            }
+        input_data = json.loads(request.body)
+        get_validator(tool)(input_data)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON format'}, status=400)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': f'Error processing request: {e}'}, status=400)
+
+    response = StreamingHttpResponse(
+        tool_event_stream(request.user, tool, input_data, request.quota.remaining),
+        content_type=EVENT_STREAM
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
+def tool_event_stream(user, tool, input_data, remaining_calls):
+    """Yield ``chunk`` events, then ``done`` (or ``error``) with the usage."""
+    try:
+        result = get_result_cache().get(tool, input_data) if tool.cache_enabled else None
+        if result is not None:
+            result = {**result, 'cache_hit': True}
         else:
-            # Default output for other tools
-            output = {
-                "result": f"Processed {tool.name} with input: {json.dumps(input_data)}"
+            for event in get_backend(tool.model_name).stream(tool, input_data):
+                if 'delta' in event:
+                    yield sse_event('chunk', {'text': event['delta']})
+                else:
+                    result = event['result']
+            if tool.cache_enabled:
+                get_result_cache().set(tool, input_data, result)
+
+        build_tool_usage(user, tool, input_data, result).save()
+    except BackendUnavailable as e:
+        yield sse_event('error', {'success': False, 'error': str(e)})
+        return
+    except Exception:
+        yield sse_event('error', {'success': False, 'error': 'Internal server error'})
+        return
+
+    yield sse_event('done', {
+        'success': True,
+        'data': result['output'],
+        'usage': {
+            'tokens': result['tokens_used'],
+            'cost': result['cost'],
+            'cached': result.get('cache_hit', False),
+            'remaining_calls': remaining_calls
+        }
+    })
+
+@login_required
+@acheck_subscription_limits
+@require_http_methods(["POST"])
+async def process_tool_async(request, slug):
+    """
+    ASGI-native process_tool: the worker keeps serving other requests while
+    the model backend is working.
+    """
+    tool = await aget_object_or_404(Tool, slug=slug, status='active')
+    user = await request.auser()
+
+    try:
+        input_data = json.loads(request.body)
+
+        result = await aprocess_ai_request(tool, input_data)
+
+        # Create usage record
+        await build_tool_usage(user, tool, input_data, result).asave()
+
+        return JsonResponse({
+            'success': True,
+            'data': result['output'],
+            'usage': {
+                'tokens': result['tokens_used'],
+                'cost': result['cost'],
+                'cached': result.get('cache_hit', False),
+                'remaining_calls': request.quota.remaining
+            }
+        })
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON format'}, status=400)
+    except BackendUnavailable as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=503)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': 'Internal server error'}, status=500)
+
+@login_required
+@require_http_methods(["POST"])
+def process_tool_batch(request, slug):
+    """
+    Process many inputs for one tool: validate all of them, reserve quota once
+    for the valid ones, run them in parallel and record usage in one insert.
+    """
+    tool = get_object_or_404(Tool, slug=slug, status='active')
+
+    try:
+        payload = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON format'}, status=400)
+
+    inputs = payload.get('inputs') if isinstance(payload, dict) else payload
+    if not isinstance(inputs, list) or not inputs:
+        return JsonResponse({'success': False, 'error': 'Expected a non-empty "inputs" array'}, status=400)
+    if len(inputs) > settings.TOOLS_BATCH_MAX_SIZE:
+        return JsonResponse({
+            'success': False,
+            'error': f'A batch can contain at most {settings.TOOLS_BATCH_MAX_SIZE} inputs'
+        }, status=400)
+
+    # Validate everything up front so invalid items don't use quota
+    try:
+        validate = get_validator(tool)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'success': False, 'error': f'Error processing request: {e}'}, status=400)
+    results = [None] * len(inputs)
+    valid_indexes = []
+    for index, input_data in enumerate(inputs):
+        try:
+            validate(input_data)
+            valid_indexes.append(index)
+        except (TypeError, ValueError) as e:
+            results[index] = {'index': index, 'success': False, 'error': str(e)}
+
+    if not valid_indexes:
+        return JsonResponse({'success': False, 'results': results}, status=400)
+
+    quota, error_response = reserve_api_calls(request, len(valid_indexes))
+    if error_response is not None:
+        return error_response
+
+    def process_item(index):
+        try:
+            return process_ai_request(tool, inputs[index]), None
+        except (BackendUnavailable, ValueError) as e:
+            return None, str(e)
+        except Exception:
+            return None, 'Internal server error'
+
+    workers = min(settings.TOOLS_BATCH_MAX_WORKERS, len(valid_indexes))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(process_item, valid_indexes))
+
+    usages = []
+    total_tokens = 0
+    total_cost = 0
+    for index, (result, error) in zip(valid_indexes, outcomes):
+        if error is not None:
+            results[index] = {'index': index, 'success': False, 'error': error}
+            continue
+        results[index] = {
+            'index': index,
+            'success': True,
+            'data': result['output'],
+            'usage': {
+                'tokens': result['tokens_used'],
+                'cost': result['cost'],
+                'cached': result.get('cache_hit', False)
             }
+        }
+        usages.append(build_tool_usage(request.user, tool, inputs[index], result))
+        total_tokens += result['tokens_used']
+        total_cost += result['cost']
+
+    ToolUsage.objects.bulk_create(usages)
+    apply_usages(usages)  # bulk_create sends no post_save signals
 
-        return {
-            'output': output,
-            'tokens_used': tokens_used,
-            'cost': cost
+    # Items that failed in the backend don't count against the quota
+    failed = len(valid_indexes) - len(usages)
+    if failed:
+        get_quota_backend().release(request.user.pk, failed)
+
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'usage': {
+            'processed': len(usages),
+            'failed': len(inputs) - len(usages),
+            'tokens': total_tokens,
+            'cost': total_cost,
+            'remaining_calls': min(quota.remaining + failed, quota.limit)
         }
+    })
+
+def build_tool_usage(user, tool, input_data, result):
+    """Build an unsaved ToolUsage record for a processed request."""
+    return ToolUsage(
+        user=user,
+        tool=tool,
+        input_data=input_data,
+        output_data=result['output'],
+        tokens_used=result['tokens_used'],
+        cost=result['cost'],
+        cache_hit=result.get('cache_hit', False)
+    )
+
+def process_ai_request(tool, input_data):
+    """
+    Process the AI request and validate input against the tool's schema.
+    """
+    try:
+        # Validate input data against the tool's compiled schema
+        get_validator(tool)(input_data)
+
+        if tool.cache_enabled:
+            cached = get_result_cache().get(tool, input_data)
+            if cached is not None:
+                return {**cached, 'cache_hit': True}
+
+        result = get_backend(tool.model_name).generate(tool, input_data)
+        if tool.cache_enabled:
+            get_result_cache().set(tool, input_data, result)
+        return result
+
+    except BackendUnavailable:
+        raise
+    except Exception as e:
+        raise ValueError(f"Error processing request: {str(e)}")
+
+async def aprocess_ai_request(tool, input_data):
+    """
+    Async version of process_ai_request for ASGI views.
+    """
+    try:
+        get_validator(tool)(input_data)
+
+        if tool.cache_enabled:
+            cached = await get_result_cache().aget(tool, input_data)
+            if cached is not None:
+                return {**cached, 'cache_hit': True}
+
+        result = await agenerate(tool, input_data)
+        if tool.cache_enabled:
+            await get_result_cache().aset(tool, input_data, result)
+        return result
 
+    except BackendUnavailable:
+        raise
     except Exception as e:
         raise ValueError(f"Error processing request: {str(e)}")